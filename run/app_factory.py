@@ -0,0 +1,145 @@
+import importlib
+import os
+import sys
+
+from flask import Flask, send_from_directory
+
+# Each profile registers only the blueprints it serves. Blueprints are given
+# as "module:attribute" so a profile never imports modules it doesn't use.
+PROFILES = {
+    # UI tier: pages, config and status; notebook runs are simulated and the
+    # webhook is only acknowledged, with no UI_ACCESS_TOKEN check, like the
+    # former app_minimal.py
+    'minimal': {
+        'blueprints': [
+            'routes.core_routes:core_blueprint',
+            'routes.status_routes:status_blueprint',
+            'routes.simulation_routes:simulation_blueprint',
+        ],
+        'ui': True,
+        'preload': [],
+        'prewarm': [],
+        'run_queue': False,
+        'require_token': False,
+        'webhook_pull': False,
+        'env': {},
+    },
+    # Local development: full UI and execution, token from .env only, and no
+    # UI_ACCESS_TOKEN check, like the former app_local.py
+    'local': {
+        'blueprints': [
+            'routes.core_routes:core_blueprint',
+            'routes.status_routes:status_blueprint',
+            'routes.notebook_runner:notebook_blueprint',
+        ],
+        'ui': True,
+        'preload': [],
+        'prewarm': ['token', 'config', 'repo', 'kernel', 'script_engine'],
+        'run_queue': True,
+        'require_token': False,
+        'webhook_pull': True,
+        'env': {'USE_SECRET_MANAGER': '0'},
+    },
+    # Cloud Run default: full UI and execution, execution stack loaded lazily
+    'cloud': {
+        'blueprints': [
+            'routes.core_routes:core_blueprint',
+            'routes.status_routes:status_blueprint',
+            'routes.notebook_runner:notebook_blueprint',
+        ],
+        'ui': True,
+        'preload': [],
+        'prewarm': ['token', 'config', 'repo', 'kernel', 'script_engine'],
+        'run_queue': True,
+        'require_token': True,
+        'webhook_pull': True,
+        'env': {},
+    },
+    # Execution tier behind a separate UI tier: no pages, heavy stack loaded
+    # at startup so the first run doesn't pay for it
+    'worker': {
+        'blueprints': [
+            'routes.status_routes:status_blueprint',
+            'routes.notebook_runner:notebook_blueprint',
+        ],
+        'ui': False,
+        'preload': ['papermill', 'nbformat', 'nbconvert', 'git'],
+        'prewarm': ['token', 'config', 'repo', 'kernel', 'script_engine'],
+        'run_queue': True,
+        'require_token': True,
+        'webhook_pull': True,
+        'env': {},
+    },
+}
+
+DEFAULT_PROFILE = 'cloud'
+
+
+def _load_attribute(path):
+    module_name, attribute = path.split(':')
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def create_app(profile=None, debug=False, require_token=None):
+    """Create the Flask app for a capability profile (minimal, local, cloud, worker)
+
+    debug tells that the app will be served by app.run(debug=True), whose
+    reloader imports it once more in a watcher process that serves nothing.
+    require_token overrides the profile's UI_ACCESS_TOKEN check when not None.
+    """
+    profile = profile or os.environ.get('APP_PROFILE', DEFAULT_PROFILE)
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown APP_PROFILE '{profile}', expected one of: {', '.join(PROFILES)}")
+    settings = PROFILES[profile]
+
+    for key, value in settings['env'].items():
+        os.environ.setdefault(key, value)
+
+    for module_name in settings['preload']:
+        try:
+            importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"[WARN] Could not preload {module_name}: {e}", file=sys.stderr)
+
+    app = Flask(__name__)
+    app.config['PROFILE'] = profile
+    app.config['REQUIRE_TOKEN'] = settings['require_token'] if require_token is None else require_token
+    app.config['WEBHOOK_PULL'] = settings['webhook_pull']
+
+    for blueprint_path in settings['blueprints']:
+        app.register_blueprint(_load_attribute(blueprint_path))
+
+    if settings['ui']:
+        # Serve JS files
+        @app.route('/static/js/<path:filename>')
+        def serve_js(filename):
+            return send_from_directory('static/js', filename)
+
+    # Optional background prewarm of token, config, repo mirror and kernel;
+    # /ready reports progress while / and /status are served immediately
+    if settings['prewarm'] and os.environ.get('PREWARM', '0') == '1':
+        from utils.capabilities import NOTEBOOK_EXECUTION_AVAILABLE
+        from utils.prewarm import start_prewarm
+
+        tasks = settings['prewarm']
+        if not NOTEBOOK_EXECUTION_AVAILABLE:
+            tasks = [name for name in tasks if name not in ('repo', 'kernel', 'script_engine')]
+        # The script engine's fork server only pays off where it is the default engine
+        if os.environ.get('NOTEBOOK_ENGINE', 'papermill') != 'script':
+            tasks = [name for name in tasks if name != 'script_engine']
+        start_prewarm(tasks)
+
+    # Drain runs on SIGTERM and resume the runs a previous instance persisted;
+    # with the reloader only its child (WERKZEUG_RUN_MAIN) serves and runs them
+    reloader_parent = (debug or app.debug) and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
+    if settings['run_queue'] and not reloader_parent:
+        from utils import queue_utils
+        from utils.capabilities import NOTEBOOK_EXECUTION_AVAILABLE
+
+        queue_utils.install_drain_handler()
+        if queue_utils.RUN_QUEUE_RESUME and NOTEBOOK_EXECUTION_AVAILABLE:
+            from routes.notebook_runner import resume_queued_runs
+            resume_queued_runs(app)
+
+    print(f"[INFO] App created with profile '{profile}'", file=sys.stderr)
+    return app
@@ -0,0 +1,357 @@
+"""
+End-to-end benchmark for the notebook executor.
+
+Starts the Flask app from app.py against local stand-ins for everything it
+talks to over the network:
+
+  * a bare git repo (SOURCE_REPO_URL) containing run/notebook.ipynb and a
+    small synthetic notebook
+  * benchmarks/fake_github.py for the GitHub Contents / Git Data API
+  * benchmarks/stubs/google/cloud/secretmanager.py for Secret Manager
+
+then times /list-notebook-steps, /run-notebook (synthetic and real notebook)
+and the upload path, and writes the results as JSON to benchmarks/results/.
+
+    python benchmarks/e2e_bench.py
+    python benchmarks/e2e_bench.py --phases list_steps,run_synthetic --iterations 5
+    python benchmarks/e2e_bench.py --compare results/old.json results/new.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_DIR = os.path.dirname(BENCH_DIR)
+STUBS_DIR = os.path.join(BENCH_DIR, 'stubs')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+PHASES = ['list_steps', 'run_synthetic', 'run_notebook', 'upload']
+
+ACCESS_TOKEN = 'benchmark-access-token'
+SOURCE_REPO = 'modelearth/cloud'
+TARGET_REPO = 'modelearth/reports'
+
+
+def synthetic_notebook(files=3, size_kb=64, compute_ms=0, step_ms=0):
+    """A small script-style notebook with the same shape as run/notebook.ipynb"""
+    def code(source, tags=None):
+        return {'cell_type': 'code', 'execution_count': None, 'metadata': {'tags': tags or []},
+                'outputs': [], 'source': source}
+
+    return {
+        'cells': [
+            code('steps = []\nrun_timestamp = None\n', ['parameters']),
+            code('import os\nimport sys\nfrom datetime import datetime\n'
+                 'timestamp = run_timestamp or datetime.now().strftime("%Y%m%d-%H%M%S")\n'
+                 'local_output_dir = os.path.join("output", timestamp)\n'
+                 'os.makedirs(local_output_dir, exist_ok=True)\n'),
+            code('import time\n'
+                 f'for i in range({files}):\n'
+                 f'    time.sleep({compute_ms / 1000})\n'
+                 f'    with open(os.path.join(local_output_dir, f"data-{{i}}.bin"), "wb") as f:\n'
+                 f'        f.write(bytes([i % 256]) * {size_kb * 1024})\n'
+                 'print("Wrote", len(os.listdir(local_output_dir)), "files")\n'),
+            code(f'if "a" in steps:\n    time.sleep({step_ms / 1000})\n    print("step a")\n', ['step:a']),
+            code(f'if "b" in steps:\n    time.sleep({step_ms / 1000})\n    print("step b")\n', ['step:b']),
+        ],
+        'metadata': {'kernelspec': {'display_name': 'Python 3', 'language': 'python', 'name': 'python3'},
+                     'language_info': {'name': 'python'}},
+        'nbformat': 4,
+        'nbformat_minor': 5
+    }
+
+
+def git(*args, cwd):
+    subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+
+
+def build_source_repo(workdir, args, github):
+    """Create a bare repo standing in for SOURCE_REPO_URL and return its URL
+
+    The same files are seeded into the fake GitHub for the single-file fetch mode.
+    """
+    src = os.path.join(workdir, 'source')
+    os.makedirs(os.path.join(src, 'run'))
+    shutil.copy(os.path.join(RUN_DIR, 'notebook.ipynb'), os.path.join(src, 'run', 'notebook.ipynb'))
+    with open(os.path.join(src, 'run', 'synthetic.ipynb'), 'w') as f:
+        json.dump(synthetic_notebook(args.synthetic_files, args.synthetic_kb, args.synthetic_compute_ms,
+                                     args.synthetic_step_ms), f, indent=1)
+    git('init', '-q', '-b', 'main', cwd=src)
+    git('add', '.', cwd=src)
+    git('-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost', 'commit', '-q', '-m', 'Benchmark source', cwd=src)
+    bare = os.path.join(workdir, 'source.git')
+    git('clone', '-q', '--bare', src, bare, cwd=workdir)
+    for name in ('notebook.ipynb', 'synthetic.ipynb'):
+        with open(os.path.join(src, 'run', name), 'rb') as f:
+            github.put_file(SOURCE_REPO, f'run/{name}', f.read())
+    return f'file://{bare}'
+
+
+def configure_environment(workdir, source_url, github_url, args):
+    """Point the app, and the kernels it starts, at the local stand-ins"""
+    os.environ.update({
+        'APP_PROFILE': 'cloud',
+        'PREWARM': '0',
+        'UI_ACCESS_TOKEN': ACCESS_TOKEN,
+        'GOOGLE_CLOUD_PROJECT': 'benchmark',
+        'STUB_SECRET_TOKEN': 'benchmark-github-token',
+        'STUB_SECRET_LATENCY_MS': str(args.secret_latency_ms),
+        'SOURCE_REPO_URL': source_url,
+        'NOTEBOOK_FETCH_MODE': args.fetch_mode,
+        'SOURCE_RAW_URL': f'{github_url}/raw/{SOURCE_REPO}/main',
+        'FETCH_CACHE_DIR': os.path.join(workdir, 'fetch-cache'),
+        'NOTEBOOK_PATH': 'run/notebook.ipynb',
+        'GITHUB_API_URL': github_url,
+        'REPO_CACHE_DIR': os.path.join(workdir, 'repo-cache'),
+        'ARTIFACT_STORE_DIR': os.path.join(workdir, 'artifacts'),
+        'RUN_QUEUE_DIR': os.path.join(workdir, 'run-queue'),
+        'MPLBACKEND': 'Agg',
+        'PYTHONPATH': os.pathsep.join(filter(None, [STUBS_DIR, RUN_DIR, os.environ.get('PYTHONPATH')])),
+    })
+    # Without GITHUB_TOKEN get_github_token goes to the Secret Manager stub on
+    # every cache miss; runs pass the token to their kernels themselves
+    os.environ.pop('GITHUB_TOKEN', None)
+    sys.path[:0] = [STUBS_DIR, RUN_DIR]
+    os.chdir(RUN_DIR)
+
+
+def start_app():
+    """Import app.py, serve it on a local port and return (base_url, server, startup_seconds)"""
+    from werkzeug.serving import make_server
+
+    start = time.perf_counter()
+    import app as app_module
+    startup = time.perf_counter() - start
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='benchmark-app', daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server, startup
+
+
+def summarize(values):
+    if not values:
+        return {}
+    ordered = sorted(values)
+    return {
+        'n': len(ordered),
+        'min': round(ordered[0], 4),
+        'median': round(statistics.median(ordered), 4),
+        'mean': round(statistics.mean(ordered), 4),
+        'max': round(ordered[-1], 4),
+    }
+
+
+def _request_phase(session, base_url, method, path, payload=None):
+    def run():
+        response = session.request(method, f'{base_url}{path}', json=payload,
+                                   headers={'X-Access-Token': ACCESS_TOKEN}, timeout=600)
+        body = response.json()
+        if response.status_code != 200 or body.get('status') != 'success':
+            raise RuntimeError(f"{path} returned {response.status_code}: {body.get('message')}")
+        return body.get('timings', {})
+    return run
+
+
+def _upload_phase(github_url, workdir, args):
+    """Upload a folder of generated files to one fixed report folder, changing some files per iteration"""
+    from utils.upload_utils import PipelinedUploader
+
+    files_dir = os.path.join(workdir, 'upload-files')
+    os.makedirs(files_dir, exist_ok=True)
+    for i in range(args.upload_files):
+        with open(os.path.join(files_dir, f'artifact-{i}.bin'), 'wb') as f:
+            f.write(os.urandom(args.upload_kb * 1024))
+    changed = max(1, args.upload_files * args.upload_changed_pct // 100) if args.upload_changed_pct else 0
+    counter = iter(range(10 ** 6))
+
+    def run():
+        # Recurring runs: after the first iteration only `changed` files differ
+        if next(counter):
+            for i in random.sample(range(args.upload_files), changed):
+                with open(os.path.join(files_dir, f'artifact-{i}.bin'), 'wb') as f:
+                    f.write(os.urandom(args.upload_kb * 1024))
+        # The runner's upload path, with every file already written when it starts
+        uploader = PipelinedUploader('benchmark-github-token', files_dir, 'reports/benchmark',
+                                     repo=TARGET_REPO, api_url=github_url).start()
+        stats = uploader.finish()
+        if stats['failed']:
+            raise RuntimeError(f"Upload of {', '.join(stats['failed'])} failed")
+        return {}
+    return run
+
+
+def run_phase(name, run, iterations, github):
+    wall, server_timings, errors = [], {}, []
+    github.reset_stats()
+    for i in range(iterations):
+        start = time.perf_counter()
+        try:
+            timings = run()
+        except Exception as e:
+            errors.append(str(e))
+            print(f"  [{name}] iteration {i + 1}: FAILED - {e}", file=sys.stderr)
+            continue
+        elapsed = time.perf_counter() - start
+        wall.append(elapsed)
+        for phase, seconds in timings.items():
+            if isinstance(seconds, (int, float)):
+                server_timings.setdefault(phase, []).append(seconds)
+        print(f"  [{name}] iteration {i + 1}: {elapsed:.3f}s", file=sys.stderr)
+    return {
+        'wall_seconds': summarize(wall),
+        'server_timings': {phase: summarize(values) for phase, values in server_timings.items()},
+        'github_api': github.snapshot(),
+        'errors': errors,
+    }
+
+
+def git_revision():
+    def out(*args):
+        result = subprocess.run(['git', *args], cwd=RUN_DIR, capture_output=True, text=True)
+        return result.stdout.strip()
+    return {'commit': out('rev-parse', '--short', 'HEAD'), 'dirty': bool(out('status', '--porcelain', '--', '.'))}
+
+
+def run_benchmarks(args):
+    sys.path.insert(0, BENCH_DIR)
+    from fake_github import FakeGitHub
+    import requests
+
+    workdir = tempfile.mkdtemp(prefix='notebook-bench-')
+    github = FakeGitHub(latency_ms=args.github_latency_ms).start()
+    try:
+        source_url = build_source_repo(workdir, args, github)
+        configure_environment(workdir, source_url, github.url, args)
+        base_url, server, startup = start_app()
+        session = requests.Session()
+
+        phases = {
+            'list_steps': _request_phase(session, base_url, 'GET', '/list-notebook-steps'),
+            'run_synthetic': _request_phase(session, base_url, 'POST', '/run-notebook',
+                                            {'notebook_path': 'run/synthetic.ipynb', 'parameters': {'steps': ['a', 'b']},
+                                             'engine': args.engine, 'parallel_steps': args.parallel_steps}),
+            'run_notebook': _request_phase(session, base_url, 'POST', '/run-notebook',
+                                           {'parameters': {'folder': 'benchmark', 'models': 'xgboost'},
+                                            'steps': ['debug', 'preview', 'log_summary'],
+                                            'target_folder': 'reports/benchmark-notebook',
+                                            'engine': args.engine, 'parallel_steps': args.parallel_steps}),
+            'upload': _upload_phase(github.url, workdir, args),
+        }
+
+        results = {
+            'meta': {
+                **git_revision(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'args': vars(args),
+            },
+            'startup_seconds': round(startup, 4),
+            'phases': {},
+        }
+        for name in args.phases:
+            print(f"Running {name} x{args.iterations}", file=sys.stderr)
+            results['phases'][name] = run_phase(name, phases[name], args.iterations, github)
+        server.shutdown()
+        return results
+    finally:
+        github.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def print_results(results):
+    print(f"\nCommit {results['meta']['commit']}{' (dirty)' if results['meta']['dirty'] else ''}"
+          f" - app startup {results['startup_seconds'] * 1000:.0f} ms")
+    print(f"{'phase':<16}{'median':>10}{'min':>10}{'max':>10}  server phases (median)")
+    for name, phase in results['phases'].items():
+        wall = phase['wall_seconds']
+        if not wall:
+            print(f"{name:<16}{'failed':>10}  {phase['errors'][:1]}")
+            continue
+        server = ', '.join(f"{k}={v['median']:.3f}" for k, v in phase['server_timings'].items())
+        print(f"{name:<16}{wall['median']:>10.3f}{wall['min']:>10.3f}{wall['max']:>10.3f}  {server}")
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{base['meta']['commit']} -> {new['meta']['commit']} (median seconds)")
+    print(f"{'phase':<28}{'base':>10}{'new':>10}{'change':>10}")
+
+    def row(label, old, current):
+        change = f"{(current - old) / old * 100:+.1f}%" if old else 'n/a'
+        print(f"{label:<28}{old:>10.3f}{current:>10.3f}{change:>10}")
+
+    row('startup', base['startup_seconds'], new['startup_seconds'])
+    for name in base['phases']:
+        if name not in new['phases']:
+            continue
+        old_phase, new_phase = base['phases'][name], new['phases'][name]
+        if old_phase['wall_seconds'] and new_phase['wall_seconds']:
+            row(name, old_phase['wall_seconds']['median'], new_phase['wall_seconds']['median'])
+        for sub in old_phase['server_timings']:
+            if sub in new_phase['server_timings']:
+                row(f'  {name}.{sub}', old_phase['server_timings'][sub]['median'],
+                    new_phase['server_timings'][sub]['median'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--phases', default=','.join(PHASES), help=f'Comma-separated subset of {", ".join(PHASES)}')
+    parser.add_argument('--iterations', type=int, default=3)
+    parser.add_argument('--synthetic-files', type=int, default=3, help='Files written by the synthetic notebook')
+    parser.add_argument('--synthetic-kb', type=int, default=64, help='Size of each synthetic notebook file')
+    parser.add_argument('--synthetic-compute-ms', type=int, default=0,
+                        help='Simulated compute before each synthetic notebook file is written')
+    parser.add_argument('--upload-files', type=int, default=10, help='Files sent in the upload phase')
+    parser.add_argument('--upload-kb', type=int, default=256, help='Size of each uploaded file')
+    parser.add_argument('--upload-changed-pct', type=int, default=20,
+                        help='Percentage of upload files rewritten between iterations')
+    parser.add_argument('--engine', choices=['papermill', 'script'], default='papermill',
+                        help='Execution engine requested for the /run-notebook phases')
+    parser.add_argument('--synthetic-step-ms', type=int, default=0,
+                        help='Simulated compute in each of the synthetic notebook steps')
+    parser.add_argument('--parallel-steps', action='store_true',
+                        help='Ask /run-notebook to run independent steps in parallel')
+    parser.add_argument('--fetch-mode', choices=['git', 'file'], default='git',
+                        help='NOTEBOOK_FETCH_MODE: full git checkout or single-file fetch with ETags')
+    parser.add_argument('--github-latency-ms', type=float, default=0, help='Latency added by the fake GitHub API')
+    parser.add_argument('--secret-latency-ms', type=float, default=0, help='Latency added by the Secret Manager stub')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    args.phases = [name.strip() for name in args.phases.split(',') if name.strip()]
+    unknown = set(args.phases) - set(PHASES)
+    if unknown:
+        parser.error(f"Unknown phases: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks(args)
+    print_results(results)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{results['meta']['commit'] or 'unknown'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 1 if any(phase['errors'] for phase in results['phases'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
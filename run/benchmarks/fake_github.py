@@ -0,0 +1,363 @@
+"""
+Local stand-in for the GitHub REST API used by the notebook uploads.
+
+Implements the Contents API (GET/PUT /repos/{owner}/{repo}/contents/{path}),
+the Git Data API (refs, commits, trees, blobs) and a raw content endpoint with
+ETags, backed by an in-memory object store. Every request is counted so a
+benchmark can report API calls and bytes sent.
+
+    python benchmarks/fake_github.py --port 9000 --latency-ms 50
+    GITHUB_API_URL=http://127.0.0.1:9000 python app.py
+"""
+import argparse
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, unquote
+
+
+def git_blob_sha(data):
+    return hashlib.sha1(b'blob %d\0' % len(data) + data).hexdigest()
+
+
+def _object_sha(kind, payload):
+    return hashlib.sha1(f'{kind} '.encode() + json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class Repo:
+    """In-memory repository: flat trees (path -> blob sha), commits and branch refs"""
+
+    def __init__(self):
+        self.blobs = {}
+        self.trees = {}
+        self.commits = {}
+        self.refs = {}
+        empty_tree = self.add_tree({})
+        self.refs['heads/main'] = self.add_commit(empty_tree, [], 'Initial commit')
+
+    def add_blob(self, data):
+        sha = git_blob_sha(data)
+        self.blobs[sha] = data
+        return sha
+
+    def add_tree(self, entries):
+        sha = _object_sha('tree', entries)
+        self.trees[sha] = dict(entries)
+        return sha
+
+    def add_commit(self, tree, parents, message):
+        sha = _object_sha('commit', {'tree': tree, 'parents': parents, 'message': message, 'time': time.time()})
+        self.commits[sha] = {'tree': tree, 'parents': parents, 'message': message}
+        return sha
+
+    def head_tree(self, branch):
+        commit = self.refs.get(f'heads/{branch}')
+        if commit is None:
+            return None
+        return self.trees[self.commits[commit]['tree']]
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'FakeGitHub/1.0'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    # --- plumbing -----------------------------------------------------------------
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            body = b''.join(chunks)
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.server.record('bytes_received', len(body))
+        return body
+
+    def _json_body(self):
+        return json.loads(self._body) if self._body else {}
+
+    def _send(self, status, payload=None, raw=None, headers=None):
+        body = raw if raw is not None else (json.dumps(payload).encode() if payload is not None else b'')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/octet-stream' if raw is not None else 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.record('bytes_sent', len(body))
+
+    def _dispatch(self, method):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+
+        if path == '/_stats':
+            if method == 'DELETE':
+                self.server.reset_stats()
+            return self._send(200, self.server.snapshot())
+
+        if method == 'GET' and path.startswith('/raw/'):
+            return self._raw(path[len('/raw/'):])
+
+        if not self.headers.get('Authorization'):
+            self._read_body()
+            return self._send(401, {'message': 'Requires authentication'})
+
+        match = re.match(r'^/repos/([^/]+)/([^/]+)/(contents|git)(?:/(.*))?$', path)
+        if not match:
+            self._read_body()
+            return self._send(404, {'message': 'Not Found'})
+        owner, name, api, rest = match.groups()
+        rest = rest or ''
+        repo = self.server.repo(f'{owner}/{name}')
+        self.server.record(f'{method} {api}/{rest.split("/")[0] if api == "git" else "*"}')
+
+        # Read uploads before taking the store lock so slow bodies don't serialize requests
+        self._body = self._read_body() if method in ('PUT', 'POST', 'PATCH') else b''
+        with self.server.lock:
+            if api == 'contents':
+                return self._contents(method, repo, rest.strip('/'), query)
+            return self._git(method, repo, rest, query)
+
+    # --- Contents API ---------------------------------------------------------------
+
+    def _contents(self, method, repo, path, query):
+        branch = query.get('ref') or 'main'
+        if method == 'GET':
+            tree = repo.head_tree(branch) or {}
+            if path in tree:
+                data = repo.blobs[tree[path]]
+                return self._send(200, {
+                    'type': 'file', 'name': path.rsplit('/', 1)[-1], 'path': path,
+                    'sha': tree[path], 'size': len(data), 'encoding': 'base64',
+                    'content': base64.b64encode(data).decode()
+                })
+            prefix = f'{path}/' if path else ''
+            entries = {}
+            for entry_path, sha in tree.items():
+                if not entry_path.startswith(prefix):
+                    continue
+                child = entry_path[len(prefix):].split('/', 1)
+                child_path = prefix + child[0]
+                if len(child) == 1:
+                    entries[child_path] = {'type': 'file', 'name': child[0], 'path': child_path,
+                                           'sha': sha, 'size': len(repo.blobs[sha])}
+                else:
+                    entries.setdefault(child_path, {'type': 'dir', 'name': child[0], 'path': child_path,
+                                                    'sha': None, 'size': 0})
+            if not entries:
+                return self._send(404, {'message': 'Not Found'})
+            return self._send(200, sorted(entries.values(), key=lambda e: e['path']))
+
+        if method == 'PUT':
+            body = self._json_body()
+            branch = body.get('branch') or 'main'
+            tree = dict(repo.head_tree(branch) or {})
+            existing = tree.get(path)
+            if existing and body.get('sha') != existing:
+                return self._send(422 if not body.get('sha') else 409,
+                                  {'message': f'"sha" wasn\'t supplied or does not match for {path}'})
+            data = base64.b64decode(body.get('content', ''))
+            tree[path] = repo.add_blob(data)
+            parent = repo.refs[f'heads/{branch}']
+            commit = repo.add_commit(repo.add_tree(tree), [parent], body.get('message', ''))
+            repo.refs[f'heads/{branch}'] = commit
+            return self._send(200 if existing else 201, {
+                'content': {'path': path, 'sha': tree[path], 'size': len(data)},
+                'commit': {'sha': commit}
+            })
+
+        return self._send(405, {'message': 'Method Not Allowed'})
+
+    # --- Git Data API ---------------------------------------------------------------
+
+    def _git(self, method, repo, rest, query):
+        ref_match = re.match(r'^refs?/(heads/.+)$', rest)
+        if ref_match:
+            ref = ref_match.group(1)
+            if method == 'PATCH':
+                body = self._json_body()
+                if body.get('sha') not in repo.commits:
+                    return self._send(422, {'message': 'Object does not exist'})
+                repo.refs[ref] = body['sha']
+            if ref not in repo.refs:
+                return self._send(404, {'message': 'Not Found'})
+            return self._send(200, {'ref': f'refs/{ref}', 'object': {'type': 'commit', 'sha': repo.refs[ref]}})
+
+        kind, _, sha = rest.partition('/')
+        if method == 'POST':
+            body = self._json_body()
+            if kind == 'blobs':
+                content = body.get('content', '')
+                data = base64.b64decode(content) if body.get('encoding') == 'base64' else content.encode()
+                return self._send(201, {'sha': repo.add_blob(data), 'size': len(data)})
+            if kind == 'trees':
+                entries = dict(repo.trees.get(body.get('base_tree'), {}))
+                for entry in body.get('tree', []):
+                    if 'content' in entry:
+                        entries[entry['path']] = repo.add_blob(entry['content'].encode())
+                    elif entry.get('sha') is None:
+                        entries.pop(entry['path'], None)
+                    elif entry['sha'] not in repo.blobs:
+                        return self._send(422, {'message': f"Blob {entry['sha']} does not exist"})
+                    else:
+                        entries[entry['path']] = entry['sha']
+                return self._send(201, {'sha': repo.add_tree(entries)})
+            if kind == 'commits':
+                if body.get('tree') not in repo.trees:
+                    return self._send(422, {'message': 'Tree does not exist'})
+                commit = repo.add_commit(body['tree'], body.get('parents', []), body.get('message', ''))
+                return self._send(201, {'sha': commit, 'tree': {'sha': body['tree']}})
+
+        if method == 'GET':
+            if kind == 'commits' and sha in repo.commits:
+                commit = repo.commits[sha]
+                return self._send(200, {'sha': sha, 'tree': {'sha': commit['tree']},
+                                        'parents': [{'sha': p} for p in commit['parents']]})
+            if kind == 'trees':
+                # Accept "<branch>" or "<branch>:<folder>" as well as tree SHAs
+                branch, _, folder = sha.partition(':')
+                if sha in repo.trees:
+                    tree_sha, entries = sha, repo.trees[sha]
+                elif f'heads/{branch}' in repo.refs:
+                    tree_sha = repo.commits[repo.refs[f'heads/{branch}']]['tree']
+                    entries = repo.trees[tree_sha]
+                else:
+                    return self._send(404, {'message': 'Not Found'})
+                prefix = f'{folder.strip("/")}/' if folder else ''
+                return self._send(200, {'sha': tree_sha, 'truncated': False, 'tree': [
+                    {'path': path[len(prefix):], 'mode': '100644', 'type': 'blob',
+                     'sha': blob, 'size': len(repo.blobs[blob])}
+                    for path, blob in sorted(entries.items()) if path.startswith(prefix)
+                ]})
+            if kind == 'blobs' and sha in repo.blobs:
+                data = repo.blobs[sha]
+                return self._send(200, {'sha': sha, 'size': len(data), 'encoding': 'base64',
+                                        'content': base64.b64encode(data).decode()})
+            return self._send(404, {'message': 'Not Found'})
+
+        return self._send(405, {'message': 'Method Not Allowed'})
+
+    # --- raw.githubusercontent.com ------------------------------------------------
+
+    def _raw(self, rest):
+        self.server.record('GET raw')
+        owner, name, ref, path = (rest.split('/', 3) + ['', '', '', ''])[:4]
+        with self.server.lock:
+            tree = self.server.repo(f'{owner}/{name}').head_tree(ref) or {}
+            sha = tree.get(path)
+            data = self.server.repo(f'{owner}/{name}').blobs.get(sha) if sha else None
+        if data is None:
+            return self._send(404, raw=b'404: Not Found')
+        etag = f'"{sha}"'
+        if self.headers.get('If-None-Match') == etag:
+            self.server.record('raw_not_modified')
+            return self._send(304, raw=b'', headers={'ETag': etag})
+        return self._send(200, raw=data, headers={'ETag': etag})
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_PUT(self):
+        self._dispatch('PUT')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_PATCH(self):
+        self._dispatch('PATCH')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, host='127.0.0.1', port=0, latency_ms=0, verbose=False):
+        super().__init__((host, port), FakeGitHubHandler)
+        self.latency = latency_ms / 1000
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        self.stats_lock = threading.Lock()
+        self.repos = {}
+        self.stats = Counter()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def repo(self, full_name):
+        if full_name not in self.repos:
+            self.repos[full_name] = Repo()
+        return self.repos[full_name]
+
+    def put_file(self, full_name, path, data, branch='main'):
+        """Seed a file directly, bypassing the API (used to preload targets and raw content)"""
+        with self.lock:
+            repo = self.repo(full_name)
+            tree = dict(repo.head_tree(branch) or {})
+            tree[path] = repo.add_blob(data)
+            parent = repo.refs.get(f'heads/{branch}')
+            repo.refs[f'heads/{branch}'] = repo.add_commit(repo.add_tree(tree), [parent] if parent else [], f'Seed {path}')
+
+    def record(self, key, amount=1):
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def snapshot(self):
+        with self.stats_lock:
+            return dict(self.stats)
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats.clear()
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name='fake-github', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--latency-ms', type=float, default=0, help='Delay added to every request')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+
+    server = FakeGitHub(args.host, args.port, args.latency_ms, args.verbose)
+    print(f"Fake GitHub API listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
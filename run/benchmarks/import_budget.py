@@ -0,0 +1,90 @@
+"""
+Import-time budget check for the Flask entry point.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, parses
+the per-module timings and fails (exit code 1) when startup goes over the
+budget or when a heavy dependency is imported eagerly again.
+
+    python benchmarks/import_budget.py
+    python benchmarks/import_budget.py --budget-ms 400 --runs 5 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+RUN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+DEFAULT_BUDGET_MS = float(os.environ.get('IMPORT_BUDGET_MS', 400))
+
+# Modules that must only be imported by the routes that use them
+HEAVY_MODULES = [
+    'papermill',
+    'nbconvert',
+    'nbformat',
+    'git',
+    'google.cloud.secretmanager',
+]
+
+
+def measure_import(module='app'):
+    """Import `module` in a fresh interpreter and return {name: (self_us, cumulative_us)}"""
+    env = dict(os.environ)
+    # Dev settings from .env must not change what gets imported
+    env.setdefault('UI_ACCESS_TOKEN', 'import-budget')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=RUN_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        timings[name.strip()] = (int(self_us), int(cumulative_us))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help=f'Maximum cumulative import time in ms (default: {DEFAULT_BUDGET_MS:g})')
+    parser.add_argument('--runs', type=int, default=3,
+                        help='Number of fresh interpreters; the fastest run is compared to the budget')
+    parser.add_argument('--top', type=int, default=10, help='Show the N slowest modules')
+    args = parser.parse_args()
+
+    runs = [measure_import(args.module) for _ in range(max(args.runs, 1))]
+    best = min(runs, key=lambda t: t[args.module][1])
+    total_ms = best[args.module][1] / 1000
+
+    print(f"Import time for '{args.module}': {total_ms:.1f} ms (best of {len(runs)}, budget {args.budget_ms:g} ms)")
+    print("Slowest modules (cumulative):")
+    slowest = sorted(best.items(), key=lambda item: item[1][1], reverse=True)
+    for name, (self_us, cumulative_us) in slowest[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = [name for name in HEAVY_MODULES if name in best]
+    if eager:
+        failures.append(f"heavy modules imported at startup: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.1f} ms exceeds budget of {args.budget_ms:g} ms")
+
+    for failure in failures:
+        print(f"[FAIL] {failure}", file=sys.stderr)
+    if failures:
+        return 1
+    print("[OK] Import time within budget")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
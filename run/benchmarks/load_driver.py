@@ -0,0 +1,276 @@
+"""
+Concurrent load driver for the notebook executor.
+
+Replays a weighted mix of requests against a running instance with a ramp-up
+schedule of concurrency stages, and records throughput, error rate and
+p50/p95/p99 latency per endpoint and stage.
+
+    # against an instance that is already running
+    python benchmarks/load_driver.py --base-url http://localhost:8100 --token $UI_ACCESS_TOKEN
+
+    # start gunicorn locally with a given worker/thread layout
+    python benchmarks/load_driver.py --spawn --workers 1 --threads 8 --stages 8:30,16:30,80:30
+
+    # custom mix (weights) and comparison of two runs
+    python benchmarks/load_driver.py --mix "/=5,/status=5,/get-config=2,/list-notebook-steps=1"
+    python benchmarks/load_driver.py --compare results/load-a.json results/load-b.json
+
+Endpoints in the mix: /, /status, /get-config, /list-notebook-steps and
+/run-notebook. /run-notebook executes real notebooks, so give it a small
+weight or point the instance at the e2e benchmark stand-ins.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RUN_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# method, path, JSON body
+ENDPOINTS = {
+    '/': ('GET', '/', None),
+    '/status': ('GET', '/status', None),
+    '/get-config': ('GET', '/get-config', None),
+    '/list-notebook-steps': ('GET', '/list-notebook-steps', None),
+    '/run-notebook': ('POST', '/run-notebook', {'parameters': {}}),
+}
+
+DEFAULT_MIX = '/=4,/status=4,/get-config=2,/list-notebook-steps=1'
+DEFAULT_STAGES = '8:20,16:20,80:20'
+
+
+def parse_mix(text):
+    mix = {}
+    for item in text.split(','):
+        path, _, weight = item.strip().partition('=')
+        if path not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint '{path}', expected one of: {', '.join(ENDPOINTS)}")
+        mix[path] = float(weight or 1)
+    return mix
+
+
+def parse_stages(text):
+    """'8:30,16:30' -> [(8, 30.0), (16, 30.0)] as (concurrency, seconds)"""
+    stages = []
+    for item in text.split(','):
+        concurrency, _, seconds = item.strip().partition(':')
+        stages.append((int(concurrency), float(seconds or 30)))
+    return stages
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return None
+    # Nearest rank: the smallest value with at least pct% of samples at or below it
+    index = min(len(ordered) - 1, max(0, math.ceil(pct * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def summarize(samples, seconds):
+    latencies = sorted(s['latency'] for s in samples if s['ok'])
+    errors = sum(1 for s in samples if not s['ok'])
+    return {
+        'requests': len(samples),
+        'errors': errors,
+        'error_rate': round(errors / len(samples), 4) if samples else 0.0,
+        'throughput_rps': round(len(samples) / seconds, 2) if seconds else 0.0,
+        'p50_ms': _ms(percentile(latencies, 50)),
+        'p95_ms': _ms(percentile(latencies, 95)),
+        'p99_ms': _ms(percentile(latencies, 99)),
+        'max_ms': _ms(latencies[-1] if latencies else None),
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class LoadRunner:
+    def __init__(self, base_url, token, mix, timeout, ramp_seconds):
+        self.base_url = base_url.rstrip('/')
+        self.token = token
+        self.paths = list(mix)
+        self.weights = [mix[path] for path in self.paths]
+        self.timeout = timeout
+        self.ramp_seconds = ramp_seconds
+
+    def _worker(self, stop, samples, lock, delay):
+        import requests
+
+        session = requests.Session()
+        rng = random.Random()
+        if delay and stop.wait(delay):
+            return
+        while not stop.is_set():
+            path = rng.choices(self.paths, self.weights)[0]
+            method, url_path, body = ENDPOINTS[path]
+            start = time.perf_counter()
+            try:
+                response = session.request(method, f'{self.base_url}{url_path}', json=body,
+                                           headers={'X-Access-Token': self.token}, timeout=self.timeout)
+                ok, status = response.status_code < 400, response.status_code
+            except Exception as e:
+                ok, status = False, type(e).__name__
+            sample = {'path': path, 'latency': time.perf_counter() - start, 'ok': ok, 'status': status}
+            with lock:
+                samples.append(sample)
+
+    def run_stage(self, concurrency, seconds):
+        """Run `concurrency` closed-loop clients for `seconds`, starting them evenly over the ramp"""
+        stop, lock, samples = threading.Event(), threading.Lock(), []
+        ramp = min(self.ramp_seconds, seconds / 2)
+        threads = [
+            threading.Thread(target=self._worker, args=(stop, samples, lock, ramp * i / concurrency), daemon=True)
+            for i in range(concurrency)
+        ]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        time.sleep(seconds)
+        stop.set()
+        for thread in threads:
+            thread.join(self.timeout)
+        elapsed = time.perf_counter() - start
+
+        statuses = {}
+        for sample in samples:
+            statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+        return {
+            'concurrency': concurrency,
+            'seconds': round(elapsed, 2),
+            'overall': summarize(samples, elapsed),
+            'endpoints': {path: summarize([s for s in samples if s['path'] == path], elapsed)
+                          for path in self.paths},
+            'statuses': statuses,
+        }
+
+
+def spawn_server(args):
+    """Start gunicorn on app:app with the requested worker/thread layout"""
+    env = dict(os.environ, PORT=str(args.port), UI_ACCESS_TOKEN=args.token)
+    command = ['gunicorn', '--bind', f'127.0.0.1:{args.port}', '--workers', str(args.workers),
+               '--threads', str(args.threads), '--timeout', '0', 'app:app']
+    process = subprocess.Popen(command, cwd=RUN_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    import requests
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{args.port}/status', timeout=1)
+            return process
+        except Exception:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError('gunicorn did not start within 60 seconds')
+
+
+def print_report(results):
+    for stage in results['stages']:
+        overall = stage['overall']
+        print(f"\nConcurrency {stage['concurrency']} ({stage['seconds']}s): "
+              f"{overall['throughput_rps']} req/s, errors {overall['error_rate'] * 100:.1f}%")
+        print(f"  {'endpoint':<22}{'reqs':>7}{'rps':>8}{'err%':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+        for path, summary in stage['endpoints'].items():
+            print(f"  {path:<22}{summary['requests']:>7}{summary['throughput_rps']:>8}"
+                  f"{summary['error_rate'] * 100:>7.1f}{_fmt(summary['p50_ms'])}{_fmt(summary['p95_ms'])}"
+                  f"{_fmt(summary['p99_ms'])}")
+
+
+def _fmt(value):
+    return f"{value:>9.1f}" if value is not None else f"{'-':>9}"
+
+
+def compare(base_path, new_path):
+    with open(base_path) as f:
+        base = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{base['meta'].get('label') or base_path} -> {new['meta'].get('label') or new_path}")
+    base_stages = {stage['concurrency']: stage for stage in base['stages']}
+    for stage in new['stages']:
+        old = base_stages.get(stage['concurrency'])
+        if not old:
+            continue
+        print(f"\nConcurrency {stage['concurrency']}")
+        print(f"  {'endpoint':<22}{'metric':<16}{'base':>10}{'new':>10}{'change':>10}")
+        rows = [('overall', old['overall'], stage['overall'])]
+        rows += [(path, old['endpoints'][path], summary)
+                 for path, summary in stage['endpoints'].items() if path in old['endpoints']]
+        for label, before, after in rows:
+            for metric in ('throughput_rps', 'error_rate', 'p50_ms', 'p95_ms', 'p99_ms'):
+                a, b = before.get(metric), after.get(metric)
+                if a is None or b is None:
+                    continue
+                change = f"{(b - a) / a * 100:+.1f}%" if a else 'n/a'
+                print(f"  {label:<22}{metric:<16}{a:>10}{b:>10}{change:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8100')
+    parser.add_argument('--token', default=os.environ.get('UI_ACCESS_TOKEN', 'load-driver-token'),
+                        help='UI access token sent as X-Access-Token (default: $UI_ACCESS_TOKEN)')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Weighted endpoint mix (default: {DEFAULT_MIX})')
+    parser.add_argument('--stages', default=DEFAULT_STAGES,
+                        help=f'Concurrency:seconds stages, run in order (default: {DEFAULT_STAGES})')
+    parser.add_argument('--ramp-seconds', type=float, default=5, help='Spread client start-up over this time per stage')
+    parser.add_argument('--timeout', type=float, default=120, help='Per-request timeout in seconds')
+    parser.add_argument('--spawn', action='store_true', help='Start gunicorn app:app locally for the run')
+    parser.add_argument('--port', type=int, default=8181, help='Port for --spawn')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn --workers for --spawn')
+    parser.add_argument('--threads', type=int, default=8, help='gunicorn --threads for --spawn')
+    parser.add_argument('--label', help='Name for this run in reports')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/load-<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two results files and exit')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    mix, stages = parse_mix(args.mix), parse_stages(args.stages)
+    process = None
+    if args.spawn:
+        args.base_url = f'http://127.0.0.1:{args.port}'
+        process = spawn_server(args)
+
+    try:
+        runner = LoadRunner(args.base_url, args.token, mix, args.timeout, args.ramp_seconds)
+        results = {
+            'meta': {
+                'label': args.label or (f'workers={args.workers},threads={args.threads}' if args.spawn else args.base_url),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'base_url': args.base_url,
+                'mix': mix,
+                'workers': args.workers if args.spawn else None,
+                'threads': args.threads if args.spawn else None,
+            },
+            'stages': [],
+        }
+        for concurrency, seconds in stages:
+            print(f"Stage: {concurrency} clients for {seconds:g}s", file=sys.stderr)
+            results['stages'].append(runner.run_stage(concurrency, seconds))
+    finally:
+        if process:
+            process.send_signal(signal.SIGTERM)
+            process.wait(30)
+
+    print_report(results)
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
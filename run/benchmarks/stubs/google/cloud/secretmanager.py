@@ -0,0 +1,28 @@
+"""
+Stub of google.cloud.secretmanager for benchmarks.
+
+Put benchmarks/stubs on PYTHONPATH (the kernel inherits it) and the app and
+notebook resolve the GitHub token from STUB_SECRET_TOKEN instead of calling
+Google Cloud. STUB_SECRET_LATENCY_MS simulates the network round trip.
+"""
+import os
+import time
+
+
+class _Payload:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Response:
+    def __init__(self, data):
+        self.payload = _Payload(data)
+
+
+class SecretManagerServiceClient:
+    calls = 0
+
+    def access_secret_version(self, request=None, name=None):
+        SecretManagerServiceClient.calls += 1
+        time.sleep(float(os.environ.get('STUB_SECRET_LATENCY_MS', 0)) / 1000)
+        return _Response(os.environ.get('STUB_SECRET_TOKEN', 'stub-github-token').encode('UTF-8'))
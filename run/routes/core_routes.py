@@ -1,22 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from utils.auth_utils import require_token
 from utils.config_utils import load_config, save_config
-from utils.github_utils import get_github_token
-from utils.notebook_utils import SOURCE_REPO_URL, TARGET_REPO, NOTEBOOK_PATH, NOTEBOOK_EXECUTION_AVAILABLE
-import nbformat
-import yaml
-import os
+from utils import repo_cache
 import sys
 import json
 import subprocess
 
-# Check if running on Google Cloud
-try:
-    from google.cloud import secretmanager
-    CLOUD_AVAILABLE = True
-except ImportError:
-    CLOUD_AVAILABLE = False
-
 core_blueprint = Blueprint('core', __name__)
 
 @core_blueprint.route('/')
@@ -86,8 +75,7 @@ def save_config_route():
             config['service']['name'] = data['serviceName']
 
         # Save updated configuration
-        with open('config.yaml', 'w') as f:
-            yaml.dump(config, f, default_flow_style=False)
+        save_config(config)
 
         # Configuration is saved to file, will be reloaded on next request
         # Note: In production, you might want to implement proper config reloading
@@ -102,21 +90,6 @@ def save_config_route():
             'message': str(e)
         }), 500
 
-@core_blueprint.route('/status')
-def status():
-    """Show system status and available features"""
-    return jsonify({
-        'environment': 'local' if not CLOUD_AVAILABLE else 'cloud',
-        'cloud_available': CLOUD_AVAILABLE,
-        'notebook_execution_available': NOTEBOOK_EXECUTION_AVAILABLE,
-        'github_token_configured': bool(os.environ.get('GITHUB_TOKEN')),
-        'config': {
-            'source_repo': SOURCE_REPO_URL,
-            'target_repo': TARGET_REPO,
-            'notebook_path': NOTEBOOK_PATH
-        }
-    })
-
 @core_blueprint.route('/webhook', methods=['POST'])
 @require_token
 def webhook():
@@ -125,8 +98,12 @@ def webhook():
         payload = request.json
         print(f"[DEBUG] Webhook payload: {json.dumps(payload)}", file=sys.stderr)
 
+        # The minimal profile serves the UI only and has no checkout to update
+        if not current_app.config.get('WEBHOOK_PULL', True):
+            return jsonify({'status': 'success', 'message': 'Webhook received'})
         if payload.get('ref') == 'refs/heads/main':
             subprocess.run(["git", "pull"], cwd="/app")
+            repo_cache.invalidate()
             print("[DEBUG] Git pull triggered", file=sys.stderr)
             return jsonify({'status': 'success'})
         return jsonify({'status': 'no action'})
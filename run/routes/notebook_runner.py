@@ -1,8 +1,7 @@
-from flask import Blueprint, request, jsonify
-import sys, os, json, tempfile, nbformat, git
-from nbconvert import HTMLExporter
-import papermill as pm
+from flask import Blueprint, request, jsonify, send_file
+import sys, os, re, json, tempfile, uuid
 import traceback
+from datetime import datetime
 from utils.config_utils import load_config
 from utils.notebook_utils import (
     NOTEBOOK_PATH,
@@ -10,22 +9,36 @@ from utils.notebook_utils import (
     TARGET_REPO,
     execute_notebook_with_dependencies,
     execute_notebook_cloud,
-    execute_notebook_simulation,
-    NOTEBOOK_EXECUTION_AVAILABLE
+    execute_notebook_simulation
 )
+from utils.capabilities import NOTEBOOK_EXECUTION_AVAILABLE
 from utils.auth_utils import require_token
+from utils.github_utils import get_github_token
+from utils.timing_utils import timed
+from utils import dag_utils, fetch_utils, job_utils, output_utils, queue_utils, repo_cache, script_engine, upload_utils
+from utils.artifact_store import get_store
 
 notebook_blueprint = Blueprint('notebook', __name__)
 
+REQUEUED_MESSAGE = 'Instance shut down before the run finished; it will be resumed by the next instance'
+
 @notebook_blueprint.route('/run-notebook', methods=['POST'])
 @require_token
 def run_notebook():
-    try:
-        print(f"[INFO] /run-notebook triggered", file=sys.stderr)
-        payload = request.get_json(force=True, silent=True) or {}
+    print(f"[INFO] /run-notebook triggered", file=sys.stderr)
+    if queue_utils.draining():
+        return jsonify({'status': 'error', 'message': 'Instance is shutting down, retry shortly'}), 503, {'Retry-After': '5'}
+    payload = request.get_json(force=True, silent=True) or {}
+    return execute_run(payload)
 
+def execute_run(payload):
+    """Run a notebook for a /run-notebook payload; also used to resume persisted runs"""
+    job, outcome = None, None
+    try:
         notebook_path = payload.get("notebook_path", NOTEBOOK_PATH)
         parameters = payload.get("parameters", {})
+        engine = payload.get("engine") or script_engine.NOTEBOOK_ENGINE  # 'papermill' or 'script'
+        parallel_steps = payload.get("parallel_steps", dag_utils.PARALLEL_STEPS)
         steps = payload.get("steps", [])  # Optional, empty by default
         if steps:
             parameters['steps'] = steps
@@ -36,9 +49,44 @@ def run_notebook():
             print("[WARN] Notebook execution dependencies missing", file=sys.stderr)
             return jsonify(execute_notebook_simulation())
 
+        # Heavy execution stack is imported on first use, not at startup
+        import nbformat
+        import papermill as pm
+        from nbconvert import HTMLExporter
+
+        # Registers the run under job_id (client-supplied so it can be cancelled
+        # before this request returns) and waits for a free run slot
+        # The payload is persisted until the run ends so that another instance
+        # can resume it if this one shuts down first
+        timings = {}
+        job = job_utils.register(payload.get("job_id"))
+        queue_utils.save(job.id, payload=payload, state='queued')
+        with timed(timings, 'queue'):
+            job_utils.wait_for_slot(job)
+        run_timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        run_id = job.run_id = f"{run_timestamp}-{uuid.uuid4().hex[:8]}"
+
+        # The runner uploads output/<run_timestamp> itself. By default each run
+        # gets its own folder; recurring runs pass a fixed target_folder, and
+        # only then are files the folder already holds skipped
+        fixed_folder = bool(payload.get("target_folder"))
+        target_folder = payload.get("target_folder") or f"reports/run-{run_timestamp}"
+        upload = payload.get("upload", True)
+        parameters.update(run_timestamp=run_timestamp, target_folder=target_folder, upload_managed=True)
+
+        # Hand the (cached) token to this run's kernel or worker so the notebook
+        # doesn't make its own Secret Manager round trip; os.environ is left
+        # alone so rotation and /status keep seeing the real configuration
+        with timed(timings, 'token'):
+            token = get_github_token()
+        kernel_env = {'GITHUB_TOKEN': token} if token else None
+
         with tempfile.TemporaryDirectory() as temp_dir:
-            print(f"[DEBUG] Cloning {SOURCE_REPO_URL} into {temp_dir}", file=sys.stderr)
-            git.Repo.clone_from(SOURCE_REPO_URL, temp_dir)
+            with timed(timings, 'checkout'):
+                revision = prepare_source(temp_dir, notebook_path, token, revision=payload.get("revision"))
+            job.check()
+            # A resumed run checks out the same commit
+            queue_utils.save(job.id, state='running', revision=revision, run_id=run_id)
 
             notebook_file = os.path.join(temp_dir, notebook_path)
             output_path = os.path.join(temp_dir, 'executed.ipynb')
@@ -46,73 +94,265 @@ def run_notebook():
             if not os.path.exists(notebook_file):
                 raise FileNotFoundError(f"Notebook not found: {notebook_file}")
 
+            # Artifacts are uploaded while the notebook is still running; the
+            # commit happens after execution (see the upload barrier below)
+            uploader = None
+            local_output_dir = os.path.join(os.path.dirname(notebook_file), 'output', run_timestamp)
+            if upload and token:
+                try:
+                    uploader = upload_utils.PipelinedUploader(token, local_output_dir, target_folder,
+                                                              cancelled=lambda: job.cancelled,
+                                                              skip_unchanged=fixed_folder).start()
+                    job.on_cancel(uploader.abort)
+                except Exception as e:
+                    print(f"[ERROR] Could not start upload to {TARGET_REPO}: {e}", file=sys.stderr)
+            elif upload:
+                print("[WARN] No GitHub token available - skipping upload", file=sys.stderr)
+
             print(f"[DEBUG] Executing notebook: {notebook_file}", file=sys.stderr)
 
             try:
-                pm.execute_notebook(
-                    notebook_file,
-                    output_path,
-                    parameters=parameters
-                )
-                print("[DEBUG] Notebook executed", file=sys.stderr)
+                # Run the kernel next to the notebook so relative output paths
+                # stay inside the workspace
+                branches = None
+                if parallel_steps and parameters.get('steps'):
+                    with open(notebook_file, 'r') as f:
+                        branches = dag_utils.plan_branches(json.load(f), parameters['steps'])
+                    print(f"[DEBUG] Parallel step branches: {branches}", file=sys.stderr)
+
+                with timed(timings, 'execute'):
+                    if engine == 'script':
+                        try:
+                            script_engine.execute_notebook(
+                                notebook_file,
+                                output_path,
+                                parameters=parameters,
+                                cwd=os.path.dirname(notebook_file),
+                                cache_key=f"{revision}:{notebook_path}",
+                                branches=branches,
+                                on_start=job.track_process,
+                                env=kernel_env
+                            )
+                        except script_engine.NotScriptableError as e:
+                            print(f"[WARN] {e}; running it with papermill", file=sys.stderr)
+                            engine = 'papermill'
+                    if engine != 'script' and branches:
+                        with open(notebook_file, 'r') as f:
+                            branches = dag_utils.papermill_branches(json.load(f), branches)
+                    if engine != 'script' and branches:
+                        dag_utils.execute_papermill_parallel(
+                            notebook_file,
+                            output_path,
+                            parameters,
+                            os.path.dirname(notebook_file),
+                            branches,
+                            kernel_manager_class=job_utils.kernel_manager_class(job, kernel_env)
+                        )
+                    elif engine != 'script':
+                        pm.execute_notebook(
+                            notebook_file,
+                            output_path,
+                            parameters=parameters,
+                            cwd=os.path.dirname(notebook_file),
+                            kernel_manager_class=job_utils.kernel_manager_class(job, kernel_env)
+                        )
+                print(f"[DEBUG] Notebook executed with {engine}", file=sys.stderr)
             except Exception as e:
-                print(f"[ERROR] Execution failed: {e}", file=sys.stderr)
-                return jsonify({'status': 'error', 'message': f"Execution failed: {str(e)}"}), 500
+                if uploader:
+                    uploader.abort()
+                # A cancelled run still stores the cells that ran (below)
+                if not job.cancelled:
+                    print(f"[ERROR] Execution failed: {e}", file=sys.stderr)
+                    return jsonify({'status': 'error', 'message': f"Execution failed: {str(e)}"}), 500
+            finally:
+                job.untrack_processes()
+            cancelled = job.cancelled
+            if cancelled:
+                print(f"[INFO] Job {job.id} cancelled, keeping partial outputs", file=sys.stderr)
 
-            # Read and print notebook cell outputs
+            # Trim streams, move images out and keep the executed notebook
+            # compressed; the slim copy is what gets logged and exported
+            output_stats, artifact_stats = {}, {}
             try:
-                with open(output_path, 'r') as f:
-                    nb = nbformat.read(f, as_version=4)
+                if cancelled and not os.path.exists(output_path):
+                    raise FileNotFoundError("No cells finished before the run was cancelled")
+                with timed(timings, 'store'):
+                    run_dir = os.path.join(temp_dir, '_run')
+                    nb, stored_path, output_stats = output_utils.process_executed_notebook(output_path, run_dir)
+                    manifest = get_store().add_run(
+                        run_id,
+                        collect_run_files(stored_path, run_dir, os.path.dirname(notebook_file)),
+                        meta={
+                            'notebook_path': notebook_path,
+                            'parameters': parameters,
+                            'revision': revision,
+                            'status': 'cancelled' if cancelled else 'completed'
+                        })
+                    artifact_stats = {
+                        'files': len(manifest['files']),
+                        'stored_bytes': manifest['stored_bytes'],
+                        'deduplicated_bytes': manifest['deduplicated_bytes']
+                    }
 
-                for idx, cell in enumerate(nb.cells):
-                    if cell.cell_type != 'code':
+                for idx, cell in enumerate(nb['cells']):
+                    if cell['cell_type'] != 'code':
                         continue
                     outputs = cell.get('outputs', [])
                     for output in outputs:
-                        if output.output_type == 'stream':
-                            print(f"[NOTEBOOK CELL {idx}][{output.name}] {output.text}", file=sys.stderr)
-                        elif output.output_type == 'error':
-                            print(f"[NOTEBOOK CELL {idx}][ERROR] {output.ename}: {output.evalue}", file=sys.stderr)
-                        elif output.output_type == 'execute_result':
+                        if output['output_type'] == 'stream':
+                            print(f"[NOTEBOOK CELL {idx}][{output['name']}] {output['text']}", file=sys.stderr)
+                        elif output['output_type'] == 'error':
+                            print(f"[NOTEBOOK CELL {idx}][ERROR] {output['ename']}: {output['evalue']}", file=sys.stderr)
+                        elif output['output_type'] == 'execute_result':
                             text = output['data'].get('text/plain', '')
                             print(f"[NOTEBOOK CELL {idx}][RESULT] {text}", file=sys.stderr)
 
-                html_exporter = HTMLExporter()
-                html_data, _ = html_exporter.from_notebook_node(nb)
-                print(f"[DEBUG] Notebook HTML size: {len(html_data)} bytes", file=sys.stderr)
+                if not cancelled:
+                    with timed(timings, 'export'):
+                        html_exporter = HTMLExporter()
+                        html_data, _ = html_exporter.from_notebook_node(nbformat.from_dict(nb))
+                    print(f"[DEBUG] Notebook HTML size: {len(html_data)} bytes", file=sys.stderr)
 
             except Exception as e:
                 print(f"[WARN] Reading or logging notebook output failed: {e}", file=sys.stderr)
 
+            if cancelled or job.cancelled:
+                if uploader:
+                    uploader.abort()
+                return _cancelled_response(job, run_id, output_stats, artifact_stats, timings)
+
+            upload_stats = {}
+            if uploader:
+                try:
+                    with timed(timings, 'upload'):
+                        upload_stats = uploader.finish(f"Add {target_folder} from run {run_id}")
+                    # Too large for GitHub; these are only served from the artifact store
+                    upload_stats['oversize'] = [f"/runs/{run_id}/files/output/{run_timestamp}/{name}"
+                                                for name in upload_stats['oversize']]
+                except upload_utils.UploadCancelled as e:
+                    # Cancelled while finishing: the files may be sent, but nothing is committed
+                    print(f"[INFO] {e}", file=sys.stderr)
+                    return _cancelled_response(job, run_id, output_stats, artifact_stats, timings)
+                except Exception as e:
+                    print(f"[ERROR] Upload to {TARGET_REPO} failed: {e}", file=sys.stderr)
+                    upload_stats = {'error': str(e)}
+
+            print(f"[DEBUG] Run timings: {json.dumps(timings)}", file=sys.stderr)
+            outcome = 'succeeded'
             return jsonify({
                 'status': 'success',
-                'message': 'Notebook executed successfully'
+                'message': 'Notebook executed successfully',
+                'job_id': job.id,
+                'run_id': run_id,
+                'engine': engine,
+                'parallel_branches': len(branches or []),
+                'outputs': output_stats,
+                'artifacts': artifact_stats,
+                'upload': upload_stats,
+                'timings': timings
             })
 
+    except job_utils.JobExists as e:
+        # job is still None here, so the finally below leaves the other run alone
+        print(f"[WARN] {e}", file=sys.stderr)
+        return jsonify({'status': 'error', 'message': str(e), 'job': e.job.to_dict()}), 409
+    except job_utils.JobCancelled as e:
+        print(f"[INFO] {e} before execution", file=sys.stderr)
+        if job.requeue:
+            return jsonify({'status': 'requeued', 'message': REQUEUED_MESSAGE, 'job_id': job.id})
+        return jsonify({'status': 'cancelled', 'message': str(e), 'job_id': job.id})
     except Exception as e:
         print(f"[ERROR] /run-notebook error: {e}", file=sys.stderr)
         return jsonify({'status': 'error', 'message': str(e)}), 500
+    finally:
+        # The workspace is gone by now; hand the run slot to the next queued run
+        if job:
+            if job.requeue and outcome != 'succeeded':
+                queue_utils.save(job.id, state='requeued')
+            else:
+                queue_utils.remove(job.id)
+            if not job.done.is_set():
+                job_utils.finish(job, outcome)
+
+def _cancelled_response(job, run_id, output_stats, artifact_stats, timings):
+    return jsonify({
+        'status': 'requeued' if job.requeue else 'cancelled',
+        'message': REQUEUED_MESSAGE if job.requeue else 'Notebook run was cancelled',
+        'job_id': job.id,
+        'run_id': run_id,
+        'outputs': output_stats,
+        'artifacts': artifact_stats,
+        'timings': timings
+    })
+
+def prepare_source(temp_dir, notebook_path, token=None, notebook_only=False, revision=None):
+    """Put the notebook (and what it needs) into temp_dir; returns the commit SHA or the notebook's version
+
+    A commit SHA as revision pins the checkout to that commit; a single-file
+    fetch can't be pinned and only warns when the notebook's ETag changed.
+    """
+    pinned = revision if revision and re.fullmatch(r'[0-9a-f]{40}', revision) else None
+    if fetch_utils.NOTEBOOK_FETCH_MODE == 'file' and not pinned:
+        try:
+            etag = fetch_utils.fetch_workspace(temp_dir, notebook_path, token or get_github_token(),
+                                               notebook_only=notebook_only)
+            if etag is not fetch_utils.REQUIRES_REPO:
+                if revision and etag != revision:
+                    print(f"[WARN] {notebook_path} changed since {revision}, running {etag}", file=sys.stderr)
+                return etag
+            print(f"[DEBUG] {notebook_path} requires the full repo, checking it out", file=sys.stderr)
+        except Exception as e:
+            print(f"[WARN] Single-file fetch of {notebook_path} failed, falling back to git: {e}", file=sys.stderr)
+
+    print(f"[DEBUG] Checking out {SOURCE_REPO_URL}{f' at {pinned}' if pinned else ''} into {temp_dir}",
+          file=sys.stderr)
+    return repo_cache.checkout(temp_dir, revision=pinned).head.commit.hexsha
+
+def resume_queued_runs(app):
+    """Resume the runs earlier instances persisted (see queue_utils)"""
+    def run(entry):
+        with app.app_context():
+            execute_run(dict(entry['payload'], job_id=entry['job_id'], revision=entry.get('revision')))
+    return queue_utils.resume(run)
+
+def collect_run_files(stored_path, run_dir, notebook_dir):
+    """Files to keep for a run as {name: path}: the stored notebook, its assets and output/**"""
+    files = {os.path.basename(stored_path): stored_path}
+    assets_dir = os.path.join(run_dir, 'assets')
+    if os.path.isdir(assets_dir):
+        for filename in os.listdir(assets_dir):
+            files[f"assets/{filename}"] = os.path.join(assets_dir, filename)
+    output_dir = os.path.join(notebook_dir, 'output')
+    for root, _, filenames in os.walk(output_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            files[os.path.relpath(path, notebook_dir).replace(os.sep, '/')] = path
+    return files
 
 @notebook_blueprint.route('/list-notebook-steps', methods=['GET'])
 @require_token
 def list_notebook_steps():
-    import traceback
     try:
+        import nbformat
+
         print("[INFO] /list-notebook-steps triggered", file=sys.stderr)
         print(f"[DEBUG] NOTEBOOK_PATH: {NOTEBOOK_PATH}", file=sys.stderr)
 
-        # Clone the repo into a temp directory
+        timings = {}
+
+        # Only the notebook itself is needed to read its tags
         with tempfile.TemporaryDirectory() as temp_dir:
-            print(f"[DEBUG] Cloning {SOURCE_REPO_URL} into {temp_dir}", file=sys.stderr)
-            git.Repo.clone_from(SOURCE_REPO_URL, temp_dir)
+            with timed(timings, 'checkout'):
+                prepare_source(temp_dir, NOTEBOOK_PATH, notebook_only=True)
 
             notebook_file = os.path.join(temp_dir, NOTEBOOK_PATH)
             if not os.path.exists(notebook_file):
                 raise FileNotFoundError(f"Notebook not found at: {notebook_file}")
 
             print(f"[DEBUG] Parsing notebook for step tags: {notebook_file}", file=sys.stderr)
-            with open(notebook_file, 'r') as f:
-                nb = nbformat.read(f, as_version=4)
+            with timed(timings, 'parse'):
+                with open(notebook_file, 'r') as f:
+                    nb = nbformat.read(f, as_version=4)
 
             # Extract step tags like 'step:xyz'
             step_tags = set()
@@ -125,7 +365,8 @@ def list_notebook_steps():
             print(f"[DEBUG] Steps found: {step_tags}", file=sys.stderr)
             return jsonify({
                 "status": "success",
-                "steps": sorted(step_tags)
+                "steps": sorted(step_tags),
+                "timings": timings
             })
 
     except Exception as e:
@@ -135,3 +376,92 @@ def list_notebook_steps():
             "status": "error",
             "message": str(e)
         }), 500
+
+@notebook_blueprint.route('/runs', methods=['GET'])
+@require_token
+def list_runs():
+    """Stored runs, oldest first, and the store's size"""
+    store = get_store()
+    runs = [{
+        'run_id': manifest['run_id'],
+        'created': manifest['created'],
+        'meta': manifest['meta'],
+        'files': len(manifest['files']),
+        'bytes': sum(entry['size'] for entry in manifest['files'].values()),
+    } for manifest in store.runs()]
+    return jsonify({'status': 'success', 'runs': runs, 'store': store.stats()})
+
+@notebook_blueprint.route('/runs/<run_id>', methods=['GET'])
+@require_token
+def get_run(run_id):
+    """Manifest of a stored run: files with content hashes, sizes and run metadata"""
+    manifest = get_store().manifest(run_id)
+    if not manifest:
+        return jsonify({'status': 'error', 'message': f"Run not found: {run_id}"}), 404
+    return jsonify(manifest)
+
+@notebook_blueprint.route('/runs/<run_id>', methods=['DELETE'])
+@require_token
+def delete_run(run_id):
+    """Drop a stored run; blobs still referenced by other runs are kept"""
+    freed = get_store().delete_run(run_id)
+    if freed is None:
+        return jsonify({'status': 'error', 'message': f"Run not found: {run_id}"}), 404
+    return jsonify({'status': 'success', 'run_id': run_id, 'freed_bytes': freed})
+
+@notebook_blueprint.route('/runs/<run_id>/diff/<other_run_id>', methods=['GET'])
+@require_token
+def diff_runs(run_id, other_run_id):
+    """Files added, removed, changed and unchanged from run_id to other_run_id"""
+    diff = get_store().diff(run_id, other_run_id)
+    if diff is None:
+        return jsonify({'status': 'error', 'message': f"Run not found: {run_id} or {other_run_id}"}), 404
+    return jsonify(dict(diff, status='success'))
+
+@notebook_blueprint.route('/runs/<run_id>/files/<path:name>', methods=['GET'])
+@require_token
+def get_run_file(run_id, name):
+    path = get_store().file_path(run_id, name)
+    if not path or not os.path.exists(path):
+        return jsonify({'status': 'error', 'message': f"File not found: {run_id}/{name}"}), 404
+    return send_file(path, download_name=os.path.basename(name))
+
+@notebook_blueprint.route('/runs/<run_id>/notebook', methods=['GET'])
+@require_token
+def get_run_notebook(run_id):
+    """Executed notebook of a run, with extracted images inlined again"""
+    store = get_store()
+    manifest = store.manifest(run_id) or {'files': {}}
+    name = next((n for n in output_utils.notebook_filenames() if n in manifest['files']), None)
+    if not name:
+        return jsonify({'status': 'error', 'message': f"Run not found: {run_id}"}), 404
+    nb = output_utils.read_notebook(
+        store.file_path(run_id, name), name=name,
+        resolve_asset=lambda filename: store.file_path(run_id, f"assets/{filename}"))
+    return jsonify(nb)
+
+
+@notebook_blueprint.route('/jobs', methods=['GET'])
+@require_token
+def list_jobs():
+    return jsonify({'status': 'success', 'jobs': [job.to_dict() for job in job_utils.list_jobs()]})
+
+@notebook_blueprint.route('/jobs/<job_id>', methods=['GET'])
+@require_token
+def get_job(job_id):
+    job = job_utils.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': f"Job not found: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+@notebook_blueprint.route('/jobs/<job_id>', methods=['DELETE'])
+@require_token
+def cancel_job(job_id):
+    """Cancel a queued or running notebook run; waits (bounded) until its kernel and workspace are released"""
+    job = job_utils.get(job_id)
+    if not job:
+        return jsonify({'status': 'error', 'message': f"Job not found: {job_id}"}), 404
+    if not job.cancel():
+        return jsonify(dict(job.to_dict(), message='Job already finished')), 409
+    job.done.wait(job_utils.JOB_CANCEL_GRACE_SECONDS + 5)
+    return jsonify(job.to_dict())
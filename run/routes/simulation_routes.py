@@ -0,0 +1,22 @@
+from flask import Blueprint, jsonify
+from utils.auth_utils import require_token
+from utils.notebook_utils import execute_notebook_simulation
+import sys
+
+# Stand-in for the notebook blueprint on the UI-only tier, which never loads
+# papermill, nbconvert or GitPython
+simulation_blueprint = Blueprint('simulation', __name__)
+
+@simulation_blueprint.route('/run-notebook', methods=['POST'])
+@require_token
+def run_notebook():
+    print("[INFO] /run-notebook triggered on minimal profile - simulating", file=sys.stderr)
+    return jsonify(execute_notebook_simulation())
+
+@simulation_blueprint.route('/list-notebook-steps', methods=['GET'])
+@require_token
+def list_notebook_steps():
+    return jsonify({
+        'status': 'success',
+        'steps': []
+    })
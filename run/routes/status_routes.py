@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, current_app
+from utils.notebook_utils import SOURCE_REPO_URL, TARGET_REPO, NOTEBOOK_PATH
+from utils.capabilities import CLOUD_AVAILABLE, NOTEBOOK_EXECUTION_AVAILABLE
+from utils.prewarm import readiness
+from utils import queue_utils
+import os
+
+status_blueprint = Blueprint('status', __name__)
+
+@status_blueprint.route('/status')
+def status():
+    """Show system status and available features"""
+    return jsonify({
+        'environment': 'local' if not CLOUD_AVAILABLE else 'cloud',
+        'profile': current_app.config.get('PROFILE'),
+        'cloud_available': CLOUD_AVAILABLE,
+        'notebook_execution_available': NOTEBOOK_EXECUTION_AVAILABLE,
+        'github_token_configured': bool(os.environ.get('GITHUB_TOKEN')),
+        'config': {
+            'source_repo': SOURCE_REPO_URL,
+            'target_repo': TARGET_REPO,
+            'notebook_path': NOTEBOOK_PATH
+        }
+    })
+
+@status_blueprint.route('/ready')
+def ready():
+    """Readiness probe: 503 until the startup prewarm stage has finished, and again while draining"""
+    report = readiness()
+    if queue_utils.draining():
+        report.update(ready=False, draining=True)
+    return jsonify(report), 200 if report['ready'] else 503
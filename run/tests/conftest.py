@@ -0,0 +1,17 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+# Modules are imported as utils.* and routes.* with run/ as the root, like app.py does
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def github():
+    """benchmarks/fake_github.py serving on a free local port"""
+    from benchmarks.fake_github import FakeGitHub
+
+    server = FakeGitHub().start()
+    yield server
+    server.stop()
@@ -0,0 +1,101 @@
+from pathlib import Path
+
+import pytest
+
+import app_factory
+from app_factory import create_app
+from routes import core_routes
+from utils import queue_utils
+
+RUN_DIR = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(autouse=True)
+def run_dir(monkeypatch):
+    # Pages and config.yaml are read relative to run/, and the run queue is
+    # left alone: no SIGTERM handler, no resumed runs
+    monkeypatch.chdir(RUN_DIR)
+    monkeypatch.setenv('PREWARM', '0')
+    monkeypatch.setattr(queue_utils, 'RUN_QUEUE_RESUME', False)
+    installed = []
+    monkeypatch.setattr(queue_utils, 'install_drain_handler', lambda: installed.append(True))
+    return installed
+
+
+def routes(app):
+    return {(rule.rule, method) for rule in app.url_map.iter_rules() for method in rule.methods}
+
+
+def test_unknown_profile():
+    with pytest.raises(ValueError, match='Unknown APP_PROFILE'):
+        create_app('nope')
+
+
+def test_profile_from_environment(monkeypatch):
+    monkeypatch.setenv('APP_PROFILE', 'minimal')
+    assert create_app().config['PROFILE'] == 'minimal'
+    monkeypatch.delenv('APP_PROFILE')
+    assert create_app().config['PROFILE'] == app_factory.DEFAULT_PROFILE
+
+
+def test_profiles_register_their_routes():
+    minimal = routes(create_app('minimal'))
+    assert ('/', 'GET') in minimal and ('/run-notebook', 'POST') in minimal
+    assert ('/jobs', 'GET') not in minimal
+
+    cloud = routes(create_app('cloud'))
+    assert {('/', 'GET'), ('/jobs', 'GET'), ('/runs', 'GET'), ('/ready', 'GET')} <= cloud
+
+    # The execution tier serves no pages
+    worker = routes(create_app('worker'))
+    assert ('/', 'GET') not in worker and ('/config', 'GET') not in worker
+    assert ('/run-notebook', 'POST') in worker
+
+
+def test_token_checks(monkeypatch):
+    monkeypatch.setenv('UI_ACCESS_TOKEN', 'secret')
+    cloud = create_app('cloud').test_client()
+    assert cloud.get('/get-config').status_code == 401
+    assert cloud.get('/get-config', headers={'X-Access-Token': 'wrong'}).status_code == 401
+    assert cloud.get('/get-config', headers={'X-Access-Token': 'secret'}).status_code == 200
+    assert cloud.get('/get-config?token=secret').status_code == 200
+
+    for profile in ('minimal', 'local'):
+        assert create_app(profile).test_client().get('/get-config').status_code == 200
+    # app_unified.py keeps the cloud routes without the check
+    assert create_app('cloud', require_token=False).test_client().get('/get-config').status_code == 200
+
+
+def test_minimal_webhook_does_not_pull(monkeypatch):
+    pulls = []
+    monkeypatch.setattr(core_routes.subprocess, 'run', lambda *args, **kwargs: pulls.append(args))
+    monkeypatch.setattr(core_routes.repo_cache, 'invalidate', lambda: None)
+
+    response = create_app('minimal').test_client().post('/webhook', json={'ref': 'refs/heads/main'})
+    assert response.get_json() == {'status': 'success', 'message': 'Webhook received'}
+    assert pulls == []
+
+    response = create_app('local').test_client().post('/webhook', json={'ref': 'refs/heads/main'})
+    assert response.get_json() == {'status': 'success'}
+    assert pulls == [(['git', 'pull'],)]
+
+
+def test_local_profile_skips_secret_manager(monkeypatch):
+    monkeypatch.delenv('USE_SECRET_MANAGER', raising=False)
+    create_app('local')
+    assert app_factory.os.environ['USE_SECRET_MANAGER'] == '0'
+
+
+def test_run_queue_only_in_serving_process(monkeypatch, run_dir):
+    create_app('minimal')
+    assert run_dir == []
+    create_app('cloud')
+    assert run_dir == [True]
+
+    # Flask's reloader: the watcher process serves nothing, its child does
+    monkeypatch.delenv('WERKZEUG_RUN_MAIN', raising=False)
+    create_app('cloud', debug=True)
+    assert run_dir == [True]
+    monkeypatch.setenv('WERKZEUG_RUN_MAIN', 'true')
+    create_app('cloud', debug=True)
+    assert run_dir == [True, True]
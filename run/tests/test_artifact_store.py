@@ -0,0 +1,148 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app_factory import create_app
+from routes import notebook_runner
+from utils import artifact_store, queue_utils
+from utils.artifact_store import ArtifactStore
+
+
+@pytest.fixture
+def files(tmp_path):
+    def write(name, content):
+        path = tmp_path / 'src' / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+        return str(path)
+    return write
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ArtifactStore(str(tmp_path / 'store'), max_bytes=1000)
+
+
+def index(store):
+    with open(store._index_path()) as f:
+        return json.load(f)
+
+
+def test_identical_files_are_stored_once(store, files):
+    plot = files('plot.png', b'p' * 100)
+    first = store.add_run('r1', {'plot.png': plot, 'data.csv': files('data.csv', b'd' * 50)})
+    assert first['stored_bytes'] == 150 and first['deduplicated_bytes'] == 0
+
+    second = store.add_run('r2', {'plot.png': plot, 'copy.png': plot})
+    assert second['stored_bytes'] == 0 and second['deduplicated_bytes'] == 200
+    assert second['files']['plot.png'] == first['files']['plot.png']
+
+    blobs = index(store)['blobs']
+    assert blobs[first['files']['plot.png']['sha256']]['refs'] == 3
+    assert index(store)['bytes'] == 150
+    with open(store.file_path('r2', 'copy.png'), 'rb') as f:
+        assert f.read() == b'p' * 100
+    assert store.file_path('r2', 'missing') is None
+    assert store.file_path('nope', 'plot.png') is None
+
+
+def test_delete_run_keeps_shared_blobs(store, files):
+    shared = files('shared', b's' * 10)
+    store.add_run('r1', {'a': shared, 'b': files('only-r1', b'o' * 20)})
+    store.add_run('r2', {'a': shared})
+
+    assert store.delete_run('r1') == 20
+    assert store.manifest('r1') is None
+    assert os.path.exists(store.file_path('r2', 'a'))
+    assert store.stats() == {'blobs': 1, 'bytes': 10, 'runs': 1, 'max_bytes': 1000}
+    assert store.delete_run('r1') is None
+
+    assert store.delete_run('r2') == 10
+    assert [names for _, _, names in os.walk(os.path.join(store.root, 'blobs')) if names] == []
+
+
+def test_oldest_runs_are_evicted(store, files):
+    for i in range(4):
+        store.add_run(f"r{i}", {'out': files(f"out{i}", bytes([i]) * 400)})
+    # 1000 bytes fit two runs of 400; the run just added is always kept
+    assert [m['run_id'] for m in store.runs()] == ['r2', 'r3']
+    assert store.stats()['bytes'] == 800
+    assert store.manifest('r0') is None
+
+    # A run larger than the whole budget still survives its own add
+    store.add_run('big', {'out': files('big', b'x' * 2000)})
+    assert [m['run_id'] for m in store.runs()] == ['big']
+
+
+def test_readding_a_run_releases_its_old_files(store, files):
+    store.add_run('r1', {'out': files('v1', b'1' * 100)})
+    store.add_run('r1', {'out': files('v2', b'2' * 100)})
+    assert store.stats() == {'blobs': 1, 'bytes': 100, 'runs': 1, 'max_bytes': 1000}
+    with open(store.file_path('r1', 'out'), 'rb') as f:
+        assert f.read() == b'2' * 100
+
+
+def test_diff(store, files):
+    store.add_run('old', {'same': files('same', b's'), 'edit': files('e1', b'1'), 'gone': files('gone', b'g')})
+    store.add_run('new', {'same': files('same', b's'), 'edit': files('e2', b'2'), 'added': files('added', b'a')})
+    assert store.diff('old', 'new') == {
+        'added': ['added'], 'removed': ['gone'], 'changed': ['edit'], 'unchanged': ['same']}
+    assert store.diff('old', 'nope') is None
+
+
+def test_concurrent_adds(store, files):
+    shared = files('shared', b'x' * 10)
+    threads = [threading.Thread(target=store.add_run,
+                                args=(f"r{i}", {'a': shared, 'b': files(f"u{i}", bytes([i]) * 5)}))
+               for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(store.runs()) == 10
+    assert index(store)['blobs'][store.manifest('r0')['files']['a']['sha256']]['refs'] == 10
+    assert store.stats()['bytes'] == 60
+
+
+def test_get_store_is_created_once(tmp_path, monkeypatch):
+    created = []
+
+    def slow_store():
+        time.sleep(0.01)
+        created.append(ArtifactStore(str(tmp_path)))
+        return created[-1]
+
+    monkeypatch.setattr(artifact_store, '_store', None)
+    monkeypatch.setattr(artifact_store, 'ArtifactStore', slow_store)
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(artifact_store.get_store())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 1
+    assert all(store is created[0] for store in stores)
+
+
+def test_run_routes(store, files, monkeypatch):
+    monkeypatch.setattr(notebook_runner, 'get_store', lambda: store)
+    monkeypatch.setattr(queue_utils, 'RUN_QUEUE_RESUME', False)
+    monkeypatch.setattr(queue_utils, 'install_drain_handler', lambda: None)
+    store.add_run('r1', {'out/a.csv': files('a', b'a' * 10)}, meta={'status': 'completed'})
+    store.add_run('r2', {'out/a.csv': files('b', b'b' * 10)})
+    client = create_app('local').test_client()
+
+    body = client.get('/runs').get_json()
+    assert [(run['run_id'], run['files'], run['bytes']) for run in body['runs']] == [('r1', 1, 10), ('r2', 1, 10)]
+    assert body['runs'][0]['meta'] == {'status': 'completed'}
+    assert body['store']['blobs'] == 2
+    assert client.get('/runs/r1/files/out/a.csv').data == b'a' * 10
+    assert client.get('/runs/r1/diff/r2').get_json()['changed'] == ['out/a.csv']
+    assert client.get('/runs/r1/diff/r9').status_code == 404
+
+    assert client.delete('/runs/r1').get_json()['freed_bytes'] == 10
+    assert client.delete('/runs/r1').status_code == 404
+    assert client.get('/runs/r1').status_code == 404
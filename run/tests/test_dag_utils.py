@@ -0,0 +1,55 @@
+import pytest
+
+from utils.dag_utils import papermill_branches, plan_branches
+
+
+def code(*tags, source=''):
+    return {'cell_type': 'code', 'source': source, 'metadata': {'tags': list(tags)}}
+
+
+def markdown():
+    return {'cell_type': 'markdown', 'source': '', 'metadata': {}}
+
+
+def notebook(*cells):
+    return {'cells': list(cells), 'metadata': {}}
+
+
+def test_independent_steps_get_a_branch_each():
+    nb = notebook(code('parameters'), code(), code('step:a'), markdown(), code('step:b'), code('step:c'))
+    assert plan_branches(nb, ['a', 'b', 'c']) == [[2], [4], [5]]
+
+
+def test_after_tags_join_branches():
+    nb = notebook(code(), code('step:a'), code('step:b', 'after:a'), code('step:c'), code('step:d', 'after:b'))
+    assert plan_branches(nb, ['a', 'b', 'c', 'd']) == [[1, 2, 4], [3]]
+
+
+def test_only_selected_steps_are_split_off():
+    nb = notebook(code(), code('step:a'), code('step:b'), code('step:c'))
+    # b is not selected: a guarded no-op that stays in the main run
+    assert plan_branches(nb, ['a', 'c']) == [[1], [3]]
+    # Dependencies on unselected steps are ignored
+    nb = notebook(code(), code('step:a'), code('step:b', 'after:x'))
+    assert plan_branches(nb, ['a', 'b']) == [[1], [2]]
+
+
+@pytest.mark.parametrize('nb, steps', [
+    # Nothing selected, or only one branch
+    (notebook(code(), code('step:a'), code('step:b')), []),
+    (notebook(code(), code('step:a'), code('step:b')), ['a']),
+    (notebook(code(), code('step:a'), code('step:b', 'after:a')), ['a', 'b']),
+    # Plain code between the steps
+    (notebook(code(), code('step:a'), code(), code('step:b')), ['a', 'b']),
+    # A dependency that runs later
+    (notebook(code(), code('step:a', 'after:b'), code('step:b')), ['a', 'b']),
+])
+def test_sequential_notebooks(nb, steps):
+    assert plan_branches(nb, steps) is None
+
+
+def test_papermill_needs_no_code_after_the_steps():
+    steps = [code('step:a'), code('step:b')]
+    assert papermill_branches(notebook(code(), *steps, markdown()), [[1], [2]]) == [[1], [2]]
+    assert papermill_branches(notebook(code(), *steps, code()), [[1], [2]]) is None
+    assert papermill_branches(notebook(code(), *steps), None) is None
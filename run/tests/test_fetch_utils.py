@@ -0,0 +1,85 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from utils import fetch_utils
+
+REPO = 'owner/source'
+
+
+@pytest.fixture
+def raw(github, tmp_path, monkeypatch):
+    """Raw content URLs of REPO's main branch on the fake GitHub, with an empty cache"""
+    monkeypatch.setattr(fetch_utils, 'SOURCE_RAW_URL', f"{github.url}/raw/{REPO}/main")
+    monkeypatch.setattr(fetch_utils, 'FETCH_CACHE_DIR', str(tmp_path / 'cache'))
+    return github
+
+
+def notebook(**runner):
+    return json.dumps({'cells': [], 'metadata': {'runner': runner} if runner else {},
+                       'nbformat': 4, 'nbformat_minor': 5}).encode()
+
+
+def test_etag_revalidation(raw):
+    raw.put_file(REPO, 'run/notebook.ipynb', b'v1')
+    path, etag, status = fetch_utils.fetch_file('run/notebook.ipynb')
+    assert status == 'downloaded'
+    assert Path(path).read_bytes() == b'v1'
+
+    # Unchanged: answered with a 304 and served from the cache
+    assert fetch_utils.fetch_file('run/notebook.ipynb') == (path, etag, 'not_modified')
+    assert raw.snapshot()['raw_not_modified'] == 1
+
+    raw.put_file(REPO, 'run/notebook.ipynb', b'v2')
+    path, new_etag, status = fetch_utils.fetch_file('run/notebook.ipynb')
+    assert status == 'downloaded' and new_etag != etag
+    assert Path(path).read_bytes() == b'v2'
+
+
+def test_missing_file(raw):
+    with pytest.raises(Exception, match='404'):
+        fetch_utils.fetch_file('run/missing.ipynb')
+
+
+def test_version_without_etag(raw, monkeypatch):
+    raw.put_file(REPO, 'run/notebook.ipynb', b'v1')
+    send = raw.RequestHandlerClass._send
+
+    def without_etag(self, status, payload=None, raw=None, headers=None):
+        return send(self, status, payload, raw, {k: v for k, v in (headers or {}).items() if k != 'ETag'})
+
+    monkeypatch.setattr(raw.RequestHandlerClass, '_send', without_etag)
+    _, first, _ = fetch_utils.fetch_file('run/notebook.ipynb')
+    _, second, status = fetch_utils.fetch_file('run/notebook.ipynb')
+    # Downloaded again each time, but the version follows the content
+    assert status == 'downloaded'
+    assert first == second and first.startswith('sha1:')
+
+
+def test_workspace_with_declared_files(raw, tmp_path):
+    raw.put_file(REPO, 'run/notebook.ipynb', notebook(files=['run/helpers.py', 'data/input.csv']))
+    raw.put_file(REPO, 'run/helpers.py', b'def helper(): pass\n')
+    raw.put_file(REPO, 'data/input.csv', b'a,b\n')
+    dest = tmp_path / 'workspace'
+
+    etag = fetch_utils.fetch_workspace(str(dest), 'run/notebook.ipynb')
+    assert etag and etag is not fetch_utils.REQUIRES_REPO
+    assert (dest / 'run' / 'helpers.py').read_bytes() == b'def helper(): pass\n'
+    assert (dest / 'data' / 'input.csv').read_bytes() == b'a,b\n'
+
+
+def test_workspace_requires_repo(raw, tmp_path):
+    raw.put_file(REPO, 'run/notebook.ipynb', notebook(requires_repo=True))
+    assert fetch_utils.fetch_workspace(str(tmp_path), 'run/notebook.ipynb') is fetch_utils.REQUIRES_REPO
+
+
+@pytest.mark.parametrize('path', ['../escape.py', 'run/../../escape.py', '/tmp/escape.py', '.'])
+def test_declared_files_stay_in_the_workspace(raw, tmp_path, path):
+    raw.put_file(REPO, 'run/notebook.ipynb', notebook(files=[path]))
+    dest = tmp_path / 'deep' / 'workspace'
+    with pytest.raises(ValueError, match='outside the workspace'):
+        fetch_utils.fetch_workspace(str(dest), 'run/notebook.ipynb')
+    assert not (tmp_path / 'deep' / 'escape.py').exists()
+    # Rejected before it is downloaded; only the notebook was
+    assert raw.snapshot()['GET raw'] == 1
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from utils import job_utils
+from utils.job_utils import Job, JobCancelled, JobExists, _Slots
+
+
+def acquire_in_thread(slots, job, acquired):
+    def run():
+        try:
+            slots.acquire(job)
+            acquired.append(job.id)
+        except JobCancelled:
+            acquired.append(f"cancelled {job.id}")
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_slots_limit_and_fifo_order():
+    slots = _Slots(2)
+    first, second = Job('first'), Job('second')
+    slots.acquire(first)
+    slots.acquire(second)
+    assert slots.running == 2
+
+    acquired, threads = [], []
+    waiting = [Job(f"w{n}") for n in range(3)]
+    for job in waiting:
+        threads.append(acquire_in_thread(slots, job, acquired))
+        wait_for(lambda: slots.position(job) is not None)
+    assert [slots.position(job) for job in waiting] == [0, 1, 2]
+    assert acquired == []
+
+    for n in range(len(waiting)):
+        slots.release()
+        wait_for(lambda: len(acquired) == n + 1)
+    for thread in threads:
+        thread.join(5)
+    assert acquired == ['w0', 'w1', 'w2']
+    assert slots.running == 2
+
+
+def test_slots_cancel_while_waiting():
+    slots = _Slots(1)
+    slots.acquire(Job('running'))
+    acquired = []
+    queued, behind = Job('queued'), Job('behind')
+    threads = [acquire_in_thread(slots, queued, acquired)]
+    wait_for(lambda: slots.position(queued) == 0)
+    threads.append(acquire_in_thread(slots, behind, acquired))
+    wait_for(lambda: slots.position(behind) == 1)
+
+    queued._cancel.set()
+    slots.wake()
+    threads[0].join(5)
+    assert acquired == ['cancelled queued']
+    assert slots.position(behind) == 0
+
+    slots.release()
+    threads[1].join(5)
+    assert acquired == ['cancelled queued', 'behind']
+
+
+def test_no_limit():
+    slots = _Slots(0)
+    for n in range(5):
+        slots.acquire(Job(str(n)))
+    assert slots.running == 5
+
+
+def test_register_rejects_a_job_id_in_use():
+    job = job_utils.register('test-register-duplicate')
+    with pytest.raises(JobExists) as excinfo:
+        job_utils.register('test-register-duplicate')
+    assert excinfo.value.job is job
+    job_utils.finish(job, 'succeeded')
+    # A finished job's id can be used again
+    again = job_utils.register('test-register-duplicate')
+    assert again is not job
+    job_utils.finish(again, 'succeeded')
@@ -0,0 +1,94 @@
+import base64
+import hashlib
+import json
+import os
+
+import pytest
+
+from utils import output_utils
+
+PNG = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+
+
+def code_cell(*outputs):
+    return {'cell_type': 'code', 'execution_count': 1, 'metadata': {}, 'source': ['x = 1\n', 'x'],
+            'outputs': list(outputs)}
+
+
+def stream(text, name='stdout'):
+    return {'output_type': 'stream', 'name': name, 'text': text}
+
+
+def image(payload=PNG):
+    return {'output_type': 'display_data', 'metadata': {},
+            'data': {'image/png': base64.b64encode(payload).decode('ascii'), 'text/plain': '<Figure>'}}
+
+
+def notebook(*cells):
+    return {'cells': list(cells), 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}
+
+
+def test_short_streams_are_kept():
+    nb = notebook(code_cell(stream('hello\n'), stream('oops\n', 'stderr')))
+    assert output_utils.trim_stream_outputs(nb, max_chars=100) == 0
+    assert nb['cells'][0]['outputs'] == [stream('hello\n'), stream('oops\n', 'stderr')]
+
+
+def test_long_streams_keep_head_and_tail():
+    # Consecutive chunks of one stream are merged before trimming
+    nb = notebook(code_cell(stream('a' * 60), stream(['b' * 30, 'c' * 30]), stream('err', 'stderr')))
+    removed = output_utils.trim_stream_outputs(nb, max_chars=40)
+    outputs = nb['cells'][0]['outputs']
+    assert removed == 80
+    assert len(outputs) == 2
+    assert outputs[0]['text'] == f"{'a' * 20}\n... [80 characters trimmed] ...\n{'c' * 20}"
+    assert outputs[1] == stream('err', 'stderr')
+
+
+def test_no_limit():
+    nb = notebook(code_cell(stream('a' * 1000)))
+    assert output_utils.trim_stream_outputs(nb, max_chars=0) == 0
+    assert nb['cells'][0]['outputs'][0]['text'] == 'a' * 1000
+
+
+def test_extract_binary_outputs(tmp_path):
+    nb = notebook(code_cell(image()), code_cell(image()))
+    assets = output_utils.extract_binary_outputs(nb, str(tmp_path))
+    filename = f"{hashlib.sha256(PNG).hexdigest()}.png"
+    # The same image twice is one file
+    assert assets == {filename: len(PNG)}
+    assert os.listdir(tmp_path) == [filename]
+    assert (tmp_path / filename).read_bytes() == PNG
+    for cell in nb['cells']:
+        output = cell['outputs'][0]
+        assert output['data'] == {'text/plain': '<Figure>'}
+        assert output['metadata'][output_utils.EXTRACTED_KEY] == {'image/png': filename}
+
+
+@pytest.mark.parametrize('compression', ['gzip', 'none'])
+def test_round_trip(tmp_path, compression):
+    original = notebook(code_cell(stream('done\n'), image()))
+    nb = json.loads(json.dumps(original))
+    output_utils.join_multiline(nb)
+    assets_dir = str(tmp_path / 'assets')
+    output_utils.extract_binary_outputs(nb, assets_dir)
+    path = output_utils.write_notebook(nb, str(tmp_path / 'executed'), compression=compression)
+    assert path.endswith(output_utils.EXTENSIONS[compression])
+
+    restored = output_utils.read_notebook(path, assets_dir=assets_dir)
+    output_utils.join_multiline(original)
+    assert restored == original
+
+
+def test_process_executed_notebook(tmp_path):
+    limit = output_utils.MAX_STREAM_CHARS
+    executed = tmp_path / 'executed.ipynb'
+    executed.write_text(json.dumps(notebook(code_cell(stream('x' * (limit + 100)), image()))))
+
+    nb, stored_path, stats = output_utils.process_executed_notebook(str(executed), str(tmp_path / 'run'))
+    assert os.path.basename(stored_path) in output_utils.notebook_filenames()
+    assert stats['trimmed_chars'] == limit + 100 - 2 * (limit // 2)
+    assert stats['stored_bytes'] < stats['executed_bytes']
+    assert stats['assets'] == 1 and stats['asset_bytes'] == len(PNG)
+    assert stats['executed_bytes'] == executed.stat().st_size
+    assert output_utils.read_notebook(stored_path) == nb
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import pytest
+
+from app_factory import create_app
+from utils import github_utils, prewarm, queue_utils
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(prewarm, '_state', {'enabled': False, 'started': None, 'finished': None, 'tasks': {}})
+    monkeypatch.setattr(prewarm, 'TASKS', dict(prewarm.TASKS))
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_ready_without_prewarm():
+    report = prewarm.readiness()
+    assert report == {'ready': True, 'prewarm_enabled': False, 'tasks': {}}
+
+
+def test_tasks_run_concurrently_and_report():
+    # Each task waits for the other, so this only finishes if they overlap
+    barrier = threading.Barrier(2, timeout=5)
+    release = threading.Event()
+
+    def first():
+        barrier.wait()
+        release.wait(5)
+
+    def second():
+        barrier.wait()
+        raise RuntimeError('no token')
+
+    prewarm.TASKS.update(first=first, second=second)
+    prewarm.start_prewarm(['first', 'second'])
+    wait_for(lambda: prewarm.readiness()['tasks']['second']['status'] == 'failed')
+    report = prewarm.readiness()
+    assert report['prewarm_enabled'] and not report['ready']
+    assert report['tasks']['first']['status'] == 'running'
+    assert report['tasks']['second']['error'] == 'no token'
+
+    # A failed task doesn't keep the instance from becoming ready
+    release.set()
+    wait_for(lambda: prewarm.readiness()['ready'])
+    assert prewarm.readiness()['tasks']['first']['status'] == 'done'
+
+
+def test_started_once():
+    calls = []
+    prewarm.TASKS['count'] = lambda: calls.append(1)
+    prewarm.start_prewarm(['count'])
+    prewarm.start_prewarm(['count'])
+    wait_for(lambda: prewarm.readiness()['ready'])
+    assert calls == [1]
+
+
+def test_ready_route(monkeypatch):
+    client = create_app('minimal').test_client()
+    release = threading.Event()
+    prewarm.TASKS['slow'] = lambda: release.wait(5)
+    prewarm.start_prewarm(['slow'])
+    assert client.get('/ready').status_code == 503
+    release.set()
+    wait_for(lambda: prewarm.readiness()['ready'])
+    assert client.get('/ready').status_code == 200
+
+    # Draining instances stop taking traffic
+    monkeypatch.setattr(queue_utils, '_draining', threading.Event())
+    queue_utils._draining.set()
+    response = client.get('/ready')
+    assert response.status_code == 503 and response.get_json()['draining']
+
+
+def test_token_is_cached(monkeypatch):
+    monkeypatch.setattr(github_utils, '_token_cache', {'token': None, 'expires': 0.0})
+    lookups = []
+    monkeypatch.setattr(github_utils, '_lookup_github_token', lambda: lookups.append(1) or f"token-{len(lookups)}")
+    assert github_utils.get_github_token() == 'token-1'
+    assert github_utils.get_github_token() == 'token-1'
+    assert github_utils.get_github_token(refresh=True) == 'token-2'
+    monkeypatch.setattr(github_utils, 'TOKEN_CACHE_SECONDS', 0)
+    github_utils.get_github_token(refresh=True)
+    assert github_utils.get_github_token() == 'token-4'
@@ -0,0 +1,84 @@
+import os
+import socket
+import threading
+
+import pytest
+
+from utils import queue_utils
+
+
+@pytest.fixture(autouse=True)
+def queue_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(queue_utils, 'RUN_QUEUE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def dead_pid():
+    pid = os.fork()
+    if pid == 0:
+        os._exit(0)
+    os.waitpid(pid, 0)
+    return pid
+
+
+def test_claimable_entries():
+    host = socket.gethostname()
+    assert queue_utils._claimable({'state': 'requeued', 'instance': 'elsewhere:1'})
+    # Left behind by a process on this host that is gone
+    assert queue_utils._claimable({'state': 'running', 'instance': f"{host}:{dead_pid()}"})
+    # Still owned by a live process, or by another host we can't check
+    assert not queue_utils._claimable({'state': 'running', 'instance': f"{host}:{os.getpid()}"})
+    assert not queue_utils._claimable({'state': 'queued', 'instance': 'elsewhere:1'})
+
+
+def test_claim_takes_over_the_entry():
+    queue_utils.save('job-1', payload={'parameters': {}}, state='requeued', revision='abc')
+    entry = queue_utils._claim(queue_utils.entries()[0])
+    assert entry['attempts'] == 1
+    assert entry['state'] == 'queued'
+    assert entry['instance'] == queue_utils.INSTANCE
+    assert entry['revision'] == 'abc'
+    assert queue_utils.entries() == [entry]
+
+
+def test_only_one_claim_wins():
+    queue_utils.save('job-1', payload={}, state='requeued')
+    entry = queue_utils.entries()[0]
+    barrier = threading.Barrier(8)
+    results = []
+
+    def claim():
+        barrier.wait()
+        results.append(queue_utils._claim(dict(entry)))
+
+    threads = [threading.Thread(target=claim) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len([result for result in results if result]) == 1
+
+
+def test_claim_drops_runs_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(queue_utils, 'RUN_QUEUE_MAX_ATTEMPTS', 2)
+    queue_utils.save('job-1', payload={}, state='requeued')
+    for attempt in (1, 2):
+        entry = queue_utils._claim(queue_utils.entries()[0])
+        assert entry['attempts'] == attempt
+        queue_utils.save('job-1', state='requeued')
+    assert queue_utils._claim(queue_utils.entries()[0]) is None
+    assert queue_utils.entries() == []
+
+
+def test_claim_of_a_removed_entry():
+    queue_utils.save('job-1', payload={}, state='requeued')
+    entry = queue_utils.entries()[0]
+    queue_utils.remove('job-1')
+    assert queue_utils._claim(entry) is None
+
+
+def test_entries_keep_their_order():
+    for job_id in ('b', 'a', 'c'):
+        queue_utils.save(job_id, payload={})
+    queue_utils.save('b', state='running')
+    assert [entry['job_id'] for entry in queue_utils.entries()] == ['b', 'a', 'c']
@@ -0,0 +1,133 @@
+import json
+import os
+import threading
+
+import pytest
+
+from utils import script_engine
+
+
+@pytest.fixture(scope='module', autouse=True)
+def engine(tmp_path_factory):
+    """A fork server of its own, without the default preloads, compiling into a temporary cache"""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setenv('SCRIPT_ENGINE_PRELOAD', '')
+        mp.setattr(script_engine, 'SCRIPT_CACHE_DIR', str(tmp_path_factory.mktemp('script-cache')))
+        mp.setattr(script_engine, '_compiled', {})
+        mp.setattr(script_engine, '_server', None)
+        yield
+        if script_engine._server:
+            script_engine._server.process.kill()
+            script_engine._server.process.wait()
+
+
+def code(source, *tags):
+    return {'cell_type': 'code', 'execution_count': None, 'metadata': {'tags': list(tags)},
+            'outputs': [], 'source': source}
+
+
+def run(tmp_path, cells, **kwargs):
+    path = tmp_path / 'in put.ipynb'
+    path.write_text(json.dumps({'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 5}))
+    output = tmp_path / 'out put.ipynb'
+    script_engine.execute_notebook(str(path), str(output), **kwargs)
+    return json.loads(output.read_text())['cells']
+
+
+def test_compiled_once_per_source():
+    nb = {'cells': [code('x = 1'), {'cell_type': 'markdown', 'source': '# %magic'}, code('x + 1')]}
+    data = script_engine.compile_notebook(nb)
+    assert script_engine.compile_notebook(nb) is data
+    assert len(os.listdir(script_engine.SCRIPT_CACHE_DIR)) == 1
+    # Another process finds it on disk
+    script_engine._compiled.clear()
+    assert script_engine.compile_notebook(nb) == data
+
+
+@pytest.mark.parametrize('line', ['%matplotlib inline', '!pip install x', '  %%time'])
+def test_ipython_syntax_needs_a_kernel(line):
+    with pytest.raises(script_engine.NotScriptableError):
+        script_engine.compile_notebook({'cells': [code(f"x = 1\n{line}")]})
+
+
+def test_outputs_and_parameters(tmp_path):
+    cells = run(tmp_path, [
+        code('rows = 10\nname = "default"', 'parameters'),
+        code('print(name, rows)\nimport sys\nprint("warn", file=sys.stderr)\nrows * 2'),
+        code('display("shown")\nNone'),
+    ], parameters={'rows': 3, 'name': 'run'})
+
+    # The injected cell follows the parameters cell, as with papermill
+    assert cells[1]['metadata']['tags'] == ['injected-parameters']
+    assert cells[1]['source'] == "# Parameters\nrows = 3\nname = 'run'\n"
+    assert cells[2]['outputs'] == [
+        {'output_type': 'stream', 'name': 'stdout', 'text': 'run 3\n'},
+        {'output_type': 'stream', 'name': 'stderr', 'text': 'warn\n'},
+        {'output_type': 'execute_result', 'execution_count': None, 'metadata': {}, 'data': {'text/plain': '6'}},
+    ]
+    assert cells[3]['outputs'] == [
+        {'output_type': 'display_data', 'metadata': {}, 'data': {'text/plain': "'shown'"}}]
+    assert [cell['execution_count'] for cell in cells] == [1, None, 2, 3]
+
+
+def test_error_stops_the_run(tmp_path):
+    with pytest.raises(script_engine.ScriptExecutionError) as raised:
+        run(tmp_path, [code('x = 1'), code('1 / 0'), code('print("never")')])
+    assert (raised.value.cell_index, raised.value.ename) == (1, 'ZeroDivisionError')
+    cells = json.loads((tmp_path / 'out put.ipynb').read_text())['cells']
+    assert cells[1]['outputs'][-1]['output_type'] == 'error'
+    assert cells[2]['outputs'] == []
+
+
+def test_environment_is_not_written_to_disk(tmp_path):
+    # Read the job file for as long as the run goes on
+    contents, done = [], threading.Event()
+
+    def watch():
+        while not done.is_set():
+            for path in tmp_path.glob('*.job'):
+                try:
+                    contents.append(path.read_bytes())
+                except FileNotFoundError:
+                    pass
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        cells = run(tmp_path, [code('import os, time\ntime.sleep(0.2)\nos.environ["GITHUB_TOKEN"]')],
+                    env={'GITHUB_TOKEN': 'secret-token'})
+    finally:
+        done.set()
+        watcher.join()
+    assert cells[0]['outputs'][0]['data'] == {'text/plain': "'secret-token'"}
+    assert any(contents)
+    assert not any(b'secret-token' in content for content in contents)
+    assert os.environ.get('GITHUB_TOKEN') != 'secret-token'
+
+
+def test_branches_run_in_forked_workers(tmp_path):
+    cells = run(tmp_path, [
+        code('import os\nopen("setup.txt", "w").write("setup")'),
+        code('a = os.getpid()\nopen("a.txt", "w").write(str(a))', 'step:a'),
+        code('b = os.getpid()\nopen("b.txt", "w").write(str(b))', 'step:b'),
+        code('print(sorted(os.listdir(".")))\n"a" in globals()'),
+    ], branches=[[1], [2]])
+    pids = {(tmp_path / 'a.txt').read_text(), (tmp_path / 'b.txt').read_text()}
+    assert len(pids) == 2
+    # The last cell sees the branches' files but not their variables
+    assert "'a.txt', 'b.txt'" in cells[3]['outputs'][0]['text']
+    assert cells[3]['outputs'][1]['data'] == {'text/plain': 'False'}
+
+
+def test_timeout(tmp_path, monkeypatch):
+    monkeypatch.setattr(script_engine, 'SCRIPT_ENGINE_TIMEOUT', 0.5)
+    with pytest.raises(TimeoutError):
+        run(tmp_path, [code('import time\ntime.sleep(30)')])
+
+
+def test_malformed_requests_are_skipped(tmp_path):
+    server = script_engine._get_server()
+    server.process.stdin.write('not json\n')
+    server.process.stdin.flush()
+    assert run(tmp_path, [code('1 + 1')])[0]['outputs'][0]['data'] == {'text/plain': '2'}
+    assert server.alive()
@@ -0,0 +1,237 @@
+import base64
+import json
+import os
+import subprocess
+import threading
+import time
+
+import pytest
+
+from benchmarks.fake_github import git_blob_sha
+from utils import upload_utils
+from utils.upload_utils import PipelinedUploader
+
+REPO = 'owner/reports'
+
+
+@pytest.fixture
+def output_dir(tmp_path):
+    path = tmp_path / 'output'
+    path.mkdir()
+    return path
+
+
+def uploader(github, local_dir, folder='reports/fixed', **kwargs):
+    return PipelinedUploader('token', str(local_dir), folder, repo=REPO, api_url=github.url,
+                             poll_seconds=0.05, **kwargs)
+
+
+def remote_files(github, folder):
+    repo = github.repo(REPO)
+    return {path[len(folder) + 1:]: repo.blobs[sha] for path, sha in repo.head_tree('main').items()
+            if path.startswith(f"{folder}/")}
+
+
+def test_git_blob_sha_matches_git(tmp_path):
+    path = tmp_path / 'file.bin'
+    path.write_bytes(bytes(range(256)) * 5000)
+    expected = subprocess.run(['git', 'hash-object', str(path)], capture_output=True, text=True, check=True)
+    assert upload_utils.git_blob_sha(str(path)) == expected.stdout.strip()
+
+
+def test_list_local_files(output_dir):
+    (output_dir / 'plots').mkdir()
+    (output_dir / 'plots' / 'a.png').write_bytes(b'a')
+    (output_dir / 'b.csv').write_bytes(b'b')
+    assert upload_utils.list_local_files(str(output_dir)) == {
+        'plots/a.png': str(output_dir / 'plots' / 'a.png'), 'b.csv': str(output_dir / 'b.csv')}
+
+
+def test_remote_tree(github):
+    github.put_file(REPO, 'reports/fixed/a.csv', b'a')
+    github.put_file(REPO, 'reports/fixed/plots/b.png', b'b')
+    github.put_file(REPO, 'reports/other/c.csv', b'c')
+    client = upload_utils.GitHubUploader('token', repo=REPO, api_url=github.url)
+    tree = client.remote_tree('reports/fixed/')
+    assert set(tree) == {'a.csv', 'plots/b.png'}
+    assert tree['a.csv'] == git_blob_sha(b'a')
+
+
+def test_unchanged_files_are_skipped(github, output_dir):
+    github.put_file(REPO, 'reports/fixed/same.csv', b'same')
+    github.put_file(REPO, 'reports/fixed/changed.csv', b'old')
+    (output_dir / 'same.csv').write_bytes(b'same')
+    (output_dir / 'changed.csv').write_bytes(b'new content')
+    (output_dir / 'added.csv').write_bytes(b'added')
+
+    stats = uploader(github, output_dir).start().finish()
+    assert (stats['uploaded'], stats['uploaded_bytes']) == (2, 16)
+    assert (stats['skipped'], stats['skipped_bytes']) == (1, 4)
+    assert github.snapshot()['POST git/blobs'] == 2
+    assert remote_files(github, 'reports/fixed') == {
+        'same.csv': b'same', 'changed.csv': b'new content', 'added.csv': b'added'}
+
+
+def test_nothing_changed_means_no_commit(github, output_dir):
+    github.put_file(REPO, 'reports/fixed/same.csv', b'same')
+    (output_dir / 'same.csv').write_bytes(b'same')
+    head = github.repo(REPO).refs['heads/main']
+    stats = uploader(github, output_dir).start().finish()
+    assert stats['commit'] is None and stats['skipped'] == 1
+    assert github.repo(REPO).refs['heads/main'] == head
+
+
+def test_new_folder_skips_the_tree_request(github, output_dir):
+    (output_dir / 'a.csv').write_bytes(b'a')
+    stats = uploader(github, output_dir, folder='reports/run-1', skip_unchanged=False).start().finish()
+    assert stats['uploaded'] == 1
+    assert 'GET git/trees' not in github.snapshot()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_files_are_uploaded_while_the_run_goes_on(github, output_dir):
+    pipeline = uploader(github, output_dir).start()
+    (output_dir / 'early.csv').write_bytes(b'early')
+    # Sent once it has been stable for a poll, long before finish()
+    wait_for(lambda: github.snapshot().get('POST git/blobs') == 1)
+    (output_dir / 'plots').mkdir()
+    (output_dir / 'plots' / 'late.png').write_bytes(b'late')
+
+    stats = pipeline.finish('Add run')
+    assert stats['uploaded'] == 2
+    # One commit for the whole folder
+    assert github.snapshot()['POST git/commits'] == 1
+    repo = github.repo(REPO)
+    assert repo.commits[repo.refs['heads/main']]['message'] == 'Add run'
+    assert remote_files(github, 'reports/fixed') == {'early.csv': b'early', 'plots/late.png': b'late'}
+
+
+def test_rewritten_files_are_sent_again(github, output_dir):
+    pipeline = uploader(github, output_dir).start()
+    path = output_dir / 'log.txt'
+    path.write_bytes(b'first')
+    wait_for(lambda: github.snapshot().get('POST git/blobs') == 1)
+    path.write_bytes(b'second version')
+
+    stats = pipeline.finish()
+    assert stats['uploaded'] == 1
+    assert remote_files(github, 'reports/fixed') == {'log.txt': b'second version'}
+
+
+def test_failed_uploads_are_reported(github, output_dir, monkeypatch):
+    (output_dir / 'good.csv').write_bytes(b'good')
+    (output_dir / 'bad.csv').write_bytes(b'bad')
+    put_blob = PipelinedUploader.put_blob
+
+    def flaky(self, path):
+        if path.endswith('bad.csv'):
+            raise RuntimeError('502 Bad Gateway')
+        return put_blob(self, path)
+
+    monkeypatch.setattr(PipelinedUploader, 'put_blob', flaky)
+    stats = uploader(github, output_dir).start().finish()
+    assert stats['failed'] == ['bad.csv']
+    assert remote_files(github, 'reports/fixed') == {'good.csv': b'good'}
+
+
+def test_commit_keeps_what_was_pushed_meanwhile(github, output_dir):
+    (output_dir / 'a.csv').write_bytes(b'a')
+    pipeline = uploader(github, output_dir).start()
+    # Someone pushes to the branch while the run is going on
+    github.put_file(REPO, 'README.md', b'readme')
+    pipeline.finish()
+    repo = github.repo(REPO)
+    assert repo.head_tree('main').keys() == {'README.md', 'reports/fixed/a.csv'}
+
+
+@pytest.mark.parametrize('size', [0, 1, 2, upload_utils.CHUNK_SIZE, 2 * upload_utils.CHUNK_SIZE + 1])
+def test_base64_body(tmp_path, size):
+    path = tmp_path / 'blob.bin'
+    path.write_bytes(os.urandom(size))
+    body = upload_utils.Base64JSONBody(str(path), {'encoding': 'base64'})
+    raw = b''.join(body)
+    assert len(body) == len(raw)
+    payload = json.loads(raw)
+    assert payload['encoding'] == 'base64'
+    assert base64.b64decode(payload['content']) == path.read_bytes()
+
+
+def test_base64_body_without_fields(tmp_path):
+    path = tmp_path / 'blob.bin'
+    path.write_bytes(b'abc')
+    assert json.loads(b''.join(upload_utils.Base64JSONBody(str(path), {}))) == {'content': 'YWJj'}
+
+
+def test_memory_budget_caps_concurrent_reservations():
+    budget = upload_utils.MemoryBudget(limit=100)
+    inside = []
+
+    def hold(nbytes):
+        with budget.reserve(nbytes):
+            inside.append(budget.used)
+            time.sleep(0.02)
+
+    threads = [threading.Thread(target=hold, args=(40,)) for _ in range(6)]
+    # Larger than the limit: waits for the budget to be free, then takes all of it
+    threads.append(threading.Thread(target=hold, args=(500,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert max(inside) <= 100
+    assert budget.peak == 100
+    assert budget.used == 0
+
+
+def test_upload_stays_within_the_budget(github, output_dir, monkeypatch):
+    monkeypatch.setattr(upload_utils, 'CHUNK_SIZE', 3 * 1024)
+    for i in range(8):
+        (output_dir / f"{i}.bin").write_bytes(os.urandom(64 * 1024))
+    budget = upload_utils.MemoryBudget(limit=16 * 1024)
+    stats = uploader(github, output_dir, budget=budget).start().finish()
+    assert stats['uploaded'] == 8
+    assert 0 < budget.peak <= 16 * 1024
+
+
+def test_oversize_files_are_not_pushed(github, output_dir, monkeypatch):
+    monkeypatch.setattr(upload_utils, 'UPLOAD_MAX_BLOB_BYTES', 10)
+    (output_dir / 'small.csv').write_bytes(b'small')
+    (output_dir / 'model.bin').write_bytes(b'x' * 11)
+    stats = uploader(github, output_dir).start().finish()
+    assert stats['oversize'] == ['model.bin']
+    assert remote_files(github, 'reports/fixed') == {'small.csv': b'small'}
+
+
+def test_cancelled_run_leaves_the_branch_alone(github, output_dir):
+    (output_dir / 'a.csv').write_bytes(b'a')
+    head = github.repo(REPO).refs['heads/main']
+    with pytest.raises(upload_utils.UploadCancelled):
+        uploader(github, output_dir, cancelled=lambda: True).start().finish()
+    assert github.repo(REPO).refs['heads/main'] == head
+
+
+def test_cancelled_right_before_the_ref_update(github, output_dir):
+    (output_dir / 'a.csv').write_bytes(b'a')
+    head = github.repo(REPO).refs['heads/main']
+    # Cancelled once the commit object exists, before the branch moves to it
+    cancelled = lambda: 'POST git/commits' in github.snapshot()
+    with pytest.raises(upload_utils.UploadCancelled):
+        uploader(github, output_dir, cancelled=cancelled).start().finish()
+    assert github.snapshot()['POST git/commits'] == 1
+    assert 'PATCH git/refs' not in github.snapshot()
+    assert github.repo(REPO).refs['heads/main'] == head
+
+
+def test_abort(github, output_dir):
+    pipeline = uploader(github, output_dir).start()
+    (output_dir / 'a.csv').write_bytes(b'a')
+    pipeline.abort()
+    with pytest.raises(upload_utils.UploadCancelled):
+        pipeline.finish()
+    assert 'POST git/commits' not in github.snapshot()
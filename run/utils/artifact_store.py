@@ -0,0 +1,239 @@
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# Content-addressed store for run outputs: blobs/<sha256> holds each distinct
+# file once, manifests/<run_id>.json maps a run's file names to blobs, and
+# index.json keeps per-blob reference counts and sizes, their total and the
+# runs in the order they were added, so garbage collection reads only the
+# manifests of the runs it evicts
+ARTIFACT_STORE_DIR = os.environ.get('ARTIFACT_STORE_DIR', os.path.join(tempfile.gettempdir(), 'notebook-artifacts'))
+ARTIFACT_STORE_MAX_BYTES = int(os.environ.get('ARTIFACT_STORE_MAX_BYTES', 2 * 1024 ** 3))
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_json(path, data):
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class ArtifactStore:
+    def __init__(self, root=ARTIFACT_STORE_DIR, max_bytes=ARTIFACT_STORE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._thread_lock = threading.Lock()
+        for sub in ('blobs', 'manifests', 'tmp'):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        # Thread lock plus flock, so gunicorn workers sharing the directory agree
+        with self._thread_lock:
+            with open(os.path.join(self.root, '.lock'), 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _index_path(self):
+        return os.path.join(self.root, 'index.json')
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            index = {'blobs': {}, 'runs': {}, 'bytes': 0}
+        return index
+
+    def _manifest_path(self, run_id):
+        return os.path.join(self.root, 'manifests', f"{os.path.basename(run_id)}.json")
+
+    def blob_path(self, digest):
+        return os.path.join(self.root, 'blobs', digest[:2], digest)
+
+    # --- writing ------------------------------------------------------------------
+
+    def _put_file(self, path):
+        """Copy a file into blobs/ unless an identical blob exists; returns (digest, size, is_new)"""
+        digest = file_sha256(path)
+        target = self.blob_path(digest)
+        if os.path.exists(target):
+            return digest, os.path.getsize(target), False
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = os.path.join(self.root, 'tmp', f"{digest}-{os.getpid()}-{threading.get_ident()}")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+        return digest, os.path.getsize(target), True
+
+    def add_run(self, run_id, files, meta=None):
+        """Store files ({name: local path}) as run `run_id`; returns the manifest with dedup stats"""
+        entries, new_bytes, reused_bytes = {}, 0, 0
+        # Hash and copy outside the lock; blobs are immutable and written atomically
+        for name, path in sorted(files.items()):
+            digest, size, is_new = self._put_file(path)
+            entries[name] = {'sha256': digest, 'size': size}
+            if is_new:
+                new_bytes += size
+            else:
+                reused_bytes += size
+
+        manifest = {
+            'run_id': run_id,
+            'created': time.time(),
+            'meta': meta or {},
+            'files': entries,
+            'stored_bytes': new_bytes,
+            'deduplicated_bytes': reused_bytes,
+        }
+        with self._locked():
+            index = self._read_index()
+            for name, entry in entries.items():
+                # A concurrent GC may have dropped a blob we found before locking
+                if not os.path.exists(self.blob_path(entry['sha256'])):
+                    self._put_file(files[name])
+                blob = index['blobs'].get(entry['sha256'])
+                if blob is None:
+                    blob = index['blobs'][entry['sha256']] = {'refs': 0, 'size': entry['size']}
+                    index['bytes'] += entry['size']
+                blob['refs'] += 1
+            # A re-added run_id replaces its old manifest, so release that first
+            if run_id in index['runs']:
+                old = self.manifest(run_id)
+                if old:
+                    self._release(index, old)
+                index['runs'].pop(run_id, None)
+            index['runs'][run_id] = manifest['created']
+            _write_json(self._manifest_path(run_id), manifest)
+            # Writes the index
+            self._collect(index, keep={run_id})
+
+        print(f"[DEBUG] Stored run {run_id}: {len(entries)} files, {new_bytes} new bytes, "
+              f"{reused_bytes} bytes deduplicated", file=sys.stderr)
+        return manifest
+
+    # --- reading ------------------------------------------------------------------
+
+    def manifest(self, run_id):
+        try:
+            with open(self._manifest_path(run_id)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def runs(self):
+        """Manifests of all runs, oldest first"""
+        return [m for m in map(self.manifest, self._read_index()['runs']) if m]
+
+    def file_path(self, run_id, name):
+        """Local path of file `name` of a run, or None"""
+        manifest = self.manifest(run_id)
+        entry = manifest and manifest['files'].get(name)
+        return self.blob_path(entry['sha256']) if entry else None
+
+    def diff(self, old_run_id, new_run_id):
+        """Compare two manifests by name and content hash; None if either run is missing"""
+        old_manifest, new_manifest = self.manifest(old_run_id), self.manifest(new_run_id)
+        if not old_manifest or not new_manifest:
+            return None
+        old, new = old_manifest['files'], new_manifest['files']
+        return {
+            'added': sorted(set(new) - set(old)),
+            'removed': sorted(set(old) - set(new)),
+            'changed': sorted(n for n in set(old) & set(new) if old[n]['sha256'] != new[n]['sha256']),
+            'unchanged': sorted(n for n in set(old) & set(new) if old[n]['sha256'] == new[n]['sha256']),
+        }
+
+    def stats(self):
+        index = self._read_index()
+        return {
+            'blobs': len(index['blobs']),
+            'bytes': index['bytes'],
+            'runs': len(index['runs']),
+            'max_bytes': self.max_bytes,
+        }
+
+    # --- deletion and garbage collection ---------------------------------------------
+
+    def _release(self, index, manifest):
+        freed = 0
+        for entry in manifest['files'].values():
+            blob = index['blobs'].get(entry['sha256'])
+            if not blob:
+                continue
+            blob['refs'] -= 1
+            if blob['refs'] <= 0:
+                try:
+                    os.remove(self.blob_path(entry['sha256']))
+                except FileNotFoundError:
+                    pass
+                freed += blob['size']
+                index['bytes'] -= blob['size']
+                del index['blobs'][entry['sha256']]
+        index['runs'].pop(manifest['run_id'], None)
+        try:
+            os.remove(self._manifest_path(manifest['run_id']))
+        except FileNotFoundError:
+            pass
+        return freed
+
+    def delete_run(self, run_id):
+        """Drop a run and the blobs only it referenced; returns the freed bytes, None if not found"""
+        with self._locked():
+            manifest = self.manifest(run_id)
+            if not manifest:
+                return None
+            index = self._read_index()
+            freed = self._release(index, manifest)
+            _write_json(self._index_path(), index)
+            return freed
+
+    def _collect(self, index, keep=()):
+        """Drop the oldest runs until blob bytes fit in max_bytes and save index (lock must be held)"""
+        freed = 0
+        for run_id in list(index['runs']):
+            if index['bytes'] <= self.max_bytes:
+                break
+            if run_id in keep:
+                continue
+            manifest = self.manifest(run_id)
+            if manifest:
+                freed += self._release(index, manifest)
+            else:
+                index['runs'].pop(run_id)
+            print(f"[DEBUG] Artifact store evicted run {run_id}", file=sys.stderr)
+        _write_json(self._index_path(), index)
+        return freed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store at ARTIFACT_STORE_DIR"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ArtifactStore()
+    return _store
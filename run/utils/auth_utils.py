@@ -1,10 +1,13 @@
 import os
 from functools import wraps
-from flask import request, jsonify
+from flask import current_app, request, jsonify
 
 def require_token(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        # The local profile serves a single developer and skips the check
+        if not current_app.config.get('REQUIRE_TOKEN', True):
+            return f(*args, **kwargs)
         shared_token = os.getenv("UI_ACCESS_TOKEN")  # ✅ Always up-to-date
         user_token = (
             request.headers.get("X-Access-Token") or
@@ -0,0 +1,23 @@
+import importlib.util
+import shutil
+
+
+def module_available(name):
+    """Check whether a module can be imported without actually importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        # find_spec imports parent packages for dotted names and raises
+        # when one of them is missing (e.g. 'google' for google.cloud.*)
+        return False
+
+
+# Cheap capability probes - the heavy modules are imported by the routes
+# that need them, not at startup
+CLOUD_AVAILABLE = module_available('google.cloud.secretmanager')
+
+# GitPython fails at import time when the git executable is missing, so
+# probe for the binary as well as the package
+NOTEBOOK_EXECUTION_AVAILABLE = all(
+    module_available(name) for name in ('papermill', 'nbconvert', 'nbformat', 'git')
+) and shutil.which('git') is not None
@@ -1,13 +1,21 @@
+import copy
 import os
 import yaml
 
+# Parsed config keyed by file mtime, so repeated loads skip YAML parsing
+_config_cache = {'mtime': None, 'config': None}
+
 def load_config():
     config_path = os.path.join(os.path.dirname(__file__), '..', 'config.yaml')
     config_path = os.path.abspath(config_path)
 
     try:
-        with open(config_path, 'r') as f:
-            return yaml.safe_load(f)
+        mtime = os.stat(config_path).st_mtime_ns
+        if _config_cache['mtime'] != mtime:
+            with open(config_path, 'r') as f:
+                _config_cache.update(mtime=mtime, config=yaml.safe_load(f))
+        # Callers update the returned dict before saving, so hand out a copy
+        return copy.deepcopy(_config_cache['config'])
     except FileNotFoundError:
         print(f"[WARN] Config not found at {config_path}, using defaults.")
         return {
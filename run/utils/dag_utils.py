@@ -0,0 +1,170 @@
+import copy
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Run independent `step:` cells concurrently. A step cell may declare what it
+# needs with `after:<step>` tags; otherwise steps only share the setup cells
+# before the first step. Steps connected through `after:` form one branch and
+# run in notebook order; branches run in parallel and their outputs are
+# merged back into one executed notebook
+PARALLEL_STEPS = os.environ.get('PARALLEL_STEPS', '0') == '1'
+
+DAG_INDEX_KEY = 'dag_index'
+
+
+def _tags(cell, prefix):
+    return [tag[len(prefix):] for tag in cell.get('metadata', {}).get('tags', []) if tag.startswith(prefix)]
+
+
+def plan_branches(nb, selected_steps):
+    """Cell indices per branch for the selected steps, or None if the run should stay sequential
+
+    Steps are only split off when every code cell between the first and last
+    selected step cell belongs to a step (unselected steps are guarded no-ops
+    and stay in the main run) and `after:` dependencies point backwards.
+    """
+    cells = nb['cells']
+    step_of = {}
+    for idx, cell in enumerate(cells):
+        names = [name for name in _tags(cell, 'step:') if name in selected_steps]
+        if cell.get('cell_type') == 'code' and names:
+            step_of[idx] = names[0]
+    if not step_of:
+        return None
+
+    first, last = min(step_of), max(step_of)
+    for idx in range(first, last + 1):
+        cell = cells[idx]
+        if cell.get('cell_type') == 'code' and idx not in step_of and not _tags(cell, 'step:'):
+            print(f"[DEBUG] Cell {idx} between steps is not a step; running steps sequentially", file=sys.stderr)
+            return None
+
+    # Union steps that depend on each other into one branch
+    parent = {name: name for name in step_of.values()}
+
+    def root(name):
+        while parent[name] != name:
+            name = parent[name]
+        return name
+
+    first_cell = {}
+    for idx, name in step_of.items():
+        first_cell.setdefault(name, idx)
+    for idx, name in step_of.items():
+        for dependency in _tags(cells[idx], 'after:'):
+            if dependency not in parent:
+                continue
+            if first_cell[dependency] > idx:
+                print(f"[WARN] Step '{name}' runs before its dependency '{dependency}'; running steps sequentially",
+                      file=sys.stderr)
+                return None
+            parent[root(name)] = root(dependency)
+
+    branches = {}
+    for idx in sorted(step_of):
+        branches.setdefault(root(step_of[idx]), []).append(idx)
+    if len(branches) < 2:
+        return None
+    return list(branches.values())
+
+
+def renumber(nb):
+    """Sequential execution counts in notebook order after merging branch outputs"""
+    count = 0
+    for cell in nb['cells']:
+        if cell.get('cell_type') == 'code' and cell.get('execution_count') is not None:
+            count += 1
+            cell['execution_count'] = count
+    return nb
+
+
+def _sub_notebook(nb, keep):
+    """Copy of nb with only the cells in `keep`, each tagged with its original index"""
+    sub = copy.deepcopy(nb)
+    sub['cells'] = []
+    for idx, cell in enumerate(nb['cells']):
+        if idx in keep:
+            cell = copy.deepcopy(cell)
+            cell.setdefault('metadata', {})[DAG_INDEX_KEY] = idx
+            sub['cells'].append(cell)
+    return sub
+
+
+def papermill_branches(nb, branches):
+    """branches if papermill can run them in parallel, else None
+
+    Every papermill branch is a fresh kernel that re-runs the setup cells, so
+    code cells after the steps would need a kernel with the setup re-run once
+    more and would still miss the branches' variables; such notebooks run
+    sequentially.
+    """
+    if not branches:
+        return None
+    last = max(idx for branch in branches for idx in branch)
+    if any(cell.get('cell_type') == 'code' for cell in nb['cells'][last + 1:]):
+        print("[DEBUG] Code cells follow the steps; running them sequentially with papermill", file=sys.stderr)
+        return None
+    return branches
+
+
+def execute_papermill_parallel(notebook_file, output_path, parameters, cwd, branches, **engine_kwargs):
+    """papermill run where each branch re-runs the shared setup cells in its own kernel
+
+    The main run (setup, unselected steps and the first branch) runs
+    alongside the other branches. Only for notebooks that papermill_branches
+    accepts, i.e. with no code cells after the steps.
+    """
+    import papermill as pm
+
+    with open(notebook_file, encoding='utf-8') as f:
+        nb = json.load(f)
+    if papermill_branches(nb, branches) is None:
+        raise ValueError("Notebook has code cells after the steps; run it sequentially")
+    branch_cells = {idx for branch in branches for idx in branch}
+    setup = {idx for idx in range(min(branch_cells))}
+    base, _ = os.path.splitext(output_path)
+
+    def run(name, keep):
+        sub_input = f"{base}.{name}.input.ipynb"
+        sub_output = f"{base}.{name}.ipynb"
+        with open(sub_input, 'w', encoding='utf-8') as f:
+            json.dump(_sub_notebook(nb, keep), f)
+        try:
+            # papermill's cwd= chdirs the whole process, which races between
+            # threads; the kernel working directory is set through nbclient instead
+            pm.execute_notebook(sub_input, sub_output, parameters=parameters,
+                                resources={'metadata': {'path': cwd}}, **engine_kwargs)
+        finally:
+            os.remove(sub_input)
+        with open(sub_output, encoding='utf-8') as f:
+            executed = json.load(f)
+        os.remove(sub_output)
+        return executed
+
+    main_cells = (set(range(len(nb['cells']))) - branch_cells) | set(branches[0])
+    side_branches = branches[1:]
+    with ThreadPoolExecutor(max_workers=len(branches), thread_name_prefix='dag-branch') as executor:
+        futures = [executor.submit(run, f"branch-{n}", setup | set(branch)) for n, branch in enumerate(side_branches)]
+        main_run = run('main', main_cells)
+        branch_runs = [future.result() for future in futures]
+
+    # Setup cells come from the main run, step cells from their branch
+    executed = {}
+    for source, owned in [(main_run, None)] + list(zip(branch_runs, side_branches)):
+        for cell in source['cells']:
+            idx = cell.get('metadata', {}).pop(DAG_INDEX_KEY, None)
+            if idx is not None and (owned is None or idx in owned):
+                executed[idx] = cell
+    injected = next((cell for cell in main_run['cells']
+                     if 'injected-parameters' in cell.get('metadata', {}).get('tags', [])), None)
+    merged = dict(main_run, cells=[])
+    for idx in range(len(nb['cells'])):
+        merged['cells'].append(executed.get(idx, nb['cells'][idx]))
+        if injected and 'parameters' in nb['cells'][idx].get('metadata', {}).get('tags', []):
+            merged['cells'].append(injected)
+    renumber(merged)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(merged, f)
+    return output_path
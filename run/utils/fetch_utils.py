@@ -0,0 +1,116 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+from utils.github_utils import repo_full_name
+from utils.notebook_utils import NOTEBOOK_PATH, SOURCE_REPO_URL
+
+# 'git' checks out the whole source repo for every run; 'file' downloads just
+# the notebook (plus the files it declares) and revalidates it with ETags
+NOTEBOOK_FETCH_MODE = os.environ.get('NOTEBOOK_FETCH_MODE', 'git')
+SOURCE_REPO_REF = os.environ.get('SOURCE_REPO_REF', 'main')
+SOURCE_RAW_URL = (os.environ.get('SOURCE_RAW_URL')
+                  or f"https://raw.githubusercontent.com/{repo_full_name(SOURCE_REPO_URL)}/{SOURCE_REPO_REF}")
+FETCH_CACHE_DIR = os.environ.get('FETCH_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'notebook-fetch-cache'))
+
+# Notebook metadata that declares what a single-file fetch needs, e.g.
+#   "runner": {"files": ["run/helpers.py"], "requires_repo": false}
+# Paths are relative to the repo root, like NOTEBOOK_PATH
+RUNNER_METADATA_KEY = 'runner'
+
+# fetch_workspace's answer for a notebook that declares requires_repo
+REQUIRES_REPO = object()
+
+_local = threading.local()
+
+
+def _session():
+    if not hasattr(_local, 'session'):
+        import requests
+        _local.session = requests.Session()
+    return _local.session
+
+
+def _cache_paths(url):
+    key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return os.path.join(FETCH_CACHE_DIR, f"{key}.body"), os.path.join(FETCH_CACHE_DIR, f"{key}.json")
+
+
+def fetch_file(path, token=None):
+    """Local cached copy of `path` from SOURCE_RAW_URL, revalidated with If-None-Match
+
+    Returns (cached path, version, status) where status is 'downloaded' or
+    'not_modified' and version is the ETag, or a hash of the content when the
+    server sent none.
+    """
+    url = f"{SOURCE_RAW_URL.rstrip('/')}/{path.lstrip('/')}"
+    body_path, meta_path = _cache_paths(url)
+    headers = {'Authorization': f'token {token}'} if token else {}
+    etag = None
+    if os.path.exists(body_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            etag = json.load(f).get('etag')
+        if etag:
+            headers['If-None-Match'] = etag
+
+    resp = _session().get(url, headers=headers, timeout=30)
+    if resp.status_code == 304 and etag:
+        print(f"[DEBUG] {path} not modified ({etag})", file=sys.stderr)
+        return body_path, etag, 'not_modified'
+    resp.raise_for_status()
+
+    os.makedirs(FETCH_CACHE_DIR, exist_ok=True)
+    suffix = f".tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(body_path + suffix, 'wb') as f:
+        f.write(resp.content)
+    os.replace(body_path + suffix, body_path)
+    etag = resp.headers.get('ETag')
+    with open(meta_path + suffix, 'w') as f:
+        json.dump({'url': url, 'etag': etag}, f)
+    os.replace(meta_path + suffix, meta_path)
+    print(f"[DEBUG] Downloaded {path}: {len(resp.content)} bytes", file=sys.stderr)
+    # Without an ETag nothing is revalidated, but runs still get a version to compare
+    return body_path, etag or f"sha1:{hashlib.sha1(resp.content).hexdigest()}", 'downloaded'
+
+
+def _workspace_path(dest, path):
+    """Local path of repo path `path` under dest; ValueError if it would land outside dest"""
+    root = os.path.abspath(dest)
+    target = os.path.normpath(os.path.join(root, path))
+    if os.path.isabs(path) or os.path.commonpath([root, target]) != root or target == root:
+        raise ValueError(f"Path outside the workspace: {path}")
+    return target
+
+
+def _copy_into(dest, path, token):
+    # Paths come from notebook metadata, so check them before downloading
+    target = _workspace_path(dest, path)
+    cached, etag, status = fetch_file(path, token)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    shutil.copyfile(cached, target)
+    return target, etag, status
+
+
+def fetch_workspace(dest, notebook_path=None, token=None, notebook_only=False):
+    """Fetch the notebook and its declared sibling files into dest
+
+    Returns the notebook's version (see fetch_file), or REQUIRES_REPO when
+    the notebook declares that it needs the whole repo, in which case the
+    caller should use a git checkout.
+    """
+    notebook_path = notebook_path or NOTEBOOK_PATH
+    target, etag, _ = _copy_into(dest, notebook_path, token)
+    if notebook_only:
+        return etag
+
+    with open(target, encoding='utf-8') as f:
+        declared = json.load(f).get('metadata', {}).get(RUNNER_METADATA_KEY, {})
+    if declared.get('requires_repo'):
+        return REQUIRES_REPO
+    for path in declared.get('files', []):
+        _copy_into(dest, path, token)
+    return etag
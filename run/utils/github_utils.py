@@ -1,25 +1,38 @@
 import os
 import sys
+import threading
+import time
+
+from utils.capabilities import CLOUD_AVAILABLE
+
+# Secret Manager round trips are cached so the prewarm stage and later runs
+# share one lookup; rotated tokens are picked up after the TTL
+TOKEN_CACHE_SECONDS = float(os.environ.get('GITHUB_TOKEN_CACHE_SECONDS', 300))
+_token_cache = {'token': None, 'expires': 0.0}
+_token_lock = threading.Lock()
+
+def get_github_token(refresh=False):
+    """Retrieve GitHub token from env or Google Secret Manager (GCP), cached for TOKEN_CACHE_SECONDS"""
+    with _token_lock:
+        if not refresh and _token_cache['token'] and time.time() < _token_cache['expires']:
+            return _token_cache['token']
+        token = _lookup_github_token()
+        if token:
+            _token_cache.update(token=token, expires=time.time() + TOKEN_CACHE_SECONDS)
+        return token
 
-try:
-    from google.cloud import secretmanager
-    CLOUD_AVAILABLE = True
-except ImportError:
-    CLOUD_AVAILABLE = False
-
-def get_github_token():
-    """Retrieve GitHub token from env or Google Secret Manager (GCP)"""
-    import sys
-
+def _lookup_github_token():
     # Try environment variable (local dev)
     token = os.environ.get('GITHUB_TOKEN')
     if token:
         print("[DEBUG] GitHub token loaded from environment variable", file=sys.stderr)
         return token
 
-    # Fallback to Google Cloud Secret Manager
-    if CLOUD_AVAILABLE:
+    # Fallback to Google Cloud Secret Manager (disabled by the local profile)
+    if CLOUD_AVAILABLE and os.environ.get('USE_SECRET_MANAGER', '1') != '0':
         try:
+            from google.cloud import secretmanager
+
             client = secretmanager.SecretManagerServiceClient()
             project_id = os.environ.get('GOOGLE_CLOUD_PROJECT')
             if not project_id:
@@ -39,3 +52,10 @@ def get_github_token():
 
     print("[ERROR] GitHub token not found: no environment variable and no GCP access", file=sys.stderr)
     return None
+
+def repo_full_name(repo):
+    """'owner/name' from a GitHub clone URL or an 'owner/name' string"""
+    repo = repo.strip().rstrip('/')
+    if repo.endswith('.git'):
+        repo = repo[:-len('.git')]
+    return '/'.join(repo.split(':')[-1].split('/')[-2:])
@@ -0,0 +1,246 @@
+import os
+import signal
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+# Notebook runs executing at once; further runs wait for a slot in arrival
+# order (0 = no limit). Each run holds a kernel or worker and a workspace
+MAX_CONCURRENT_RUNS = int(os.environ.get('MAX_CONCURRENT_RUNS', 2))
+# A cancelled run's kernel or worker is interrupted first and killed if it is
+# still running this many seconds later
+JOB_CANCEL_GRACE_SECONDS = float(os.environ.get('JOB_CANCEL_GRACE_SECONDS', 5))
+# Finished jobs kept for GET /jobs/<id>
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', 100))
+
+
+class JobCancelled(Exception):
+    """Raised in the run's thread when its job was cancelled before execution"""
+
+
+class JobExists(Exception):
+    """A job with the requested id is still queued or running; .job is that job"""
+
+    def __init__(self, job):
+        super().__init__(f"Job {job.id} is already {job.status}")
+        self.job = job
+
+
+def _signal_group(pid, signum):
+    # Kernels and script engine workers lead their own process group
+    try:
+        os.killpg(pid, signum)
+    except ProcessLookupError:
+        pass
+    except PermissionError as e:
+        print(f"[WARN] Could not signal process group {pid}: {e}", file=sys.stderr)
+
+
+class Job:
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'  # queued, running, cancelling, cancelled, requeued, succeeded, failed
+        self.run_id = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        # Set when the instance shuts down: the run is persisted for another instance instead of dropped
+        self.requeue = False
+        self.done = threading.Event()
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        self._pids = set()
+        self._callbacks = []
+        self._has_slot = False
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def check(self):
+        """Raise JobCancelled if the job was cancelled"""
+        if self.cancelled:
+            raise JobCancelled(f"Job {self.id} was cancelled")
+
+    def track_process(self, pid):
+        """Process group to interrupt and kill on cancel (a kernel or a script engine worker)"""
+        with self._lock:
+            self._pids.add(pid)
+        if self.cancelled:
+            # Started while the cancel was already under way
+            _signal_group(pid, signal.SIGKILL)
+
+    def untrack_processes(self):
+        with self._lock:
+            self._pids.clear()
+
+    def on_cancel(self, callback):
+        """Call callback (e.g. an uploader's abort) when the job is cancelled"""
+        with self._lock:
+            self._callbacks.append(callback)
+
+    def cancel(self, grace=None):
+        """Interrupt the run and kill it after grace seconds; returns False if it already ended"""
+        grace = JOB_CANCEL_GRACE_SECONDS if grace is None else grace
+        with self._lock:
+            if self.done.is_set():
+                return False
+            if self.cancelled:
+                return True
+            self._cancel.set()
+            self.status = 'cancelling'
+            pids, callbacks = list(self._pids), list(self._callbacks)
+
+        print(f"[INFO] Cancelling job {self.id} ({len(pids)} processes)", file=sys.stderr)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[WARN] Cancel callback of job {self.id} failed: {e}", file=sys.stderr)
+        for pid in pids:
+            _signal_group(pid, signal.SIGINT)
+        timer = threading.Timer(grace, self._kill, args=(grace,))
+        timer.daemon = True
+        timer.start()
+        # A queued job leaves the queue right away
+        _slots.wake()
+        return True
+
+    def _kill(self, grace):
+        if self.done.is_set():
+            return
+        with self._lock:
+            pids = list(self._pids)
+        for pid in pids:
+            print(f"[WARN] Job {self.id} still running after {grace}s, killing {pid}",
+                  file=sys.stderr)
+            _signal_group(pid, signal.SIGKILL)
+
+    def to_dict(self):
+        info = {
+            'job_id': self.id,
+            'status': self.status,
+            'run_id': self.run_id,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+        }
+        if self.status == 'queued':
+            info['queue_position'] = _slots.position(self)
+        return info
+
+
+class _Slots:
+    """Counting semaphore that hands freed slots to waiting jobs in arrival order"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.waiting = deque()
+        self.condition = threading.Condition()
+
+    def acquire(self, job):
+        with self.condition:
+            self.waiting.append(job)
+            try:
+                while True:
+                    job.check()
+                    if self.waiting[0] is job and (not self.limit or self.running < self.limit):
+                        self.running += 1
+                        return
+                    self.condition.wait()
+            finally:
+                self.waiting.remove(job)
+                self.condition.notify_all()
+
+    def release(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def wake(self):
+        with self.condition:
+            self.condition.notify_all()
+
+    def position(self, job):
+        with self.condition:
+            return next((n for n, waiting in enumerate(self.waiting) if waiting is job), None)
+
+
+_slots = _Slots(MAX_CONCURRENT_RUNS)
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def register(job_id=None):
+    """New queued job; job_id defaults to a random id. Raises JobExists if that job has not ended"""
+    job_id = str(job_id) if job_id else uuid.uuid4().hex
+    with _jobs_lock:
+        existing = _jobs.get(job_id)
+        if existing and not existing.done.is_set():
+            raise JobExists(existing)
+        job = _jobs[job_id] = Job(job_id)
+        _jobs.move_to_end(job_id)
+    return job
+
+
+def wait_for_slot(job):
+    """Block until the job may run; raises JobCancelled if it is cancelled while queued"""
+    if _slots.limit and _slots.running >= _slots.limit:
+        print(f"[DEBUG] Job {job.id} waiting for one of {_slots.limit} run slots", file=sys.stderr)
+    try:
+        _slots.acquire(job)
+    except JobCancelled:
+        finish(job)
+        raise
+    job._has_slot = True
+    job.status = 'running'
+    job.started = time.time()
+    return job
+
+
+def finish(job, status=None):
+    """Release the job's slot and record how it ended"""
+    if job._has_slot:
+        job._has_slot = False
+        _slots.release()
+    with job._lock:
+        job.status = status or ('requeued' if job.requeue else 'cancelled' if job.cancelled else 'failed')
+        job.finished = time.time()
+        job._pids.clear()
+        job.done.set()
+
+    with _jobs_lock:
+        finished = [job_id for job_id, other in _jobs.items() if other.done.is_set()]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del _jobs[job_id]
+
+
+def get(job_id):
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+def list_jobs():
+    with _jobs_lock:
+        return list(_jobs.values())
+
+
+def kernel_manager_class(job, env=None):
+    """Kernel manager for papermill/nbclient that registers each kernel it starts with job
+
+    env is added to the kernel's environment (e.g. the run's GITHUB_TOKEN)
+    without touching this process's os.environ.
+    """
+    from jupyter_client.manager import AsyncKernelManager
+
+    class JobKernelManager(AsyncKernelManager):
+        async def start_kernel(self, **kw):
+            if env:
+                kw['env'] = dict(kw.get('env') or os.environ, **env)
+            await super().start_kernel(**kw)
+            job.track_process(self.provisioner.pid)
+
+    return JobKernelManager
@@ -1,24 +1,25 @@
 import tempfile
 import os
-import git
-import nbformat
-from nbconvert import HTMLExporter
-import papermill as pm
-
-from utils.compat_utils import (
-    create_local_compatible_notebook,
-    create_cloud_compatible_notebook
-)
+
+from utils.capabilities import NOTEBOOK_EXECUTION_AVAILABLE
 from utils.config_utils import load_config
 
 CONFIG = load_config()
-SOURCE_REPO_URL = CONFIG['github']['source_repo_url']
-TARGET_REPO = CONFIG['github']['target_repo']
-NOTEBOOK_PATH = CONFIG['github']['notebook_path']
+# Environment overrides let a deployment (or the benchmark suite) point at
+# other repos without editing config.yaml
+SOURCE_REPO_URL = os.environ.get('SOURCE_REPO_URL') or CONFIG['github']['source_repo_url']
+TARGET_REPO = os.environ.get('TARGET_REPO') or CONFIG['github']['target_repo']
+NOTEBOOK_PATH = os.environ.get('NOTEBOOK_PATH') or CONFIG['github']['notebook_path']
 
 
 def execute_notebook_with_dependencies():
     """Execute notebook with full dependencies (papermill, git, etc.)"""
+    import git
+    import nbformat
+    import papermill as pm
+    from nbconvert import HTMLExporter
+    from utils.compat_utils import create_local_compatible_notebook
+
     try:
         # Create a temporary directory
         with tempfile.TemporaryDirectory() as temp_dir:
@@ -93,6 +94,12 @@ def execute_notebook_with_dependencies():
 
 def execute_notebook_cloud():
     """Execute notebook in Google Cloud environment with year-based folders"""
+    import git
+    import nbformat
+    import papermill as pm
+    from nbconvert import HTMLExporter
+    from utils.compat_utils import create_cloud_compatible_notebook
+
     try:
         from datetime import datetime
 
@@ -160,10 +167,3 @@ def execute_notebook_simulation():
         'status': 'success',
         'message': 'Notebook execution simulated successfully (install dependencies for full functionality)'
     }
-
-try:
-    import papermill
-    import nbconvert
-    NOTEBOOK_EXECUTION_AVAILABLE = True
-except ImportError:
-    NOTEBOOK_EXECUTION_AVAILABLE = False
@@ -0,0 +1,164 @@
+import base64
+import gzip
+import hashlib
+import json
+import os
+import sys
+
+from utils.capabilities import module_available
+
+# Per cell and stream (stdout/stderr): longer output keeps its head and tail
+MAX_STREAM_CHARS = int(os.environ.get('NOTEBOOK_MAX_STREAM_CHARS', 20000))
+
+# Binary outputs are moved out of the notebook into content-addressed files
+BINARY_MIME_TYPES = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/gif': 'gif',
+    'application/pdf': 'pdf',
+}
+
+# Executed notebooks are stored compressed; zstd when installed, gzip otherwise
+COMPRESSION = os.environ.get('NOTEBOOK_COMPRESSION') or ('zstd' if module_available('zstandard') else 'gzip')
+EXTENSIONS = {'zstd': '.ipynb.zst', 'gzip': '.ipynb.gz', 'none': '.ipynb'}
+
+EXTRACTED_KEY = 'extracted_outputs'
+
+
+def _text(value):
+    return ''.join(value) if isinstance(value, list) else value
+
+
+def join_multiline(nb):
+    """Join list-of-lines fields into strings, as nbformat.read does"""
+    for cell in nb.get('cells', []):
+        cell['source'] = _text(cell.get('source', ''))
+        for output in cell.get('outputs', []):
+            if 'text' in output:
+                output['text'] = _text(output['text'])
+            for mime, value in output.get('data', {}).items():
+                if isinstance(value, list):
+                    output['data'][mime] = _text(value)
+    return nb
+
+
+def trim_stream_outputs(nb, max_chars=MAX_STREAM_CHARS):
+    """Cap stream output per cell and stream name; returns the number of characters removed"""
+    removed = 0
+    for cell in nb.get('cells', []):
+        if cell.get('cell_type') != 'code':
+            continue
+        outputs = []
+        for output in cell.get('outputs', []):
+            # Merge consecutive chunks of the same stream before trimming
+            if (output.get('output_type') == 'stream' and outputs
+                    and outputs[-1].get('output_type') == 'stream'
+                    and outputs[-1].get('name') == output.get('name')):
+                outputs[-1]['text'] += _text(output.get('text', ''))
+            elif output.get('output_type') == 'stream':
+                outputs.append(dict(output, text=_text(output.get('text', ''))))
+            else:
+                outputs.append(output)
+
+        for output in outputs:
+            text = output.get('text') if output.get('output_type') == 'stream' else None
+            if text and max_chars and len(text) > max_chars:
+                keep = max_chars // 2
+                cut = len(text) - 2 * keep
+                output['text'] = f"{text[:keep]}\n... [{cut} characters trimmed] ...\n{text[-keep:]}"
+                removed += cut
+        cell['outputs'] = outputs
+    return removed
+
+
+def extract_binary_outputs(nb, assets_dir):
+    """Move base64 images/PDFs into assets_dir/<sha256>.<ext>; returns {filename: size}"""
+    assets = {}
+    for cell in nb.get('cells', []):
+        for output in cell.get('outputs', []):
+            data = output.get('data')
+            if not data:
+                continue
+            for mime, extension in BINARY_MIME_TYPES.items():
+                if mime not in data:
+                    continue
+                payload = base64.b64decode(_text(data.pop(mime)))
+                filename = f"{hashlib.sha256(payload).hexdigest()}.{extension}"
+                path = os.path.join(assets_dir, filename)
+                if not os.path.exists(path):
+                    os.makedirs(assets_dir, exist_ok=True)
+                    with open(path, 'wb') as f:
+                        f.write(payload)
+                output.setdefault('metadata', {}).setdefault(EXTRACTED_KEY, {})[mime] = filename
+                assets[filename] = len(payload)
+    return assets
+
+
+def rehydrate_outputs(nb, resolve_asset):
+    """Inline extracted outputs again; resolve_asset maps an asset filename to a local path"""
+    for cell in nb.get('cells', []):
+        for output in cell.get('outputs', []):
+            extracted = output.get('metadata', {}).pop(EXTRACTED_KEY, None)
+            for mime, filename in (extracted or {}).items():
+                with open(resolve_asset(filename), 'rb') as f:
+                    output.setdefault('data', {})[mime] = base64.b64encode(f.read()).decode('ascii')
+    return nb
+
+
+def _open(path, mode, name=None):
+    # Compression follows the file name; name overrides it for extensionless blobs
+    name = name or path
+    if name.endswith('.zst'):
+        import zstandard
+        return zstandard.open(path, mode)
+    if name.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+
+def write_notebook(nb, path_without_extension, compression=COMPRESSION):
+    """Write a notebook dict compressed; returns the path written"""
+    path = path_without_extension + EXTENSIONS[compression]
+    with _open(path, 'wb') as f:
+        f.write(json.dumps(nb, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+    return path
+
+
+def read_notebook(path, assets_dir=None, resolve_asset=None, name=None):
+    """Read a (possibly compressed) notebook; pass assets_dir or resolve_asset to inline extracted outputs"""
+    with _open(path, 'rb', name) as f:
+        nb = json.loads(f.read().decode('utf-8'))
+    if assets_dir:
+        resolve_asset = lambda filename: os.path.join(assets_dir, filename)
+    if resolve_asset:
+        rehydrate_outputs(nb, resolve_asset)
+    return nb
+
+
+def notebook_filenames(name='executed'):
+    """Possible stored filenames of notebook `name`, whatever its compression"""
+    return [name + extension for extension in EXTENSIONS.values()]
+
+
+def process_executed_notebook(output_path, run_dir):
+    """Trim streams, extract binaries and store the executed notebook compressed in run_dir"""
+    with open(output_path, 'rb') as f:
+        raw = f.read()
+    nb = json.loads(raw)
+
+    os.makedirs(run_dir, exist_ok=True)
+    join_multiline(nb)
+    trimmed = trim_stream_outputs(nb)
+    assets = extract_binary_outputs(nb, os.path.join(run_dir, 'assets'))
+    stored_path = write_notebook(nb, os.path.join(run_dir, 'executed'))
+
+    stats = {
+        'executed_bytes': len(raw),
+        'stored_bytes': os.path.getsize(stored_path),
+        'trimmed_chars': trimmed,
+        'assets': len(assets),
+        'asset_bytes': sum(assets.values()),
+    }
+    print(f"[DEBUG] Executed notebook {stats['executed_bytes']} bytes -> {stats['stored_bytes']} bytes "
+          f"stored, {stats['assets']} assets extracted, {trimmed} characters trimmed", file=sys.stderr)
+    return nb, stored_path, stats
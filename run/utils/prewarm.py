@@ -0,0 +1,103 @@
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Imports the kernel runs first in most notebooks; loading them once at
+# startup pulls their files into the page cache for the first real kernel
+PREWARM_KERNEL_IMPORTS = os.environ.get('PREWARM_KERNEL_IMPORTS', 'pandas,matplotlib.pyplot')
+
+_state = {'enabled': False, 'started': None, 'finished': None, 'tasks': {}}
+_state_lock = threading.Lock()
+
+
+def _warm_token():
+    from utils.github_utils import get_github_token
+    if not get_github_token():
+        raise RuntimeError("no GitHub token available")
+
+
+def _warm_config():
+    from utils.config_utils import load_config
+    load_config()
+
+
+def _warm_repo():
+    from utils import repo_cache
+    repo_cache.ensure_mirror()
+
+
+def _warm_kernel():
+    import papermill  # noqa: F401
+    import nbformat  # noqa: F401
+    from nbconvert import HTMLExporter  # noqa: F401
+    from jupyter_client.manager import start_new_kernel
+
+    km, kc = start_new_kernel(kernel_name='python3')
+    try:
+        imports = [name.strip() for name in PREWARM_KERNEL_IMPORTS.split(',') if name.strip()]
+        if imports:
+            kc.execute_interactive('\n'.join(f'import {name}' for name in imports), timeout=120)
+    finally:
+        kc.stop_channels()
+        km.shutdown_kernel(now=True)
+
+
+def _warm_script_engine():
+    from utils import script_engine
+    script_engine.start_worker_server()
+
+
+TASKS = {
+    'token': _warm_token,
+    'config': _warm_config,
+    'repo': _warm_repo,
+    'kernel': _warm_kernel,
+    'script_engine': _warm_script_engine,
+}
+
+
+def _run_task(name, task):
+    with _state_lock:
+        _state['tasks'][name]['status'] = 'running'
+    start = time.time()
+    try:
+        task()
+        status, error = 'done', None
+    except Exception as e:
+        status, error = 'failed', str(e)
+        print(f"[WARN] Prewarm task '{name}' failed: {e}", file=sys.stderr)
+    with _state_lock:
+        _state['tasks'][name].update(status=status, error=error, seconds=round(time.time() - start, 3))
+
+
+def _run_all(names):
+    with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix='prewarm') as executor:
+        for name in names:
+            executor.submit(_run_task, name, TASKS[name])
+    with _state_lock:
+        _state['finished'] = time.time()
+    print(f"[INFO] Prewarm finished in {_state['finished'] - _state['started']:.2f}s", file=sys.stderr)
+
+
+def start_prewarm(names=None):
+    """Run the prewarm tasks concurrently on a background thread; never blocks the caller"""
+    names = list(TASKS) if names is None else list(names)
+    with _state_lock:
+        if _state['enabled'] or not names:
+            return
+        _state.update(enabled=True, started=time.time(), finished=None)
+        _state['tasks'] = {name: {'status': 'pending', 'error': None, 'seconds': None} for name in names}
+    threading.Thread(target=_run_all, args=(names,), name='prewarm', daemon=True).start()
+
+
+def readiness():
+    """Readiness report: ready once every prewarm task has finished, or when prewarm is off"""
+    with _state_lock:
+        tasks = {name: dict(task) for name, task in _state['tasks'].items()}
+        return {
+            'ready': not _state['enabled'] or _state['finished'] is not None,
+            'prewarm_enabled': _state['enabled'],
+            'tasks': tasks
+        }
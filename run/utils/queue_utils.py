@@ -0,0 +1,210 @@
+import json
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+# Every accepted run is recorded here until it ends, so runs queued or cut
+# short by a scale-down can be resumed by the next instance. Point it at a
+# mounted volume to hand runs over between instances
+RUN_QUEUE_DIR = os.environ.get('RUN_QUEUE_DIR', os.path.join(tempfile.gettempdir(), 'notebook-run-queue'))
+# On SIGTERM running jobs get this long to finish before they are interrupted
+# and requeued; Cloud Run sends SIGKILL 10 seconds after SIGTERM
+DRAIN_GRACE_SECONDS = float(os.environ.get('DRAIN_GRACE_SECONDS', 7))
+# A run requeued this many times is dropped instead of being resumed again
+RUN_QUEUE_MAX_ATTEMPTS = int(os.environ.get('RUN_QUEUE_MAX_ATTEMPTS', 3))
+RUN_QUEUE_RESUME = os.environ.get('RUN_QUEUE_RESUME', '1') == '1'
+
+INSTANCE = f"{socket.gethostname()}:{os.getpid()}"
+
+_draining = threading.Event()
+_write_lock = threading.Lock()
+
+
+def _path(job_id):
+    return os.path.join(RUN_QUEUE_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', job_id) + '.json')
+
+
+def _read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write(path, entry):
+    os.makedirs(RUN_QUEUE_DIR, exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(entry, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def save(job_id, **fields):
+    """Create or update the queue entry of job_id"""
+    with _write_lock:
+        path = _path(job_id)
+        entry = _read(path) or {'job_id': job_id, 'enqueued': time.time(), 'attempts': 0}
+        entry.update(fields, instance=INSTANCE, updated=time.time())
+        _write(path, entry)
+        return entry
+
+
+def remove(job_id):
+    with _write_lock:
+        try:
+            os.remove(_path(job_id))
+        except FileNotFoundError:
+            pass
+
+
+def entries():
+    """Queue entries in the order they were first accepted"""
+    if not os.path.isdir(RUN_QUEUE_DIR):
+        return []
+    found = [_read(os.path.join(RUN_QUEUE_DIR, name)) for name in os.listdir(RUN_QUEUE_DIR)
+             if name.endswith('.json')]
+    return sorted((entry for entry in found if entry), key=lambda entry: entry.get('enqueued', 0))
+
+
+def draining():
+    return _draining.is_set()
+
+
+def drain(grace=None):
+    """Stop taking runs, give running jobs grace seconds to finish and requeue the rest"""
+    from utils import job_utils
+
+    grace = DRAIN_GRACE_SECONDS if grace is None else grace
+    _draining.set()
+    deadline = time.time() + grace
+    jobs = [job for job in job_utils.list_jobs() if not job.done.is_set()]
+
+    # Queued jobs won't get a slot on this instance any more
+    for job in jobs:
+        if job.status == 'queued':
+            job.requeue = True
+            job.cancel()
+    for job in jobs:
+        job.done.wait(max(0.0, deadline - time.time()))
+
+    running = [job for job in jobs if not job.done.is_set()]
+    for job in running:
+        job.requeue = True
+        job.cancel(grace=1)
+    for job in running:
+        job.done.wait(2)
+    print(f"[INFO] Drained: {len(jobs) - len(running)} of {len(jobs)} jobs ended within {grace}s, "
+          f"{len(running)} interrupted and requeued", file=sys.stderr)
+
+
+def install_drain_handler():
+    """Drain on SIGTERM, then hand over to the previous handler (gunicorn's worker exit, or the default)
+
+    The drain runs in a thread so the signal handler returns at once and the
+    main thread keeps serving (e.g. /ready's 503) meanwhile; when it is done
+    the signal is sent again and passed on from the main thread.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        return
+    previous = signal.getsignal(signal.SIGTERM)
+    started, drained = threading.Event(), threading.Event()
+
+    def drain_then_resend(signum):
+        try:
+            drain()
+        except Exception as e:
+            print(f"[ERROR] Drain failed: {e}", file=sys.stderr)
+        drained.set()
+        os.kill(os.getpid(), signum)
+
+    def handle(signum, frame):
+        if not drained.is_set():
+            if not started.is_set():
+                print("[INFO] SIGTERM received, draining notebook runs", file=sys.stderr)
+                started.set()
+                _draining.set()
+                threading.Thread(target=drain_then_resend, args=(signum,), name='run-queue-drain').start()
+            return
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+
+    signal.signal(signal.SIGTERM, handle)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _claimable(entry):
+    # Handed over on shutdown, or left behind by a process on this host that died without draining
+    if entry.get('state') == 'requeued':
+        return True
+    host, _, pid = entry.get('instance', '').rpartition(':')
+    return host == socket.gethostname() and pid.isdigit() and not _pid_alive(int(pid))
+
+
+def _claim(entry):
+    """Take over an entry; the rename makes sure only one instance resumes it"""
+    path = _path(entry['job_id'])
+    claimed = f"{path}.claimed-{os.getpid()}"
+    try:
+        os.rename(path, claimed)
+    except FileNotFoundError:
+        return None
+    entry = _read(claimed)
+    os.remove(claimed)
+    if not entry:
+        return None
+    entry['attempts'] = entry.get('attempts', 0) + 1
+    if entry['attempts'] > RUN_QUEUE_MAX_ATTEMPTS:
+        print(f"[WARN] Dropping job {entry['job_id']} after {RUN_QUEUE_MAX_ATTEMPTS} attempts", file=sys.stderr)
+        return None
+    with _write_lock:
+        entry.update(state='queued', instance=INSTANCE, updated=time.time())
+        _write(path, entry)
+    return entry
+
+
+def resume(run):
+    """Resume runs persisted by earlier instances in the background; run(entry) executes one
+
+    Runs are started one after the other, each once the previous one is
+    registered, so they queue for run slots in their original order.
+    """
+    from utils import job_utils
+
+    def resume_all():
+        for entry in entries():
+            if not _claimable(entry):
+                continue
+            entry = _claim(entry)
+            if not entry:
+                continue
+            print(f"[INFO] Resuming job {entry['job_id']} (attempt {entry['attempts']}, "
+                  f"revision {entry.get('revision')})", file=sys.stderr)
+            threading.Thread(target=run, args=(entry,), name=f"resume-{entry['job_id']}", daemon=True).start()
+            for _ in range(100):
+                if job_utils.get(entry['job_id']):
+                    break
+                time.sleep(0.05)
+
+    thread = threading.Thread(target=resume_all, name='run-queue-resume', daemon=True)
+    thread.start()
+    return thread
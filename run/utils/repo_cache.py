@@ -0,0 +1,66 @@
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from utils.notebook_utils import SOURCE_REPO_URL
+
+# A bare mirror of the source repo is kept per instance; each run clones from
+# it locally (hardlinked objects) instead of downloading the full history
+REPO_CACHE_DIR = os.environ.get('REPO_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'notebook-repo-cache'))
+REPO_CACHE_MAX_AGE = float(os.environ.get('REPO_CACHE_MAX_AGE', 60))
+
+_lock = threading.Lock()
+_last_fetch = {}
+
+
+def _mirror_path(url):
+    return os.path.join(REPO_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest()[:16] + '.git')
+
+
+def ensure_mirror(url=None, max_age=None):
+    """Create or refresh the local mirror of `url` and return its path"""
+    import git
+
+    url = url or SOURCE_REPO_URL
+    max_age = REPO_CACHE_MAX_AGE if max_age is None else max_age
+    path = _mirror_path(url)
+
+    with _lock:
+        if not os.path.exists(path):
+            print(f"[DEBUG] Mirroring {url} into {path}", file=sys.stderr)
+            os.makedirs(REPO_CACHE_DIR, exist_ok=True)
+            git.Repo.clone_from(url, path, mirror=True)
+            _last_fetch[path] = time.time()
+        elif time.time() - _last_fetch.get(path, 0) > max_age:
+            print(f"[DEBUG] Fetching updates for mirror of {url}", file=sys.stderr)
+            git.Repo(path).git.fetch('--prune', 'origin')
+            _last_fetch[path] = time.time()
+    return path
+
+
+def invalidate(url=None):
+    """Force the next checkout to fetch from the remote"""
+    _last_fetch.pop(_mirror_path(url or SOURCE_REPO_URL), None)
+
+
+def checkout(dest, url=None, revision=None):
+    """Clone the source repo into `dest` from the local mirror and return the git.Repo
+
+    With revision (a commit SHA) the clone is checked out at that commit,
+    refreshing the mirror once if it doesn't have it yet.
+    """
+    import git
+
+    mirror = ensure_mirror(url)
+    repo = git.Repo.clone_from(mirror, dest)
+    if revision:
+        try:
+            repo.git.checkout('-q', revision)
+        except git.GitCommandError:
+            ensure_mirror(url, max_age=0)
+            repo.remotes.origin.fetch()
+            repo.git.checkout('-q', revision)
+    return repo
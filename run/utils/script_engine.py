@@ -0,0 +1,450 @@
+import ast
+import base64
+import hashlib
+import importlib.util
+import io
+import json
+import marshal
+import os
+import pickle
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+from utils.dag_utils import renumber
+
+# Kernel-less execution for script-style notebooks: code cells are compiled
+# once per source revision (bytecode cached with marshal) and run in a process
+# forked from a server that already imported the usual libraries
+NOTEBOOK_ENGINE = os.environ.get('NOTEBOOK_ENGINE', 'papermill')
+SCRIPT_CACHE_DIR = os.environ.get('SCRIPT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'notebook-script-cache'))
+SCRIPT_ENGINE_PRELOAD = os.environ.get('SCRIPT_ENGINE_PRELOAD', 'pandas,matplotlib.pyplot,fpdf')
+# Seconds before a run is killed (Cloud Run's longest request); 0 waits forever
+SCRIPT_ENGINE_TIMEOUT = float(os.environ.get('SCRIPT_ENGINE_TIMEOUT', 3600)) or None
+
+_compiled = {}
+
+
+class NotScriptableError(Exception):
+    """The notebook uses IPython syntax (magics, shell escapes) and needs a real kernel"""
+
+
+class ScriptExecutionError(Exception):
+    def __init__(self, cell_index, ename, evalue):
+        super().__init__(f"Cell {cell_index} raised {ename}: {evalue}")
+        self.cell_index = cell_index
+        self.ename = ename
+        self.evalue = evalue
+
+
+# --- compilation -------------------------------------------------------------------
+
+def _source(cell):
+    source = cell.get('source', '')
+    return ''.join(source) if isinstance(source, list) else source
+
+
+def _compile_cell(source, filename):
+    for line in source.splitlines():
+        if line.lstrip().startswith(('%', '!')):
+            raise NotScriptableError(f"{filename} uses IPython syntax: {line.strip()}")
+    tree = ast.parse(source, filename)
+    # Like a kernel, show the value of a trailing expression
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        last = tree.body[-1]
+        last.value = ast.Call(func=ast.Name('__engine_result__', ast.Load()), args=[last.value], keywords=[])
+        ast.fix_missing_locations(tree)
+    return compile(tree, filename, 'exec')
+
+
+def compile_notebook(nb, cache_key=None):
+    """Marshalled [(cell index, code object)] for the notebook's code cells, cached by key"""
+    if cache_key is None:
+        cache_key = hashlib.sha256(json.dumps([_source(c) for c in nb['cells']]).encode()).hexdigest()
+    digest = hashlib.sha256(importlib.util.MAGIC_NUMBER + cache_key.encode()).hexdigest()
+    if digest in _compiled:
+        return _compiled[digest]
+
+    path = os.path.join(SCRIPT_CACHE_DIR, f"{digest}.marshal")
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            _compiled[digest] = f.read()
+        return _compiled[digest]
+
+    cells = [(idx, _compile_cell(_source(cell), f"<cell {idx}>"))
+             for idx, cell in enumerate(nb['cells']) if cell.get('cell_type') == 'code']
+    data = marshal.dumps(cells)
+    os.makedirs(SCRIPT_CACHE_DIR, exist_ok=True)
+    tmp = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+    _compiled[digest] = data
+    print(f"[DEBUG] Compiled {len(cells)} notebook cells ({len(data)} bytes of bytecode)", file=sys.stderr)
+    return data
+
+
+# --- worker process ----------------------------------------------------------------
+
+def _display_data(obj):
+    data = {'text/plain': repr(obj)}
+    for method, mime in (('_repr_html_', 'text/html'), ('_repr_markdown_', 'text/markdown')):
+        render = getattr(obj, method, None)
+        if callable(render):
+            value = render()
+            if value is not None:
+                data[mime] = value
+    return data
+
+
+def _figure_outputs():
+    """Inline PNGs of open matplotlib figures, closed afterwards (as the inline backend does)"""
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    if pyplot is None:
+        return []
+    outputs = []
+    for number in pyplot.get_fignums():
+        buffer = io.BytesIO()
+        pyplot.figure(number).savefig(buffer, format='png', bbox_inches='tight')
+        outputs.append({'output_type': 'display_data', 'metadata': {},
+                        'data': {'image/png': base64.b64encode(buffer.getvalue()).decode('ascii'),
+                                 'text/plain': f'<Figure {number}>'}})
+    pyplot.close('all')
+    return outputs
+
+
+def _shim_display(current):
+    def display(*objs, **kwargs):
+        for obj in objs:
+            current['outputs'].append({'output_type': 'display_data', 'metadata': {}, 'data': _display_data(obj)})
+    try:
+        import IPython.display
+        IPython.display.display = display
+    except ImportError:
+        pass
+    return display
+
+
+def _parameters_cell(parameters):
+    source = '# Parameters\n' + ''.join(f"{name} = {value!r}\n" for name, value in parameters.items())
+    return {'cell_type': 'code', 'execution_count': None, 'id': 'injected-parameters',
+            'metadata': {'tags': ['injected-parameters']}, 'outputs': [], 'source': source}
+
+
+def _run_worker(nb, compiled, parameters, cwd, env, output_path, branches=None):
+    """Entry point of the forked worker: run the cells, write the executed notebook
+
+    With branches (lists of cell indices, see dag_utils.plan_branches), the
+    worker forks once per branch when it reaches the first branch cell, so
+    every branch starts from the state after the setup cells. The remaining
+    cells wait for all branches before running.
+    """
+    os.environ.update(env)
+    os.chdir(cwd)
+    sys.path.insert(0, cwd)
+
+    # display() and trailing expressions append to the outputs of the running cell
+    current = {'outputs': []}
+    display = _shim_display(current)
+    namespace = {'__name__': '__main__', 'display': display,
+                 '__engine_result__': lambda value: value is None or current['outputs'].append({
+                     'output_type': 'execute_result', 'execution_count': None,
+                     'metadata': {}, 'data': _display_data(value)})}
+
+    cells = nb['cells']
+    codes = dict(marshal.loads(compiled))
+    parameters_idx = next((idx for idx, cell in enumerate(cells)
+                           if 'parameters' in cell.get('metadata', {}).get('tags', [])), None)
+    if parameters_idx is None:
+        # Without a parameters cell papermill injects the values at the top
+        namespace.update(parameters)
+
+    def run_cell(idx):
+        """Execute one cell into its outputs; returns the error tuple or None"""
+        cell = cells[idx]
+        current['outputs'] = []
+        cell['execution_count'] = idx
+        stdout, stderr = io.StringIO(), io.StringIO()
+        start = time.perf_counter()
+        error = None
+        try:
+            with redirect_stdout(stdout), redirect_stderr(stderr):
+                exec(codes[idx], namespace)
+        except BaseException as e:
+            error = (idx, type(e).__name__, str(e),
+                     traceback.format_exception(type(e), e, e.__traceback__))
+        # Streams first, then displays and figures, in the order a kernel reports them
+        cell['outputs'] = ([{'output_type': 'stream', 'name': name, 'text': buffer.getvalue()}
+                            for name, buffer in (('stdout', stdout), ('stderr', stderr)) if buffer.getvalue()]
+                           + current['outputs'] + _figure_outputs())
+        cell.setdefault('metadata', {})['engine'] = {'name': 'script', 'duration': round(time.perf_counter() - start, 4)}
+        if error:
+            cell['outputs'].append({'output_type': 'error', 'ename': error[1], 'evalue': error[2],
+                                    'traceback': error[3]})
+        elif idx == parameters_idx:
+            namespace.update(parameters)
+        return error
+
+    def fork_branch(n, branch):
+        result_path = f"{output_path}.branch-{n}"
+        pid = os.fork()
+        if pid == 0:
+            try:
+                for idx in branch:
+                    if run_cell(idx):
+                        break
+                with open(result_path, 'wb') as f:
+                    pickle.dump({idx: cells[idx] for idx in branch}, f)
+            finally:
+                os._exit(0)
+        return pid, result_path
+
+    def join_branches(children):
+        error = None
+        for pid, result_path in children:
+            _, status = os.waitpid(pid, 0)
+            if not os.path.exists(result_path):
+                error = error or (None, 'BranchFailed', f"exit status {os.waitstatus_to_exitcode(status)}", [])
+                continue
+            with open(result_path, 'rb') as f:
+                for idx, cell in pickle.load(f).items():
+                    cells[idx] = cell
+                    failed = next((o for o in cell['outputs'] if o['output_type'] == 'error'), None)
+                    if failed and not error:
+                        error = (idx, failed['ename'], failed['evalue'], failed['traceback'])
+            os.remove(result_path)
+        return error
+
+    for idx in codes:
+        cells[idx]['outputs'] = []
+        cells[idx]['execution_count'] = None
+    branch_cells = {idx for branch in branches or [] for idx in branch}
+    children, error = [], None
+    try:
+        for idx in sorted(codes):
+            if error:
+                break
+            if children and idx > max(branch_cells):
+                error = join_branches(children)
+                children = []
+                if error:
+                    break
+            if branch_cells and idx == min(branch_cells):
+                sys.stdout.flush()
+                sys.stderr.flush()
+                children = [fork_branch(n, branch) for n, branch in enumerate(branches)]
+            if idx not in branch_cells:
+                error = run_cell(idx)
+        if children:
+            error = join_branches(children) or error
+    except KeyboardInterrupt:
+        # Interrupted between cells or while waiting for branches (which got
+        # the interrupt as well): keep what has run so far
+        error = (None, 'KeyboardInterrupt', 'Interrupted', [])
+
+    # Execution counts follow notebook order, whichever process ran the cell
+    renumber(nb)
+    if parameters:
+        cells.insert(0 if parameters_idx is None else parameters_idx + 1, _parameters_cell(parameters))
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(nb, f)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(1 if error else 0)
+
+
+# --- fork server ------------------------------------------------------------------
+#
+# A child process (python -m utils.script_engine) imports SCRIPT_ENGINE_PRELOAD
+# once and then forks one worker per job. Protocol, one line each way:
+#   parent -> server: {"job": <job file>, "env": {...}}   (JSON, on stdin)
+#   server -> parent: pid <job file> <pid>  and later  exit <job file> <exit code>
+# The job file holds the pickled _run_worker arguments except env. env (e.g.
+# the run's GITHUB_TOKEN) only travels over the pipe, so secrets are never
+# written to disk; workers otherwise inherit the server's environment.
+# Replies go to a pipe of their own (fd in PROTOCOL_FD_ENV), so whatever the
+# server or a preloaded library prints to stdout can't corrupt them
+
+RUN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROTOCOL_FD_ENV = 'SCRIPT_ENGINE_PROTOCOL_FD'
+
+
+def _serve():
+    protocol_fd = int(os.environ.pop(PROTOCOL_FD_ENV))
+    for name in SCRIPT_ENGINE_PRELOAD.split(','):
+        if name.strip():
+            try:
+                importlib.import_module(name.strip())
+            except ImportError as e:
+                print(f"[WARN] Script engine preload of {name} failed: {e}", file=sys.stderr)
+
+    protocol = os.fdopen(protocol_fd, 'w')
+    protocol_lock = threading.Lock()
+
+    def reply(*parts):
+        with protocol_lock:
+            protocol.write(' '.join(str(part) for part in parts) + '\n')
+            protocol.flush()
+
+    def reap(job, pid):
+        _, status = os.waitpid(pid, 0)
+        reply('exit', job, os.waitstatus_to_exitcode(status))
+
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+            job, env = request['job'], request.get('env') or {}
+        except (ValueError, KeyError, TypeError):
+            print(f"[WARN] Ignoring malformed script engine request: {line.rstrip()!r}", file=sys.stderr)
+            continue
+        pid = os.fork()
+        if pid == 0:
+            # Own process group, so a kill also reaches forked branches
+            os.setpgid(0, 0)
+            # Keep the protocol pipes away from notebook code
+            os.close(protocol_fd)
+            os.dup2(os.open(os.devnull, os.O_RDONLY), 0)
+            os.dup2(2, 1)
+            sys.stdout = open(1, 'w', closefd=False)
+            try:
+                with open(job, 'rb') as f:
+                    nb, compiled, parameters, cwd, output_path, branches = pickle.load(f)
+                _run_worker(nb, compiled, parameters, cwd, env, output_path, branches)
+            finally:
+                os._exit(1)
+        reply('pid', job, pid)
+        threading.Thread(target=reap, args=(job, pid), daemon=True).start()
+
+
+class _WorkerServer:
+    def __init__(self):
+        replies, protocol_fd = os.pipe()
+        env = dict(os.environ, MPLBACKEND=os.environ.get('MPLBACKEND', 'Agg'))
+        env[PROTOCOL_FD_ENV] = str(protocol_fd)
+        try:
+            self.process = subprocess.Popen([sys.executable, '-m', 'utils.script_engine'], cwd=RUN_DIR, env=env,
+                                            stdin=subprocess.PIPE, pass_fds=(protocol_fd,), text=True, bufsize=1)
+        except BaseException:
+            os.close(replies)
+            raise
+        finally:
+            os.close(protocol_fd)
+        self.replies = os.fdopen(replies, 'r')
+        self.jobs = {}
+        self.lock = threading.Lock()
+        threading.Thread(target=self._read_replies, name='script-engine-replies', daemon=True).start()
+
+    def alive(self):
+        return self.process.poll() is None
+
+    def _read_replies(self):
+        for line in self.replies:
+            try:
+                # Job file paths may contain spaces
+                kind, rest = line.rstrip('\n').split(' ', 1)
+                job, value = rest.rsplit(' ', 1)
+                value = int(value)
+                if kind not in ('pid', 'exit'):
+                    raise ValueError(kind)
+            except ValueError:
+                print(f"[WARN] Ignoring malformed script engine reply: {line.rstrip()!r}", file=sys.stderr)
+                continue
+            with self.lock:
+                state = self.jobs.get(job)
+            if state is None:
+                continue
+            if kind == 'pid':
+                state['pid'] = value
+                if state['on_start']:
+                    state['on_start'](state['pid'])
+            else:
+                state['exitcode'] = value
+                state['done'].set()
+        # Server gone: release everyone still waiting
+        with self.lock:
+            for state in self.jobs.values():
+                state['done'].set()
+
+    def run(self, job, timeout=None, on_start=None, env=None):
+        """Run a job file in a forked worker with env added to its environment; returns (finished, exit code)
+
+        on_start is called with the worker's pid, which is also its process group.
+        """
+        state = {'pid': None, 'exitcode': None, 'done': threading.Event(), 'on_start': on_start}
+        with self.lock:
+            self.jobs[job] = state
+            self.process.stdin.write(json.dumps({'job': job, 'env': env or {}}) + '\n')
+            self.process.stdin.flush()
+        try:
+            finished = state['done'].wait(timeout)
+            if not finished and state['pid']:
+                os.killpg(state['pid'], signal.SIGKILL)
+                state['done'].wait()
+            return finished, state['exitcode']
+        finally:
+            with self.lock:
+                self.jobs.pop(job, None)
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def _get_server():
+    global _server
+    with _server_lock:
+        if _server is None or not _server.alive():
+            _server = _WorkerServer()
+        return _server
+
+
+def start_worker_server():
+    """Start the fork server (and its preloads) ahead of the first run"""
+    _get_server()
+
+
+# --- parent side -------------------------------------------------------------------
+
+def execute_notebook(input_path, output_path, parameters=None, cwd=None, cache_key=None, branches=None,
+                     on_start=None, env=None):
+    """Run a notebook without a kernel; mirrors papermill.execute_notebook's arguments
+
+    SIGINT to the worker's process group stops it after the running cell, with
+    the outputs so far written to output_path; on_start receives its pid. env
+    is added to the worker's environment.
+    """
+    with open(input_path, encoding='utf-8') as f:
+        nb = json.load(f)
+    compiled = compile_notebook(nb, cache_key)
+    cwd = cwd or os.path.dirname(os.path.abspath(input_path))
+
+    # env is sent over the server's stdin rather than stored in the job file
+    job = os.path.abspath(output_path) + '.job'
+    with open(job, 'wb') as f:
+        pickle.dump((nb, compiled, dict(parameters or {}), cwd, os.path.abspath(output_path), branches), f)
+    try:
+        finished, exitcode = _get_server().run(job, SCRIPT_ENGINE_TIMEOUT, on_start, env)
+    finally:
+        os.remove(job)
+    if not finished:
+        raise TimeoutError(f"Notebook did not finish within {SCRIPT_ENGINE_TIMEOUT}s")
+    if not os.path.exists(output_path):
+        raise RuntimeError(f"Script engine worker exited with code {exitcode}")
+
+    if exitcode:
+        with open(output_path, encoding='utf-8') as f:
+            executed = json.load(f)
+        for idx, cell in enumerate(executed['cells']):
+            for output in cell.get('outputs', []):
+                if output.get('output_type') == 'error':
+                    raise ScriptExecutionError(idx, output['ename'], output['evalue'])
+    return output_path
+
+
+if __name__ == '__main__':
+    _serve()
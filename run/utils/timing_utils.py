@@ -0,0 +1,11 @@
+import time
+from contextlib import contextmanager
+
+@contextmanager
+def timed(timings, phase):
+    """Record the wall time of the block in seconds as timings[phase]"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[phase] = round(time.perf_counter() - start, 4)
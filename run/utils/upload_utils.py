@@ -0,0 +1,301 @@
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, nullcontext
+
+from utils.github_utils import repo_full_name
+from utils.notebook_utils import TARGET_REPO
+
+GITHUB_API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+TARGET_BRANCH = os.environ.get('TARGET_BRANCH', 'main')
+
+# Pipelined uploads: blob upload threads and how often the output folder is polled
+UPLOAD_WORKERS = int(os.environ.get('UPLOAD_WORKERS', 4))
+UPLOAD_POLL_SECONDS = float(os.environ.get('UPLOAD_POLL_SECONDS', 0.5))
+
+# GitHub rejects blobs over 100 MB, so those stay in the local artifact store only
+UPLOAD_MAX_BLOB_BYTES = int(os.environ.get('UPLOAD_MAX_BLOB_BYTES', 100 * 1024 ** 2))
+
+# Upper bound on request body bytes buffered at once by one run's uploads
+UPLOAD_MEMORY_BYTES = int(os.environ.get('UPLOAD_MEMORY_BYTES', 16 * 1024 ** 2))
+
+# A multiple of 3, so base64 chunks can be concatenated without padding
+CHUNK_SIZE = 3 * 256 * 1024
+
+
+def git_blob_sha(path):
+    """SHA-1 git assigns to the file's content as a blob, without reading it all into memory"""
+    digest = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def list_local_files(local_dir):
+    """{relative posix path: local path} for every file below local_dir"""
+    files = {}
+    for root, _, filenames in os.walk(local_dir):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            files[os.path.relpath(path, local_dir).replace(os.sep, '/')] = path
+    return files
+
+
+class MemoryBudget:
+    """Caps the body bytes buffered by the concurrent uploads of one run"""
+
+    def __init__(self, limit=UPLOAD_MEMORY_BYTES):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, nbytes):
+        nbytes = min(nbytes, self.limit)
+        with self._cond:
+            self._cond.wait_for(lambda: self.used + nbytes <= self.limit)
+            self.used += nbytes
+            self.peak = max(self.peak, self.used)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.used -= nbytes
+                self._cond.notify_all()
+
+
+class Base64JSONBody:
+    """JSON request body whose "content" field is a file, base64-encoded while it is sent
+
+    The file is read and encoded CHUNK_SIZE bytes at a time. The encoded length
+    is known up front, so requests sends a Content-Length rather than chunks.
+    """
+
+    def __init__(self, path, fields, budget=None):
+        self.path = path
+        self.size = os.path.getsize(path)
+        head = json.dumps(fields)[:-1]
+        self.prefix = f"{head}{', ' if fields else ''}\"content\": \"".encode()
+        self.suffix = b'"}'
+        self.budget = budget
+
+    def __len__(self):
+        return len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+
+    def __iter__(self):
+        # One raw chunk plus its encoded copy are alive at a time
+        buffered = min(self.size, CHUNK_SIZE) * 7 // 3
+        with self.budget.reserve(buffered) if self.budget else nullcontext():
+            yield self.prefix
+            with open(self.path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    yield base64.b64encode(chunk)
+            yield self.suffix
+
+
+class UploadCancelled(Exception):
+    """The run was cancelled before its commit moved the branch"""
+
+
+class GitHubUploader:
+    """Git Data API client for one branch of the target repo: tree listing, blobs and commits"""
+
+    def __init__(self, token, repo=TARGET_REPO, branch=TARGET_BRANCH, api_url=GITHUB_API_URL,
+                 budget=None):
+        import requests
+
+        self.repo = repo_full_name(repo)
+        self.branch = branch
+        self.api_url = api_url.rstrip('/')
+        self.budget = budget or MemoryBudget()
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github.v3+json'
+        })
+
+    def remote_tree(self, folder):
+        """{path relative to folder: blob sha} from one recursive tree request; {} if the folder is new"""
+        url = f"{self.api_url}/repos/{self.repo}/git/trees/{self.branch}:{folder.strip('/')}"
+        resp = self.session.get(url, params={'recursive': '1'})
+        if resp.status_code == 404:
+            return {}
+        resp.raise_for_status()
+        body = resp.json()
+        if body.get('truncated'):
+            print(f"[WARN] Tree listing of {folder} is truncated; unlisted files will be re-uploaded",
+                  file=sys.stderr)
+        return {entry['path']: entry['sha'] for entry in body.get('tree', []) if entry.get('type') == 'blob'}
+
+    def put_blob(self, local_path):
+        """Upload a file as a git blob and return its sha"""
+        resp = self.session.post(f"{self.api_url}/repos/{self.repo}/git/blobs",
+                                 data=Base64JSONBody(local_path, {'encoding': 'base64'}, self.budget),
+                                 headers={'Content-Type': 'application/json'})
+        resp.raise_for_status()
+        return resp.json()['sha']
+
+    @staticmethod
+    def _tree_entry(remote_folder, name, sha):
+        return {'path': f"{remote_folder}/{name}", 'mode': '100644', 'type': 'blob', 'sha': sha}
+
+    def _commit(self, entries, message, attempts=3, before_update=None):
+        """Create a tree and commit on top of the branch head and move the branch to it
+
+        before_update is called right before the branch is moved and may raise
+        to leave the branch alone.
+        """
+        base = f"{self.api_url}/repos/{self.repo}/git"
+        for attempt in range(attempts):
+            resp = self.session.get(f"{base}/ref/heads/{self.branch}")
+            resp.raise_for_status()
+            parent = resp.json()['object']['sha']
+            resp = self.session.get(f"{base}/commits/{parent}")
+            resp.raise_for_status()
+            base_tree = resp.json()['tree']['sha']
+
+            resp = self.session.post(f"{base}/trees", json={'base_tree': base_tree, 'tree': entries})
+            resp.raise_for_status()
+            resp = self.session.post(f"{base}/commits", json={
+                'message': message, 'tree': resp.json()['sha'], 'parents': [parent]})
+            resp.raise_for_status()
+            commit = resp.json()['sha']
+
+            if before_update:
+                before_update()
+            # Not a fast-forward when someone pushed in between; rebuild on the new head
+            resp = self.session.patch(f"{base}/refs/heads/{self.branch}", json={'sha': commit})
+            if resp.status_code == 200:
+                return commit
+            print(f"[WARN] Updating {self.branch} failed ({resp.status_code}), retrying", file=sys.stderr)
+        resp.raise_for_status()
+        raise RuntimeError(f"Could not update {self.branch} of {self.repo}")
+
+
+class PipelinedUploader(GitHubUploader):
+    """Uploads files as the notebook writes them and commits them together at the end
+
+    A watcher thread polls local_dir while the notebook runs. Files whose size
+    and mtime are stable across two polls are sent as git blobs on a thread
+    pool; finish() uploads what is left and creates one tree, one commit and a
+    ref update for the whole folder. Unless skip_unchanged is off, files
+    already in the target folder with the same blob SHA are skipped.
+    """
+
+    def __init__(self, token, local_dir, remote_folder, workers=UPLOAD_WORKERS,
+                 poll_seconds=UPLOAD_POLL_SECONDS, cancelled=None, skip_unchanged=True, **kwargs):
+        super().__init__(token, **kwargs)
+        self.local_dir = local_dir
+        # False for a folder no earlier run wrote to: nothing to compare against
+        self.skip_unchanged = skip_unchanged
+        # Callable that turns true once the run is cancelled (e.g. lambda: job.cancelled)
+        self.cancelled = cancelled
+        self._aborted = threading.Event()
+        self.remote_folder = remote_folder.strip('/')
+        self.poll_seconds = poll_seconds
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='upload')
+        self._stop = threading.Event()
+        self._seen = {}      # name -> (size, mtime) at the previous poll
+        self._sent = {}      # name -> (size, mtime) submitted for upload
+        self._futures = {}   # name -> future resolving to (outcome, blob sha, size)
+        self._remote = {}
+        self._watcher = None
+
+    def start(self):
+        if self.skip_unchanged:
+            self._remote = self.remote_tree(self.remote_folder)
+        self._watcher = threading.Thread(target=self._watch, name='upload-watcher', daemon=True)
+        self._watcher.start()
+        return self
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self._scan(final=False)
+            except Exception as e:
+                print(f"[WARN] Output watcher scan failed: {e}", file=sys.stderr)
+
+    def _scan(self, final):
+        """Submit files that stopped changing (all remaining files when final)"""
+        for name, path in list_local_files(self.local_dir).items():
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            state = (st.st_size, st.st_mtime_ns)
+            previous, self._seen[name] = self._seen.get(name), state
+            if self._sent.get(name) == state or (state != previous and not final):
+                continue
+            self._sent[name] = state
+            try:
+                self._futures[name] = self._pool.submit(self._upload, name, path)
+            except RuntimeError:
+                # abort() shut the pool down meanwhile
+                self._check_cancelled()
+                raise
+
+    def _upload(self, name, path):
+        size = os.path.getsize(path)
+        sha = git_blob_sha(path)
+        if self._remote.get(name) == sha:
+            return 'skipped', sha, size
+        if size > UPLOAD_MAX_BLOB_BYTES:
+            return 'oversize', sha, size
+        return 'uploaded', self.put_blob(path), size
+
+    def abort(self):
+        """Stop watching and drop pending uploads without committing"""
+        self._aborted.set()
+        self._stop.set()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _check_cancelled(self):
+        """Raise UploadCancelled once the run is cancelled or abort() was called"""
+        if self._aborted.is_set() or (self.cancelled and self.cancelled()):
+            raise UploadCancelled(f"Upload to {self.remote_folder} cancelled, {self.branch} left unchanged")
+
+    def finish(self, message=None):
+        """Upload what is left, then commit all changed files in one commit; returns upload stats"""
+        self._stop.set()
+        if self._watcher:
+            self._watcher.join()
+        self._check_cancelled()
+        self._scan(final=True)
+
+        stats = {'folder': self.remote_folder, 'uploaded': 0, 'uploaded_bytes': 0,
+                 'skipped': 0, 'skipped_bytes': 0, 'oversize': [], 'failed': [], 'commit': None}
+        entries = []
+        for name, future in sorted(self._futures.items()):
+            try:
+                outcome, sha, size = future.result()
+            except Exception as e:
+                print(f"[ERROR] Blob upload of {name} failed: {e}", file=sys.stderr)
+                stats['failed'].append(name)
+                continue
+            if outcome == 'skipped':
+                stats['skipped'] += 1
+                stats['skipped_bytes'] += size
+            elif outcome == 'oversize':
+                stats['oversize'].append(name)
+            else:
+                entries.append(self._tree_entry(self.remote_folder, name, sha))
+                stats['uploaded'] += 1
+                stats['uploaded_bytes'] += size
+        self._pool.shutdown()
+
+        self._check_cancelled()
+        if entries:
+            # Last check right before the ref update, so a cancelled run leaves the branch alone
+            stats['commit'] = self._commit(entries, message or f"Add {self.remote_folder}",
+                                           before_update=self._check_cancelled)
+        print(f"[DEBUG] Upload to {self.repo}/{stats['folder']}: {stats['uploaded']} files uploaded "
+              f"({stats['uploaded_bytes']} bytes), {stats['skipped']} unchanged skipped "
+              f"({stats['skipped_bytes']} bytes), {len(stats['oversize'])} too large, "
+              f"commit {stats['commit']}, peak buffered {self.budget.peak} bytes", file=sys.stderr)
+        return stats
@@ -1,70 +1,233 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify, stream_with_context, url_for
+import numpy as np
 import pandas as pd
 from pathlib import Path
+from urllib.parse import urlencode
+
+from datakit.aggregate import AggregateError, aggregate_records
+from datakit.dataset import Dataset
+from datakit.http_cache import Bundle, cached
 
 app = Flask(__name__, static_folder="static", template_folder="templates")
 
 DATA_PATH = Path(__file__).resolve().parent / "data" / "acs_bls_merged.csv"
-_df = None
+# Ingested in chunks into memory-mapped columns (data/.cache/), row groups indexed by state and county
+acs_bls = Dataset(DATA_PATH, dtype={"zip": str}, index_columns=("state", "county"))
+
+# /api/filter pages: default and maximum rows per page, rows serialized per chunk
+FILTER_PAGE_SIZE = 500
+FILTER_MAX_PAGE_SIZE = 50000
+FILTER_CHUNK_ROWS = 1000
+
+# /api/aggregate: columns that may be grouped by, summarized and used as weights
+AGGREGATE_GROUPS = ("state", "county")
+AGGREGATE_COLUMNS = ("population", "unemployment_rate")
+AGGREGATE_WEIGHTS = ("population",)
 
 def load_df():
-    global _df
-    if _df is None:
-        if DATA_PATH.exists():
-            # Keep zip as string (preserve leading zeros)
-            _df = pd.read_csv(DATA_PATH, dtype={"zip": "string"})
-        else:
-            # Empty placeholder so app still runs
-            _df = pd.DataFrame(columns=["state", "county", "zip"])
-    return _df
+    # Keep zip as string (preserve leading zeros)
+    df = acs_bls.load()
+    if df.empty and not len(df.columns):
+        # Empty placeholder so app still runs
+        return pd.DataFrame(columns=["state", "county", "zip"])
+    return df
+
+def dataset_version():
+    """Content hash of the loaded CSV; keys the response cache and ETags"""
+    load_df()
+    return acs_bls.version or "empty"
+
+def _sorted_groups(d, keys, value):
+    """{key: sorted unique values} for the rows where keys and value are all set"""
+    pairs = d[keys + [value]].dropna().drop_duplicates()
+    groups = {}
+    for key, values in pairs.groupby(keys if len(keys) > 1 else keys[0], observed=True, sort=False)[value]:
+        groups[key] = sorted(values.astype(str).tolist())
+    return groups
+
+def build_index(d):
+    """Pre-sorted lookups for the cascading state -> county -> zip dropdowns
+
+    Columns are categorical-encoded so grouping works on integer codes; each
+    answer is a ready list, so the endpoints are dictionary lookups.
+    """
+    d = d[["state", "county", "zip"]].astype("category")
+    return {
+        "states": sorted(d["state"].dropna().unique().astype(str).tolist()),
+        "counties": sorted(d["county"].dropna().unique().astype(str).tolist()),
+        "zips": sorted(d["zip"].dropna().unique().astype(str).tolist()),
+        "counties_by_state": _sorted_groups(d, ["state"], "county"),
+        "zips_by_state": _sorted_groups(d, ["state"], "zip"),
+        "zips_by_county": _sorted_groups(d, ["county"], "zip"),
+        "zips_by_state_county": _sorted_groups(d, ["state", "county"], "zip"),
+    }
+
+def load_index():
+    if acs_bls.version is None:
+        return build_index(load_df())
+    return acs_bls.derived("index", build_index)
+
+def build_hierarchy(d):
+    """state -> county -> zip tree with row counts, for resolving the dropdowns client-side
+
+    Names are stored once in sorted tables and the tree refers to them by
+    position: tree[i] = [rows, [[county, rows, [[zip, rows], ...]], ...], zips]
+    for states[i], where the last list holds zips of rows without a county.
+    no_state = [[county, [zips]], ...] covers rows without a state.
+    """
+    d = d[["state", "county", "zip"]].astype("category")
+    states = sorted(d["state"].dropna().unique().astype(str).tolist())
+    counties = sorted(d["county"].dropna().unique().astype(str).tolist())
+    zips = sorted(d["zip"].dropna().unique().astype(str).tolist())
+    county_ids = {name: n for n, name in enumerate(counties)}
+    zip_ids = {name: n for n, name in enumerate(zips)}
+
+    zip_counts = {}
+    for (state, county, zip_code), rows in d.groupby(["state", "county", "zip"], observed=True).size().items():
+        zip_counts.setdefault((str(state), str(county)), []).append([zip_ids[str(zip_code)], int(rows)])
+    county_counts = {}
+    for (state, county), rows in d.groupby(["state", "county"], observed=True).size().items():
+        entry = [county_ids[str(county)], int(rows), sorted(zip_counts.get((str(state), str(county)), []))]
+        county_counts.setdefault(str(state), []).append(entry)
+    state_rows = {str(state): int(rows) for state, rows in d.groupby("state", observed=True).size().items()}
+
+    no_county = _sorted_groups(d[d["county"].isna()], ["state"], "zip")
+    no_state = _sorted_groups(d[d["state"].isna()], ["county"], "zip")
+
+    tree = [[state_rows.get(state, 0), sorted(county_counts.get(state, [])),
+             [zip_ids[z] for z in no_county.get(state, [])]] for state in states]
+    return {
+        "states": states,
+        "counties": counties,
+        "zips": zips,
+        "tree": tree,
+        "no_state": [[county_ids[county], [zip_ids[z] for z in z_list]] for county, z_list in sorted(no_state.items())],
+    }
+
+def load_hierarchy():
+    def build(d):
+        version = dataset_version()
+        return Bundle(dict(build_hierarchy(d), version=version), version)
+
+    if acs_bls.version is None:
+        return build(load_df())
+    return acs_bls.derived("hierarchy", build)
 
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return render_template("index.html", hierarchy_url=url_for("api_hierarchy", v=dataset_version()))
+
+@app.get("/api/hierarchy")
+def api_hierarchy():
+    """Every state, county and zip in one compressed document; immutable when requested with ?v=<version>"""
+    return load_hierarchy().response()
 
 @app.get("/api/states")
+@cached(dataset_version)
 def api_states():
-    d = load_df()
-    states = sorted([s for s in d["state"].dropna().unique().tolist()])
-    return jsonify(states)
+    return jsonify(load_index()["states"])
 
 @app.get("/api/counties")
+@cached(dataset_version)
 def api_counties():
     state = request.args.get("state")
-    d = load_df()
-    q = d if not state else d[d["state"] == state]
-    counties = sorted([c for c in q["county"].dropna().unique().tolist()])
-    return jsonify(counties)
+    index = load_index()
+    if not state:
+        return jsonify(index["counties"])
+    return jsonify(index["counties_by_state"].get(state, []))
 
 @app.get("/api/zips")
+@cached(dataset_version)
 def api_zips():
     state = request.args.get("state")
     county = request.args.get("county")
-    d = load_df()
-    q = d
-    if state:
-        q = q[q["state"] == state]
-    if county:
-        q = q[q["county"] == county]
-    z = sorted([str(z) for z in q["zip"].dropna().astype(str).unique().tolist()])
+    index = load_index()
+    if state and county:
+        z = index["zips_by_state_county"].get((state, county), [])
+    elif state:
+        z = index["zips_by_state"].get(state, [])
+    elif county:
+        z = index["zips_by_county"].get(county, [])
+    else:
+        z = index["zips"]
     return jsonify(z)
 
+def filter_rows(state=None, county=None, zip_code=None):
+    """Sorted positions of the rows matching every given filter; only row groups holding them are read"""
+    if load_df().empty:
+        return np.array([], dtype=np.intp)
+    return acs_bls.rows(state=state, county=county, zip=zip_code)
+
+def _encode_chunks(d, positions, fmt):
+    """Serialize the rows at positions chunk by chunk; only one chunk is materialized at a time"""
+    if fmt == "json":
+        yield "["
+    for start in range(0, len(positions), FILTER_CHUNK_ROWS):
+        chunk = d.iloc[positions[start:start + FILTER_CHUNK_ROWS]]
+        if fmt == "csv":
+            yield chunk.to_csv(index=False, header=start == 0)
+        elif fmt == "ndjson":
+            yield chunk.to_json(orient="records", lines=True, double_precision=15)
+        else:
+            yield ("," if start else "") + chunk.to_json(orient="records", double_precision=15)[1:-1]
+    if fmt == "json":
+        yield "]"
+
 @app.get("/api/filter")
+@cached(dataset_version)
 def api_filter():
+    """Matching rows, one page at a time, streamed as a JSON array (or format=ndjson / csv)
+
+    Pages: limit (default 500) and either offset or the cursor from the
+    previous page's X-Next-Cursor header (also given as a Link rel="next").
+    X-Total-Count is the number of matching rows.
+    """
     state = request.args.get("state")
     county = request.args.get("county")
     zip_code = request.args.get("zip")
+    fmt = request.args.get("format", "json")
+    if fmt not in ("json", "ndjson", "csv"):
+        return jsonify({"error": f"Unknown format: {fmt}"}), 400
+    try:
+        limit = min(int(request.args.get("limit", FILTER_PAGE_SIZE)), FILTER_MAX_PAGE_SIZE)
+        offset = int(request.args.get("offset", 0))
+        cursor = request.args.get("cursor")
+        cursor = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "limit, offset and cursor must be integers"}), 400
 
-    d = load_df().copy()
-    if state:
-        d = d[d["state"] == state]
-    if county:
-        d = d[d["county"] == county]
-    if zip_code:
-        d = d[d["zip"].astype(str) == str(zip_code)]
+    d = load_df()
+    rows = filter_rows(state, county, zip_code)
+    start = int(np.searchsorted(rows, cursor, side="right")) if cursor is not None else max(offset, 0)
+    page = rows[start:start + max(limit, 0)]
+
+    headers = {"X-Total-Count": str(len(rows))}
+    if start + len(page) < len(rows) and len(page):
+        next_cursor = str(int(page[-1]))
+        args = {k: v for k, v in request.args.items() if k not in ("cursor", "offset")}
+        headers["X-Next-Cursor"] = next_cursor
+        headers["Link"] = f'<{request.path}?{urlencode(dict(args, cursor=next_cursor))}>; rel="next"'
+    mimetype = {"json": "application/json", "ndjson": "application/x-ndjson", "csv": "text/csv"}[fmt]
+    return Response(stream_with_context(_encode_chunks(d, page, fmt)), mimetype=mimetype, headers=headers)
 
-    # Cap payload
-    return jsonify(d.head(500).to_dict(orient="records"))
+@app.get("/api/aggregate")
+@cached(dataset_version)
+def api_aggregate():
+    """Summaries of the rows matching state/county/zip, e.g.
+    ?by=state&metric=wmean:unemployment_rate:population&metric=sum:population
+    (see datakit/aggregate.py); results are cached per query
+    """
+    d = load_df()
+    if d.empty:
+        return jsonify([])
+    rows = filter_rows(request.args.get("state"), request.args.get("county"), request.args.get("zip"))
+    if len(rows) != len(d):
+        d = d.iloc[rows]
+    try:
+        body = aggregate_records(d, request.args, AGGREGATE_GROUPS, AGGREGATE_COLUMNS, AGGREGATE_WEIGHTS)
+    except AggregateError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, mimetype="application/json")
 
 if __name__ == "__main__":
     # 0.0.0.0 works on local and platforms like Render/Railway
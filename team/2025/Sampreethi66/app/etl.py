@@ -0,0 +1,230 @@
+# app/etl.py
+"""Builds county_density.csv from raw ACS population and BLS/CBP employment extracts.
+
+    python -m app.etl --population raw/acs_population.csv --employment raw/cbp22co.txt
+
+Each input is parsed once per content hash into memory-mapped columns under
+<output dir>/.cache/etl/, so a rebuild only re-reads the files that changed,
+and when neither input changed the output is left alone. The inputs are
+joined on the 5-digit county FIPS code, density_per_1k is derived, and the
+written CSV's columns are published to the Dataset cache the app reads.
+
+Recognized population layouts (column names are case-insensitive):
+  Census API export: NAME, B01003_001E, state, county
+  plain:             county_fips, county_name, population
+Recognized employment layouts, keeping NAICS 5415 (computer systems design):
+  CBP county file:   fipstate, fipscty, naics, emp
+  BLS QCEW:          area_fips, industry_code, own_code, annual_avg_emplvl (private ownership)
+  plain:             county_fips, employment_5415
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from datakit.dataset import file_hash, map_columns, write_columns
+
+# Bump when parsing or the join changes, so cached stages and outputs are rebuilt
+ETL_VERSION = 1
+
+COLUMNS = ["county_fips", "county_name", "population", "employment_5415", "density_per_1k"]
+NAICS = "5415"
+
+
+def _header(path):
+    return [column.strip().lower() for column in pd.read_csv(path, nrows=0).columns]
+
+
+def _read(path, columns, dtype):
+    if isinstance(dtype, dict):
+        # dtype is keyed by lowercase name, the file's header may be in any case
+        header = pd.read_csv(path, nrows=0).columns
+        dtype = {column: dtype[column.strip().lower()] for column in header if column.strip().lower() in dtype}
+    df = pd.read_csv(path, dtype=dtype, usecols=lambda column: column.strip().lower() in columns)
+    df.columns = [column.strip().lower() for column in df.columns]
+    return df
+
+
+def _fips(state, county):
+    return state.astype(str).str.zfill(2) + county.astype(str).str.zfill(3)
+
+
+def ingest_population(path):
+    """county_fips, county_name, population for one row per county"""
+    header = _header(path)
+    if "b01003_001e" in header:
+        df = _read(path, {"name", "b01003_001e", "state", "county"}, str)
+        df = pd.DataFrame({
+            "county_fips": _fips(df["state"], df["county"]),
+            # "Dallas County, Texas" -> "Dallas County"
+            "county_name": df["name"].str.split(",").str[0].str.strip(),
+            "population": df["b01003_001e"],
+        })
+    elif {"county_fips", "population"} <= set(header):
+        df = _read(path, {"county_fips", "county_name", "population"}, {"county_fips": str})
+        df["county_fips"] = df["county_fips"].str.zfill(5)
+        if "county_name" not in df.columns:
+            df["county_name"] = ""
+    else:
+        raise ValueError(f"{path}: unrecognized population layout {header}")
+    df["population"] = pd.to_numeric(df["population"], errors="coerce")
+    df = df.dropna(subset=["population"]).drop_duplicates("county_fips", keep="last")
+    df["population"] = df["population"].astype(np.int64)
+    return df[["county_fips", "county_name", "population"]].reset_index(drop=True)
+
+
+def ingest_employment(path):
+    """county_fips, employment_5415 summed per county"""
+    header = _header(path)
+    if {"fipstate", "fipscty", "naics", "emp"} <= set(header):
+        df = _read(path, {"fipstate", "fipscty", "naics", "emp"}, {"fipstate": str, "fipscty": str, "naics": str})
+        # CBP writes the 4-digit industry as "5415//"
+        df = df[df["naics"].str.rstrip("/-") == NAICS]
+        df = pd.DataFrame({"county_fips": _fips(df["fipstate"], df["fipscty"]), "employment_5415": df["emp"]})
+    elif {"area_fips", "industry_code", "own_code", "annual_avg_emplvl"} <= set(header):
+        df = _read(path, {"area_fips", "industry_code", "own_code", "annual_avg_emplvl"},
+                   {"area_fips": str, "industry_code": str, "own_code": str})
+        df = df[(df["industry_code"] == NAICS) & (df["own_code"] == "5")]
+        df = pd.DataFrame({"county_fips": df["area_fips"].str.zfill(5), "employment_5415": df["annual_avg_emplvl"]})
+    elif {"county_fips", "employment_5415"} <= set(header):
+        df = _read(path, {"county_fips", "employment_5415"}, {"county_fips": str})
+        df["county_fips"] = df["county_fips"].str.zfill(5)
+    else:
+        raise ValueError(f"{path}: unrecognized employment layout {header}")
+    df["employment_5415"] = pd.to_numeric(df["employment_5415"], errors="coerce").fillna(0)
+    df = df.groupby("county_fips", as_index=False, sort=False)["employment_5415"].sum()
+    df["employment_5415"] = df["employment_5415"].astype(np.int64)
+    return df
+
+
+def join(population, employment):
+    """The county_density frame: every county with a population, sorted by FIPS"""
+    # Stages mapped from the cache hold text as categoricals
+    population = population.astype({"county_fips": object, "county_name": object})
+    employment = employment.astype({"county_fips": object})
+    df = population.merge(employment, on="county_fips", how="left", validate="one_to_one")
+    # CBP leaves out counties without establishments in the industry
+    df["employment_5415"] = df["employment_5415"].fillna(0).astype(np.int64)
+    population = df["population"].where(df["population"] > 0)
+    df["density_per_1k"] = df["employment_5415"] / population * 1000
+    return df.sort_values("county_fips", kind="stable")[COLUMNS].reset_index(drop=True)
+
+
+class Pipeline:
+    """Incremental builds of one output CSV; state is kept in <output dir>/.cache/etl"""
+
+    def __init__(self, output, dataset=None):
+        self.output = Path(output)
+        self.dataset = dataset
+        self.state_dir = self.output.parent / ".cache" / "etl"
+        self.manifest_path = self.state_dir / "manifest.json"
+
+    def _manifest(self):
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.manifest_path.with_suffix(f".tmp-{os.getpid()}")
+        tmp.write_text(json.dumps(manifest, indent=2))
+        os.replace(tmp, self.manifest_path)
+
+    def _digest(self, path, known):
+        """Content hash of path, reusing the recorded one while mtime and size are unchanged"""
+        stat = path.stat()
+        signature = [stat.st_mtime_ns, stat.st_size]
+        if known and known.get("path") == str(path) and known.get("signature") == signature:
+            return known["sha1"], signature
+        return file_hash(path), signature
+
+    def _stage(self, kind, path, digest, ingest):
+        """Parsed input, mapped from the stage cached for this content or ingested and cached now"""
+        directory = self.state_dir / f"{kind}-v{ETL_VERSION}-{digest[:16]}"
+        if (directory / "meta.json").exists():
+            return map_columns(directory), False
+        df = ingest(path)
+        staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=self.state_dir))
+        write_columns(df, staging)
+        try:
+            os.rename(staging, directory)
+        except OSError:
+            shutil.rmtree(staging, ignore_errors=True)
+        for other in self.state_dir.glob(f"{kind}-v*"):
+            if other != directory:
+                shutil.rmtree(other, ignore_errors=True)
+        return df, True
+
+    def run(self, population, employment, force=False):
+        """Build the output if an input changed (or force); returns a summary of what was done"""
+        started = time.perf_counter()
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        manifest = self._manifest()
+        inputs = {}
+        for kind, path in (("population", Path(population)), ("employment", Path(employment))):
+            digest, signature = self._digest(path, manifest.get("inputs", {}).get(kind))
+            inputs[kind] = {"path": str(path), "sha1": digest, "signature": signature}
+
+        key = f"{ETL_VERSION}:{inputs['population']['sha1']}:{inputs['employment']['sha1']}"
+        output = manifest.get("output", {})
+        if (not force and output.get("key") == key and self.output.exists()
+                and self._digest(self.output, output)[0] == output.get("sha1")):
+            return {"status": "unchanged", "output": str(self.output), "seconds": time.perf_counter() - started}
+
+        pop, pop_parsed = self._stage("population", Path(population), inputs["population"]["sha1"], ingest_population)
+        emp, emp_parsed = self._stage("employment", Path(employment), inputs["employment"]["sha1"], ingest_employment)
+        df = join(pop, emp)
+
+        tmp = self.output.with_name(f".{self.output.name}.tmp-{os.getpid()}")
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, self.output)
+        digest, signature = self._digest(self.output, None)
+        published = self.dataset.publish(df) if self.dataset is not None else False
+
+        self._save_manifest({
+            "etl_version": ETL_VERSION,
+            "inputs": inputs,
+            "output": {"path": str(self.output), "key": key, "sha1": digest, "signature": signature,
+                       "rows": len(df), "built": time.time()},
+        })
+        return {
+            "status": "built",
+            "output": str(self.output),
+            "rows": len(df),
+            "parsed": [kind for kind, parsed in (("population", pop_parsed), ("employment", emp_parsed)) if parsed],
+            "published": published,
+            "seconds": time.perf_counter() - started,
+        }
+
+
+def main(argv=None):
+    from .routes import CSV_FILE, county_density
+
+    parser = argparse.ArgumentParser(description="Build county_density.csv from ACS population and BLS/CBP employment files")
+    parser.add_argument("--population", required=True, help="ACS county population extract (CSV)")
+    parser.add_argument("--employment", required=True, help="CBP county file or BLS QCEW extract (CSV)")
+    parser.add_argument("--output", default=str(CSV_FILE), help="CSV to write (default: the app's county_density.csv)")
+    parser.add_argument("--force", action="store_true", help="rebuild even if no input changed")
+    args = parser.parse_args(argv)
+
+    output = Path(args.output).resolve()
+    dataset = county_density if output == Path(CSV_FILE).resolve() else None
+    try:
+        summary = Pipeline(output, dataset=dataset).run(args.population, args.employment, force=args.force)
+    except (OSError, ValueError) as e:
+        print(f"[ERROR] ETL failed: {e}", file=sys.stderr)
+        return 1
+    print(f"[INFO] {json.dumps(summary)}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,15 @@
 # app/routes.py
+import gzip
+import shutil
 from pathlib import Path
-from flask import Blueprint, jsonify, render_template, send_from_directory, request
+import numpy as np
 import pandas as pd
+from flask import Blueprint, Response, jsonify, render_template, request, send_file, stream_with_context
+
+from datakit.aggregate import AggregateError, aggregate_records
+from datakit.dataset import Dataset
+from datakit.http_cache import CACHE_MAX_AGE, cached, not_modified, request_etag, validators
+from datakit.search import TextIndex
 
 bp = Blueprint("main", __name__)
 
@@ -9,14 +17,52 @@ ROOT = Path(__file__).resolve().parents[1]        # .../cloud
 DATA_DIR = ROOT / "app" / "data"
 CSV_FILE = DATA_DIR / "county_density.csv"
 
-def load_df():
-    if not CSV_FILE.exists():
-        return pd.DataFrame()
-    df = pd.read_csv(CSV_FILE, dtype={"county_fips": str})
+# /api/aggregate: columns that may be grouped by, summarized and used as weights
+AGGREGATE_GROUPS = ("state_fips", "county_fips")
+AGGREGATE_COLUMNS = ("population", "employment_5415", "density_per_1k")
+AGGREGATE_WEIGHTS = ("population", "employment_5415")
+
+# /download/county_density.csv: arguments that select rows, rows written per chunk
+EXPORT_FILTERS = ("state_fips", "state", "county_fips", "county")
+EXPORT_CHUNK_ROWS = 10000
+
+def add_state_fips(df):
     if "state_fips" not in df.columns and "county_fips" in df.columns:
         df["state_fips"] = df["county_fips"].str[:2]
     return df
 
+# Ingested once per CSV version and memory-mapped, row groups indexed by state (see dataset.py)
+county_density = Dataset(CSV_FILE, dtype={"county_fips": str}, derive=add_state_fips, index_columns=("state_fips",))
+
+def load_df():
+    return county_density.load()
+
+def dataset_version():
+    load_df()
+    return county_density.version
+
+def county_name_index():
+    return county_density.derived("county_name_index", lambda df: TextIndex(df["county_name"]))
+
+def filter_positions(args):
+    """Sorted positions of the rows matching the state_fips (or state), county_fips and county (name substring) arguments"""
+    state = args.get("state_fips") or args.get("state")
+    county_fips = args.get("county_fips")
+    county = args.get("county")
+
+    # Only the row groups that can hold the state / county_fips are read
+    positions = county_density.rows(state_fips=state, county_fips=county_fips)
+    if county:
+        # Case-insensitive substring match through the name index, rows stay in file order
+        positions = np.intersect1d(positions, county_name_index().rows(county), assume_unique=True)
+    return positions
+
+def filter_frame(df, args):
+    positions = filter_positions(args)
+    if len(positions) == len(df):
+        return df
+    return df.iloc[positions]
+
 @bp.get("/health")
 def health():
     return {"ok": True}
@@ -28,23 +74,14 @@ def home():
     return render_template("index.html", states=states)
 
 @bp.get("/api/county_density")
+@cached(dataset_version)
 def api_county_density():
     df = load_df()
     if df.empty:
         return jsonify([])
 
-    state = request.args.get("state_fips") or request.args.get("state")
-    county_fips = request.args.get("county_fips")
-    county = request.args.get("county")
+    df = filter_frame(df, request.args)
     limit = request.args.get("limit", "100")
-
-    if state:
-        df = df[df["state_fips"] == state]
-    if county_fips:
-        df = df[df["county_fips"] == county_fips]
-    if county:
-        df = df[df["county_name"].str.contains(county, case=False, na=False)]
-
     try:
         df = df.head(int(limit))
     except:
@@ -53,8 +90,93 @@ def api_county_density():
     cols = [c for c in ["state_fips","county_fips","county_name","population","employment_5415","density_per_1k"] if c in df.columns]
     return df[cols].to_json(orient="records")
 
+@bp.get("/api/county_search")
+@cached(dataset_version)
+def api_county_search():
+    """Type-ahead: counties whose name contains q, prefix matches first"""
+    q = request.args.get("q", "")
+    try:
+        limit = int(request.args.get("limit", "10"))
+    except ValueError:
+        limit = 10
+    df = load_df()
+    if df.empty or not q.strip():
+        return jsonify([])
+
+    index = county_name_index()
+    rows = []
+    for value_id in index.ranked(q):
+        positions = index.order[index.starts[value_id]:index.starts[value_id + 1]]
+        rows.extend(sorted(positions.tolist()))
+        if len(rows) >= limit:
+            break
+    cols = [c for c in ["county_fips", "county_name", "state_fips"] if c in df.columns]
+    return df[cols].iloc[rows[:limit]].to_json(orient="records")
+
+@bp.get("/api/aggregate")
+@cached(dataset_version)
+def api_aggregate():
+    """Summaries over the rows matching the /api/county_density filters, e.g.
+    ?by=state_fips&metric=sum:employment_5415&metric=p90:density_per_1k
+    (see aggregate.py); results are cached per query
+    """
+    df = load_df()
+    if df.empty:
+        return jsonify([])
+    try:
+        body = aggregate_records(filter_frame(df, request.args), request.args,
+                                 AGGREGATE_GROUPS, AGGREGATE_COLUMNS, AGGREGATE_WEIGHTS)
+    except AggregateError as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(body, mimetype="application/json")
+
+def _gzip_file(source):
+    def build(path):
+        with open(source, "rb") as src, gzip.GzipFile(path, "wb", compresslevel=9, mtime=0) as dst:
+            shutil.copyfileobj(src, dst, 1 << 20)
+    return build
+
+def _csv_chunks(df, positions, columns):
+    """The rows at positions as CSV, EXPORT_CHUNK_ROWS at a time"""
+    yield ",".join(columns) + "\n"
+    for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+        chunk = df.iloc[positions[start:start + EXPORT_CHUNK_ROWS]]
+        yield chunk[columns].to_csv(index=False, header=False)
+
 @bp.get("/download/county_density.csv")
 def download_csv():
+    """The CSV file (gzip-encoded if accepted, with Range and ETag support),
+    or with the /api/county_density filters the matching rows streamed as CSV
+    """
     if not CSV_FILE.exists():
         return jsonify({"error": "CSV not found"}), 404
-    return send_from_directory(directory=DATA_DIR, path="county_density.csv", as_attachment=True)
+    df = load_df()
+    version = county_density.version
+
+    if any(request.args.get(name) for name in EXPORT_FILTERS):
+        etag = request_etag(version)
+        unchanged = not_modified(etag)
+        if unchanged is not None:
+            return unchanged
+        positions = filter_positions(request.args)
+        columns = county_density.derived("csv_columns", lambda _: list(pd.read_csv(CSV_FILE, nrows=0).columns))
+        response = Response(stream_with_context(_csv_chunks(df, positions, columns)), mimetype="text/csv", headers={
+            "Content-Disposition": 'attachment; filename="county_density.csv"',
+            "X-Total-Count": str(len(positions)),
+        })
+        return validators(response, etag)
+
+    compressed = None
+    if request.accept_encodings["gzip"]:
+        # Compressed once per CSV version, next to its cached columns
+        compressed = county_density.artifact("county_density.csv.gz", _gzip_file(CSV_FILE))
+    if compressed is not None:
+        response = send_file(compressed, mimetype="text/csv", as_attachment=True,
+                             download_name="county_density.csv", conditional=True, etag=f"{version}-gzip")
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = send_file(CSV_FILE, mimetype="text/csv", as_attachment=True,
+                             download_name="county_density.csv", conditional=True, etag=version)
+    response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = f"public, max-age={CACHE_MAX_AGE}"
+    return response
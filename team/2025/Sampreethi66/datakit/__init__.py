@@ -0,0 +1,5 @@
+"""Data-serving helpers shared by app.py (ACS + BLS) and the county density app (app/).
+
+dataset: CSVs cached as memory-mapped columns; http_cache: response cache and
+validators; aggregate: group-by summaries; search: text search over a column.
+"""
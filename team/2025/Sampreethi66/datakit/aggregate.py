@@ -0,0 +1,89 @@
+# datakit/aggregate.py
+"""Group-by summaries computed on the server over the full dataset.
+
+A metric is written fn:column, or wmean:column:weight for a weighted mean;
+fn is one of sum, mean, min, max, count, wmean or a percentile like p50 or
+p99.5. Every metric is one vectorized pandas groupby over the columns an
+endpoint whitelists, so no rows have to be shipped to the browser.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+FUNCTIONS = ("sum", "mean", "min", "max", "count", "wmean")
+_PERCENTILE = re.compile(r"p(\d{1,2}(?:\.\d+)?|100)$")
+
+
+class AggregateError(ValueError):
+    """A group-by column or metric the endpoint does not allow"""
+
+
+def parse_metric(spec, columns, weights):
+    """(fn, column, weight, output name) for a metric spec, checked against the whitelists"""
+    fn, _, rest = spec.partition(":")
+    column, _, weight = rest.partition(":")
+    if fn not in FUNCTIONS and not _PERCENTILE.match(fn):
+        raise AggregateError(f"Unknown function {fn!r} in {spec!r}; use {', '.join(FUNCTIONS)} or p0-p100")
+    if column not in columns:
+        raise AggregateError(f"Column {column!r} cannot be aggregated; use one of {', '.join(columns)}")
+    if fn == "wmean":
+        if weight not in weights:
+            raise AggregateError(f"wmean needs a weight column, one of {', '.join(weights)}: wmean:{column}:<weight>")
+        return fn, column, weight, f"wmean_{column}_by_{weight}"
+    if weight:
+        raise AggregateError(f"Only wmean takes a weight: {spec!r}")
+    return fn, column, None, f"{fn}_{column}"
+
+
+def _group_keys(df, by):
+    # A constant key when there is nothing to group by gives one overall row
+    if by:
+        return [df[column] for column in by]
+    return [pd.Series(np.zeros(len(df), dtype=np.int8), index=df.index)]
+
+
+def aggregate(df, by, metrics, groups, columns, weights):
+    """DataFrame with one row per group of the by columns (all rows if by is empty)
+
+    groups, columns and weights are the allowed group-by, value and weight
+    columns; metrics are specs as described in the module docstring.
+    """
+    for column in by:
+        if column not in groups:
+            raise AggregateError(f"Cannot group by {column!r}; use {', '.join(groups)}")
+    if len(set(by)) != len(by):
+        raise AggregateError("Group-by columns must be distinct")
+    parsed = [parse_metric(spec, columns, weights) for spec in metrics]
+
+    keys = _group_keys(df, by)
+    out = {"rows": df.groupby(keys, observed=True, sort=True).size()}
+    for fn, column, weight, name in parsed:
+        values = pd.to_numeric(df[column], errors="coerce").astype("float64")
+        if fn == "wmean":
+            w = pd.to_numeric(df[weight], errors="coerce").astype("float64")
+            w = w.where(values.notna())
+            grouped = pd.DataFrame({"num": values * w, "den": w}).groupby(keys, observed=True, sort=True)
+            sums = grouped.sum(min_count=1)
+            out[name] = sums["num"] / sums["den"].replace(0, np.nan)
+        elif fn.startswith("p"):
+            out[name] = values.groupby(keys, observed=True, sort=True).quantile(float(fn[1:]) / 100)
+        elif fn == "sum":
+            out[name] = values.groupby(keys, observed=True, sort=True).sum(min_count=1)
+        else:
+            out[name] = values.groupby(keys, observed=True, sort=True).agg(fn)
+
+    result = pd.DataFrame(out)
+    if by:
+        return result.reset_index(names=list(by))
+    return result.reset_index(drop=True)
+
+
+def aggregate_records(df, args, groups, columns, weights):
+    """JSON records for a request's by= (comma separated) and repeated metric= arguments"""
+    by = [column.strip() for column in args.get("by", "").split(",") if column.strip()]
+    metrics = args.getlist("metric") or [f"sum:{columns[0]}"]
+    result = aggregate(df, by, metrics, groups, columns, weights)
+    for column in by:
+        result[column] = result[column].astype(str)
+    return result.to_json(orient="records", double_precision=15)
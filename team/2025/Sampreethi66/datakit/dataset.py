@@ -0,0 +1,347 @@
+# datakit/dataset.py
+"""CSV datasets ingested once into memory-mapped numpy columns.
+
+The first load reads the CSV in chunks and writes every column as a .npy
+file (text columns as codes into the sorted distinct values) into a cache
+directory named after the CSV's content hash, so ingesting never holds more
+than a chunk in memory. Later loads, in this process or in another gunicorn
+worker, map those files instead of parsing again, so all workers share one
+copy through the page cache. A changed CSV (mtime or size) is re-hashed and,
+if the content differs, rebuilt under a new version.
+
+Rows are stored in row groups of ROW_GROUP_ROWS with each column's min/max
+per group, and index columns record which groups hold each value;
+Dataset.rows() uses them to read only the groups that can match a filter.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout, the parsing or a derive function changes
+FORMAT_VERSION = 3
+
+CACHE_DIR = os.environ.get("DATASET_CACHE_DIR")
+# Rows per chunk read from the CSV and per row group on disk
+ROW_GROUP_ROWS = int(os.environ.get("DATASET_ROW_GROUP_ROWS", 65536))
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _code_dtype(categories):
+    # The dtype pandas picks for Categorical codes, so mapped codes are used without a copy
+    for dtype in (np.int8, np.int16, np.int32):
+        if categories < np.iinfo(dtype).max:
+            return dtype
+    return np.int64
+
+
+def _schema(chunks):
+    """(rows, {column: numpy dtype, or sorted categories for text}) over a stream of frames
+
+    Returns None for rows if a column read as numbers in one chunk holds
+    text in another; the caller then reads it as text.
+    """
+    rows, numeric, text, order = 0, {}, {}, {}
+    for chunk in chunks:
+        rows += len(chunk)
+        for name in chunk.columns:
+            order.setdefault(name, None)
+            column = chunk[name]
+            if column.dtype.kind in "iufb" and name not in text:
+                numeric[name] = np.result_type(numeric.get(name, column.dtype), column.dtype)
+            elif name in numeric:
+                return None, {name: str}
+            else:
+                text.setdefault(name, set()).update(str(value) for value in column.dropna().unique())
+    return rows, {name: numeric[name] if name in numeric else sorted(text.get(name, ())) for name in order}
+
+
+def _write_chunks(chunks, target, rows, schema, index_columns=()):
+    """Write the frames of chunks (one row group each) as one .npy per column plus meta.json"""
+    meta = {"format": FORMAT_VERSION, "rows": rows, "columns": [], "row_groups": [],
+            "indexes": {name: {} for name in index_columns}}
+    arrays, dtypes = {}, {}
+    for n, (name, kind) in enumerate(schema.items()):
+        filename = f"{n}.npy"
+        if isinstance(kind, list):
+            dtype = _code_dtype(len(kind))
+            dtypes[name] = pd.CategoricalDtype(kind)
+            meta["columns"].append({"name": str(name), "file": filename, "kind": "category", "categories": kind})
+        else:
+            dtype = kind
+            meta["columns"].append({"name": str(name), "file": filename, "kind": "numeric"})
+        arrays[name] = np.lib.format.open_memmap(target / filename, mode="w+", dtype=dtype, shape=(rows,))
+
+    start = 0
+    for chunk in chunks:
+        stop = start + len(chunk)
+        group = len(meta["row_groups"])
+        stats = {}
+        for name, array in arrays.items():
+            if name in dtypes:
+                # Text as codes into the sorted distinct values (-1 for missing)
+                values = chunk[name].astype(str).where(chunk[name].notna()).astype(dtypes[name]).cat.codes.to_numpy()
+                valid = values[values >= 0]
+            else:
+                values = chunk[name].to_numpy(dtype=array.dtype)
+                valid = values[~np.isnan(values)] if values.dtype.kind == "f" else values
+            array[start:stop] = values
+            stats[name] = [valid.min().item(), valid.max().item()] if len(valid) else None
+            if name in meta["indexes"]:
+                for code in np.unique(valid).tolist():
+                    meta["indexes"][name].setdefault(str(code), []).append(group)
+        meta["row_groups"].append({"start": start, "stop": stop, "stats": stats})
+        start = stop
+    for array in arrays.values():
+        array.flush()
+    (target / "meta.json").write_text(json.dumps(meta))
+
+
+def _slices(df, size=ROW_GROUP_ROWS):
+    return (df.iloc[start:start + size] for start in range(0, max(len(df), 1), size))
+
+
+def write_columns(df, target, index_columns=()):
+    """Write an in-memory frame like an ingested CSV"""
+    _, schema = _schema([df])
+    _write_chunks(_slices(df), target, len(df), schema, index_columns)
+
+
+def _read_meta(directory):
+    return json.loads((directory / "meta.json").read_text())
+
+
+def _values(series):
+    # The array a column's data lives in: categorical codes or the plain values
+    return series.array.codes if isinstance(series.dtype, pd.CategoricalDtype) else series.to_numpy()
+
+
+def map_columns(directory, meta=None):
+    """DataFrame over the memory-mapped columns in directory
+
+    Every column must still be backed by its mapped file; a pandas version
+    that copies them instead would hold the whole dataset in each worker,
+    so that is warned about.
+    """
+    meta = meta or _read_meta(directory)
+    columns, mapped = {}, {}
+    for column in meta["columns"]:
+        values = mapped[column["name"]] = np.load(directory / column["file"], mmap_mode="r")
+        if column["kind"] == "category":
+            values = pd.Categorical.from_codes(values, column["categories"], validate=False)
+        columns[column["name"]] = values
+    df = pd.DataFrame(columns, copy=False)
+    copied = [name for name, values in mapped.items()
+              if len(values) and not np.shares_memory(_values(df[name]), values)]
+    if copied:
+        warnings.warn(f"{directory.name}: columns {copied} were copied into memory instead of mapped", RuntimeWarning)
+    return df
+
+
+class Dataset:
+    """A CSV file with a cached, mtime-invalidated columnar copy
+
+    dtype is passed to read_csv; derive(df) may add columns and runs on each
+    chunk before it is written, so it must work row by row. The row groups of
+    index_columns (text columns) are indexed by value for rows().
+    """
+
+    def __init__(self, csv_path, dtype=None, derive=None, cache_dir=None, index_columns=()):
+        self.csv_path = Path(csv_path)
+        self.dtype = dtype
+        self.derive = derive
+        self.cache_dir = Path(cache_dir or CACHE_DIR or self.csv_path.parent / ".cache")
+        self.index_columns = tuple(index_columns)
+        self.version = None
+        self._stat = None
+        self._df = None
+        self._meta = None
+        self._derived = {}
+        self._lock = threading.Lock()
+
+    def _signature(self):
+        stat = self.csv_path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _version_dir(self, digest):
+        return self.cache_dir / f"{self.csv_path.stem}-v{FORMAT_VERSION}-{digest[:16]}"
+
+    def _parse(self):
+        # round_trip: floats match the values a producer wrote (see publish)
+        df = pd.read_csv(self.csv_path, dtype=self.dtype, float_precision="round_trip")
+        if self.derive:
+            df = self.derive(df)
+        return df
+
+    def _chunks(self, dtype):
+        reader = pd.read_csv(self.csv_path, dtype=dtype, chunksize=ROW_GROUP_ROWS, float_precision="round_trip")
+        for chunk in reader:
+            yield self.derive(chunk) if self.derive else chunk
+
+    def _ingest(self, target):
+        """Read the CSV twice, chunk by chunk: once for the column types and categories, once to write"""
+        dtype = dict(self.dtype or {})
+        while True:
+            rows, schema = _schema(self._chunks(dtype))
+            if rows is not None:
+                break
+            # A column mixing numbers and text is read as text
+            dtype.update(schema)
+        read = {name: str if isinstance(kind, list) else kind for name, kind in schema.items()}
+        _write_chunks(self._chunks(read), target, rows, schema, self.index_columns)
+
+    def _publish(self, directory, write):
+        """Run write(staging dir) and move the result to directory; False if the cache dir is not writable"""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            staging = Path(tempfile.mkdtemp(prefix=f".{directory.name}-", dir=self.cache_dir))
+        except OSError:
+            return False
+        try:
+            os.chmod(staging, 0o755)
+            write(staging)
+            os.rename(staging, directory)
+        except OSError:
+            # Another worker published the same version first, or the disk is full
+            shutil.rmtree(staging, ignore_errors=True)
+            if not (directory / "meta.json").exists():
+                return False
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        # Older versions: mapped files stay readable for workers still using them
+        for other in self.cache_dir.glob(f"{self.csv_path.stem}-v*"):
+            if other != directory:
+                shutil.rmtree(other, ignore_errors=True)
+        return True
+
+    def publish(self, df):
+        """Store df, the frame just written to the CSV, as that CSV version's columns
+
+        For a producer such as the ETL that already holds the data: the next
+        load() maps the columns instead of parsing the CSV again.
+        """
+        if self.derive:
+            df = self.derive(df.copy())
+        directory = self._version_dir(file_hash(self.csv_path))
+        if (directory / "meta.json").exists():
+            return True
+        return self._publish(directory, lambda target: write_columns(df, target, self.index_columns))
+
+    def load(self):
+        """The current DataFrame; re-validated against the CSV's mtime and size on every call"""
+        if not self.csv_path.exists():
+            return pd.DataFrame()
+        signature = self._signature()
+        if self._df is not None and signature == self._stat:
+            return self._df
+        with self._lock:
+            if self._df is not None and signature == self._stat:
+                return self._df
+            digest = file_hash(self.csv_path)
+            if self._df is None or digest != self.version:
+                directory = self._version_dir(digest)
+                if not (directory / "meta.json").exists() and not self._publish(directory, self._ingest):
+                    # Read-only cache directory: keep the parsed frame in memory
+                    df = self._parse()
+                    self._df, self._meta, self.version, self._stat = df, None, digest, signature
+                    return df
+                self._meta = _read_meta(directory)
+                self._df = map_columns(directory, self._meta)
+                self.version = digest
+            self._stat = signature
+            return self._df
+
+    def rows(self, **equals):
+        """Sorted positions of the rows where each given column equals its value (None and "" are ignored)
+
+        Only the row groups that the value's index entry or the column's
+        min/max leave as candidates are read.
+        """
+        df = self.load()
+        meta = self._meta
+        equals = {column: value for column, value in equals.items() if value not in (None, "")}
+        empty = np.array([], dtype=np.intp)
+        if not equals:
+            return np.arange(len(df))
+        if any(column not in df.columns for column in equals):
+            return empty
+        if meta is None:
+            mask = np.ones(len(df), dtype=bool)
+            for column, value in equals.items():
+                mask &= (df[column].astype(str) == str(value)).to_numpy()
+            return np.flatnonzero(mask)
+
+        kinds = {column["name"]: column["kind"] for column in meta["columns"]}
+        groups = meta["row_groups"]
+        candidates = range(len(groups))
+        tests = []
+        for column, value in equals.items():
+            if kinds[column] == "category":
+                target = int(df[column].cat.categories.get_indexer([str(value)])[0])
+                if target < 0:
+                    return empty
+                values = df[column].array.codes
+                if column in meta["indexes"]:
+                    candidates = sorted(set(candidates) & set(meta["indexes"][column].get(str(target), [])))
+            else:
+                try:
+                    target = float(value)
+                except ValueError:
+                    return empty
+                values = df[column].to_numpy()
+            candidates = [g for g in candidates if groups[g]["stats"][column] is not None
+                          and groups[g]["stats"][column][0] <= target <= groups[g]["stats"][column][1]]
+            tests.append((values, target))
+
+        parts = []
+        for g in candidates:
+            start, stop = groups[g]["start"], groups[g]["stop"]
+            mask = tests[0][0][start:stop] == tests[0][1]
+            for values, target in tests[1:]:
+                mask &= values[start:stop] == target
+            parts.append(np.flatnonzero(mask) + start)
+        return np.concatenate(parts) if parts else empty
+
+    def artifact(self, name, build):
+        """Path of a file made from the current version by build(path), e.g. a compressed copy
+
+        Built once and kept, and removed, with the version's columns; None
+        when those are not on disk (read-only cache directory).
+        """
+        self.load()
+        if self._meta is None:
+            return None
+        path = self._version_dir(self.version) / name
+        if not path.exists():
+            tmp = path.with_name(f".{name}.tmp-{os.getpid()}-{threading.get_ident()}")
+            try:
+                build(tmp)
+                os.replace(tmp, path)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+                return None
+        return path
+
+    def derived(self, name, build):
+        """build(df) computed once per dataset version, e.g. an index over the current frame"""
+        df = self.load()
+        version = self.version
+        cached = self._derived.get(name)
+        if cached is None or cached[0] != version:
+            cached = self._derived[name] = (version, build(df))
+        return cached[1]
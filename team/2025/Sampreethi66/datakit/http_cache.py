@@ -0,0 +1,187 @@
+# datakit/http_cache.py
+"""Response cache and HTTP validators for the read-only data APIs.
+
+Answers depend only on the dataset version and the query string, so they are
+cached as encoded bytes under (path, version, sorted query args) with LRU
+eviction by size, and carry a strong ETag derived from the same key. A
+request whose If-None-Match matches gets a 304 without touching the data.
+Bundle serves a whole precompressed document (e.g. /api/hierarchy) the same way.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import Response, make_response, request
+
+try:
+    import brotli
+except ImportError:  # optional: bundles are then offered gzip-compressed only
+    brotli = None
+
+CACHE_MAX_BYTES = int(os.environ.get("API_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Larger responses (e.g. big /api/filter pages) are served but not kept
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get("API_CACHE_MAX_ENTRY_BYTES", 4 * 1024 * 1024))
+# Browsers and CDNs may reuse an answer this long, then revalidate with If-None-Match
+CACHE_MAX_AGE = int(os.environ.get("API_CACHE_MAX_AGE", 60))
+
+# Bundles requested with their current version (?v=) never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+# Set by the view, not by the request, so they are stored with the body
+_SKIPPED_HEADERS = {"content-length", "content-type", "etag", "cache-control"}
+
+
+class ResponseCache:
+    """LRU of (body, mimetype, headers) bounded by total body size"""
+
+    def __init__(self, max_bytes=CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype, headers):
+        if len(body) > min(CACHE_MAX_ENTRY_BYTES, self.max_bytes):
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[0])
+            self._entries[key] = (body, mimetype, headers)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, (evicted, _, _) = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
+
+
+default_cache = ResponseCache()
+
+
+def _tee(chunks, on_complete):
+    """Pass a streamed body through, collecting it for the cache while it stays small enough"""
+    parts, size = [], 0
+    for chunk in chunks:
+        if parts is not None:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            size += len(data)
+            if size <= CACHE_MAX_ENTRY_BYTES:
+                parts.append(data)
+            else:
+                parts = None
+        yield chunk
+    if parts is not None:
+        on_complete(b"".join(parts))
+
+
+def validators(response, etag):
+    """Set the ETag and the revalidating Cache-Control on response"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = f"public, max-age={CACHE_MAX_AGE}"
+    return response
+
+
+def request_key(version):
+    return (request.path, version, tuple(sorted(request.args.items(multi=True))))
+
+
+def request_etag(version):
+    """Strong ETag of the current request's answer under a dataset version"""
+    return hashlib.sha1(repr(request_key(version)).encode("utf-8")).hexdigest()
+
+
+def not_modified(etag):
+    """A 304 if the request's If-None-Match holds etag, else None"""
+    if request.if_none_match.contains_weak(etag):
+        return validators(Response(status=304), etag)
+    return None
+
+
+def cached(version, cache=default_cache):
+    """Cache a GET view's 200 responses per dataset version; version() returns the current one"""
+    def decorate(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request_key(version())
+            etag = request_etag(key[1])
+            unchanged = not_modified(etag)
+            if unchanged is not None:
+                return unchanged
+
+            hit = cache.get(key)
+            if hit is not None:
+                body, mimetype, headers = hit
+                response = Response(body, mimetype=mimetype, headers=headers)
+                response.headers["X-Cache"] = "HIT"
+                return validators(response, etag)
+
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            headers = [(name, value) for name, value in response.headers.items()
+                       if name.lower() not in _SKIPPED_HEADERS]
+            store = lambda body: cache.put(key, body, response.mimetype, headers)
+            if response.is_streamed:
+                response.response = _tee(response.response, store)
+            else:
+                store(response.get_data())
+            response.headers["X-Cache"] = "MISS"
+            return validators(response, etag)
+        return wrapper
+    return decorate
+
+
+class Bundle:
+    """A JSON document encoded and compressed once per dataset version
+
+    Served as br or gzip per Accept-Encoding, each encoding with its own
+    strong ETag. Requested as ?v=<version> it is cacheable immutably.
+    """
+
+    def __init__(self, data, version):
+        self.version = version
+        self.body = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha1(self.body).hexdigest()[:16]
+        self.encoded = {"identity": self.body, "gzip": gzip.compress(self.body, 9, mtime=0)}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body)
+        self.etags = {encoding: f"{str(version)[:16]}-{digest}-{encoding}" for encoding in self.encoded}
+
+    def response(self):
+        accepted = request.accept_encodings
+        encoding = next((e for e in ("br", "gzip") if e in self.encoded and accepted[e]), "identity")
+        if request.args.get("v") == self.version:
+            cache_control = f"public, max-age={IMMUTABLE_MAX_AGE}, immutable"
+        else:
+            cache_control = f"public, max-age={CACHE_MAX_AGE}"
+
+        etag = self.etags[encoding]
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(self.encoded[encoding], mimetype="application/json")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = cache_control
+        response.vary.add("Accept-Encoding")
+        return response
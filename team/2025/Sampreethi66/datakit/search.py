@@ -0,0 +1,76 @@
+# datakit/search.py
+"""Case-insensitive substring/prefix search over a text column.
+
+Every distinct value is normalized (casefolded, whitespace collapsed) and
+split into 1-, 2- and 3-grams; a query is answered by intersecting the
+posting lists of its grams and checking the few candidates left, instead of
+scanning every row. Matching rows come from the column's categorical codes.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+GRAM_SIZES = (1, 2, 3)
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", str(text)).strip().casefold()
+
+
+def _grams(text, n):
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class TextIndex:
+    def __init__(self, column):
+        categorical = pd.Categorical(column)
+        self.values = [str(value) for value in categorical.categories]
+        self.normalized = [normalize(value) for value in self.values]
+
+        postings = {}
+        for value_id, text in enumerate(self.normalized):
+            for n in GRAM_SIZES:
+                for gram in _grams(text, n):
+                    postings.setdefault(gram, []).append(value_id)
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+        # Row positions grouped by value: rows of value i are order[starts[i]:starts[i + 1]]
+        codes = np.asarray(categorical.codes)
+        self.order = np.argsort(codes, kind="stable")
+        self.starts = np.searchsorted(codes[self.order], np.arange(len(self.values) + 1))
+
+    def match_ids(self, query):
+        """Ids of the distinct values containing query (case-insensitive)"""
+        query = normalize(query)
+        if not query:
+            return np.arange(len(self.values))
+        n = min(len(query), max(GRAM_SIZES))
+        candidates = None
+        for gram in _grams(query, n):
+            ids = self.postings.get(gram)
+            if ids is None:
+                return np.array([], dtype=np.int32)
+            candidates = ids if candidates is None else np.intersect1d(candidates, ids, assume_unique=True)
+        if len(query) <= n:
+            return candidates
+        return np.array([i for i in candidates if query in self.normalized[i]], dtype=np.int32)
+
+    def rows(self, query):
+        """Sorted positions of the rows whose value contains query"""
+        ids = self.match_ids(query)
+        if not len(ids):
+            return np.array([], dtype=np.intp)
+        return np.sort(np.concatenate([self.order[self.starts[i]:self.starts[i + 1]] for i in ids]))
+
+    def ranked(self, query):
+        """Matching value ids, best first: prefix, then word prefix, then earliest substring; shorter wins ties"""
+        query = normalize(query)
+
+        def rank(value_id):
+            text = self.normalized[value_id]
+            position = text.find(query)
+            kind = 0 if position == 0 else 1 if f" {query}" in text else 2
+            return kind, position, len(text), text
+
+        return sorted(self.match_ids(query).tolist(), key=rank)
@@ -12,41 +12,83 @@ const debugBtn = document.getElementById("debug");
 const resultsDiv = document.getElementById("results");
 const countDiv = document.getElementById("count");
 
-function setOptions(sel, items, placeholder = "-- any --") {
+function setOptions(sel, items, placeholder = "-- any --", counts = null) {
   sel.innerHTML = "";
   const optAny = document.createElement("option");
   optAny.value = "";
   optAny.textContent = placeholder;
   sel.appendChild(optAny);
-  (items || []).forEach(v => {
+  (items || []).forEach((v, i) => {
     const o = document.createElement("option");
     o.value = v;
-    o.textContent = v;
+    o.textContent = counts ? `${v} (${counts[i]})` : v;
     sel.appendChild(o);
   });
 }
 
+// state -> county -> zip tree from /api/hierarchy, fetched once per page;
+// the selections below are resolved from it without further requests
+let hierarchy = null;
+
+function selectedState() {
+  return hierarchy.states.indexOf(stateSel.value);
+}
+
+function countiesOf(stateIdx) {
+  return stateIdx < 0 ? [] : hierarchy.tree[stateIdx][1];
+}
+
+function zipIds(stateIdx, county) {
+  const countyIdx = hierarchy.counties.indexOf(county);
+  const states = stateIdx < 0 ? hierarchy.tree.map((_, i) => i) : [stateIdx];
+  const ids = new Set();
+  states.forEach(s => {
+    countiesOf(s).forEach(([c, , zips]) => {
+      if (countyIdx < 0 || c === countyIdx) zips.forEach(([z]) => ids.add(z));
+    });
+    if (countyIdx < 0) hierarchy.tree[s][2].forEach(z => ids.add(z));
+  });
+  if (stateIdx < 0 && countyIdx >= 0) {
+    hierarchy.no_state.filter(([c]) => c === countyIdx).forEach(([, zips]) => zips.forEach(z => ids.add(z)));
+  }
+  return [...ids].sort((a, b) => a - b);
+}
+
 async function loadStates() {
-  const states = await getJSON("/api/states");
-  setOptions(stateSel, states, "-- select state --");
+  const url = document.body.dataset.hierarchy || "/api/hierarchy";
+  hierarchy = await getJSON(url);
+  setOptions(stateSel, hierarchy.states, "-- select state --", hierarchy.tree.map(([rows]) => rows));
   setOptions(countySel, [], "-- any --");
   setOptions(zipSel, [], "-- any --");
   countDiv.textContent = "";
   resultsDiv.innerHTML = "";
 }
 
-async function loadCounties() {
-  const s = stateSel.value;
-  const counties = await getJSON(`/api/counties?state=${encodeURIComponent(s)}`);
-  setOptions(countySel, counties);
+function loadCounties() {
+  const s = selectedState();
+  if (s < 0) {
+    setOptions(countySel, hierarchy.counties);
+  } else {
+    const counties = countiesOf(s);
+    setOptions(countySel, counties.map(([c]) => hierarchy.counties[c]), "-- any --", counties.map(([, rows]) => rows));
+  }
   setOptions(zipSel, [], "-- any --");
 }
 
-async function loadZips() {
-  const s = stateSel.value;
+function loadZips() {
+  const s = selectedState();
   const c = countySel.value;
-  const z = await getJSON(`/api/zips?state=${encodeURIComponent(s)}&county=${encodeURIComponent(c)}`);
-  setOptions(zipSel, z);
+  if (s < 0 && !c) {
+    setOptions(zipSel, hierarchy.zips);
+    return;
+  }
+  const entry = c ? countiesOf(s).find(([idx]) => hierarchy.counties[idx] === c) : null;
+  if (entry) {
+    const [, , zips] = entry;
+    setOptions(zipSel, zips.map(([z]) => hierarchy.zips[z]), "-- any --", zips.map(([, rows]) => rows));
+  } else {
+    setOptions(zipSel, zipIds(s, c).map(z => hierarchy.zips[z]));
+  }
 }
 
 function renderTable(rows) {
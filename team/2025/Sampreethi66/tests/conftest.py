@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The apps import datakit and app as top-level packages from this directory
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,143 @@
+import gzip
+import importlib.util
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from datakit.dataset import Dataset
+
+APP_PY = Path(__file__).resolve().parents[1] / "app.py"
+
+
+@pytest.fixture(scope="module")
+def acs_app():
+    """app.py, loaded from its file (the app/ package shadows the app module name)"""
+    spec = importlib.util.spec_from_file_location("acs_app", APP_PY)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["acs_app"] = module
+    spec.loader.exec_module(module)
+    yield module
+    del sys.modules["acs_app"]
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        "state": ["Texas", "Texas", "Texas", "Georgia", "Georgia", "Texas", None],
+        "county": ["Dallas", "Dallas", "Harris", "Fulton", None, "Dallas", "Clay"],
+        "zip": ["75201", "75202", "77002", "30303", "30304", "75201", "01001"],
+        "population": [100, 200, 300, 400, 500, 600, 700],
+        "unemployment_rate": [5.2, 4.8, 3.9, 4.1, 6.0, 5.5, 3.0],
+    })
+
+
+@pytest.fixture
+def client(acs_app, tmp_path, frame, monkeypatch):
+    csv = tmp_path / "acs_bls_merged.csv"
+    frame.to_csv(csv, index=False)
+    monkeypatch.setattr(acs_app, "acs_bls", Dataset(csv, dtype={"zip": str}, index_columns=("state", "county")))
+    return acs_app.app.test_client()
+
+
+def test_dropdown_lists(client):
+    assert client.get("/api/states").get_json() == ["Georgia", "Texas"]
+    assert client.get("/api/counties").get_json() == ["Clay", "Dallas", "Fulton", "Harris"]
+    assert client.get("/api/counties?state=Texas").get_json() == ["Dallas", "Harris"]
+    assert client.get("/api/counties?state=Ohio").get_json() == []
+
+
+def test_zips_by_state_and_county(client):
+    # Leading zeros are kept, repeated zips listed once
+    assert client.get("/api/zips").get_json() == ["01001", "30303", "30304", "75201", "75202", "77002"]
+    assert client.get("/api/zips?state=Texas").get_json() == ["75201", "75202", "77002"]
+    assert client.get("/api/zips?county=Dallas").get_json() == ["75201", "75202"]
+    assert client.get("/api/zips?state=Texas&county=Harris").get_json() == ["77002"]
+    assert client.get("/api/zips?state=Georgia&county=Dallas").get_json() == []
+
+
+def test_index_is_built_once_per_version(acs_app, client, monkeypatch):
+    built = []
+    build_index = acs_app.build_index
+    monkeypatch.setattr(acs_app, "build_index", lambda d: built.append(1) or build_index(d))
+    client.get("/api/counties?state=Georgia")
+    client.get("/api/zips?state=Georgia")
+    assert built == [1]
+
+
+def test_filter_pages_follow_the_cursor(client):
+    first = client.get("/api/filter?state=Texas&limit=2")
+    assert [row["population"] for row in first.get_json()] == [100, 200]
+    assert first.headers["X-Total-Count"] == "4"
+    assert first.headers["X-Next-Cursor"] == "1"
+    assert first.headers["Link"] == '</api/filter?state=Texas&limit=2&cursor=1>; rel="next"'
+
+    last = client.get("/api/filter?state=Texas&limit=2&cursor=1")
+    assert [row["population"] for row in last.get_json()] == [300, 600]
+    assert "X-Next-Cursor" not in last.headers and "Link" not in last.headers
+
+
+def test_filter_offset_and_zip(client):
+    assert [row["population"] for row in client.get("/api/filter?state=Texas&offset=3").get_json()] == [600]
+    rows = client.get("/api/filter?zip=01001").get_json()
+    assert [(row["county"], row["zip"]) for row in rows] == [("Clay", "01001")]
+    assert client.get("/api/filter?state=Texas&county=Fulton").get_json() == []
+
+
+def test_filter_formats(acs_app, client, monkeypatch):
+    # Serialized one row per chunk, still one JSON array
+    monkeypatch.setattr(acs_app, "FILTER_CHUNK_ROWS", 1)
+    assert len(client.get("/api/filter?state=Texas&format=json&limit=3").get_json()) == 3
+
+    ndjson = client.get("/api/filter?state=Georgia&format=ndjson")
+    assert ndjson.mimetype == "application/x-ndjson"
+    assert len(ndjson.get_data(as_text=True).splitlines()) == 2
+    csv = client.get("/api/filter?county=Dallas&format=csv")
+    assert csv.mimetype == "text/csv"
+    assert csv.get_data(as_text=True).splitlines()[0] == "state,county,zip,population,unemployment_rate"
+    assert len(csv.get_data(as_text=True).splitlines()) == 4
+
+
+@pytest.mark.parametrize("query", ["format=xml", "limit=ten", "cursor=x"])
+def test_filter_rejects_bad_arguments(client, query):
+    assert client.get(f"/api/filter?{query}").status_code == 400
+
+
+def test_hierarchy_tree(client):
+    body = client.get("/api/hierarchy").get_json()
+    states, counties, zips = body["states"], body["counties"], body["zips"]
+    assert states == ["Georgia", "Texas"]
+
+    def resolve(entry):
+        rows, by_county, no_county = entry
+        return rows, {counties[c]: (n, {zips[z]: m for z, m in z_rows}) for c, n, z_rows in by_county}, \
+            [zips[z] for z in no_county]
+
+    assert resolve(body["tree"][states.index("Texas")]) == (
+        4, {"Dallas": (3, {"75201": 2, "75202": 1}), "Harris": (1, {"77002": 1})}, [])
+    assert resolve(body["tree"][states.index("Georgia")]) == (2, {"Fulton": (1, {"30303": 1})}, ["30304"])
+    assert [[counties[c], [zips[z] for z in z_list]] for c, z_list in body["no_state"]] == [["Clay", ["01001"]]]
+
+
+def test_hierarchy_bundle_encodings(client):
+    version = client.get("/api/hierarchy").get_json()["version"]
+    plain = client.get("/api/hierarchy", headers={"Accept-Encoding": "identity"})
+    assert "Content-Encoding" not in plain.headers
+    assert plain.headers["Cache-Control"] == "public, max-age=60"
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    compressed = client.get(f"/api/hierarchy?v={version}", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(compressed.data) == plain.data
+    assert compressed.headers["Cache-Control"].endswith("immutable")
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+
+    unchanged = client.get("/api/hierarchy", headers={"Accept-Encoding": "gzip",
+                                                       "If-None-Match": compressed.headers["ETag"]})
+    assert unchanged.status_code == 304
+
+
+def test_page_links_the_versioned_bundle(client):
+    version = client.get("/api/hierarchy").get_json()["version"]
+    assert f"/api/hierarchy?v={version}".encode() in client.get("/").data
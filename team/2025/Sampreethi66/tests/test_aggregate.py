@@ -0,0 +1,76 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from werkzeug.datastructures import MultiDict
+
+from datakit.aggregate import AggregateError, aggregate_records
+
+GROUPS = ("state", "county")
+COLUMNS = ("population", "rate")
+WEIGHTS = ("population",)
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        "state": ["CA", "CA", "CA", "TX", "TX"],
+        "county": ["A", "A", "B", "C", "C"],
+        "population": [100, 300, 50, 200, 200],
+        "rate": [0.1, 0.3, np.nan, 0.2, 0.4],
+    })
+
+
+def records(df, query):
+    return json.loads(aggregate_records(df, MultiDict(query), GROUPS, COLUMNS, WEIGHTS))
+
+
+def test_sum_of_the_first_column_by_default(df):
+    assert records(df, []) == [{"rows": 5, "sum_population": 850}]
+
+
+def test_group_by_with_several_metrics(df):
+    result = records(df, [("by", "state"), ("metric", "sum:population"), ("metric", "mean:rate"),
+                          ("metric", "max:rate"), ("metric", "count:rate")])
+    assert [row["state"] for row in result] == ["CA", "TX"]
+    ca, tx = result
+    assert ca["rows"] == 3 and ca["sum_population"] == 450
+    assert ca["mean_rate"] == pytest.approx(0.2)   # NaN is left out
+    assert ca["count_rate"] == 2
+    assert tx["max_rate"] == pytest.approx(0.4)
+
+
+def test_group_by_several_columns(df):
+    result = records(df, [("by", "state, county"), ("metric", "sum:population")])
+    assert [(row["state"], row["county"], row["sum_population"]) for row in result] == [
+        ("CA", "A", 400), ("CA", "B", 50), ("TX", "C", 400)]
+
+
+def test_weighted_mean_and_percentile(df):
+    result = records(df, [("by", "state"), ("metric", "wmean:rate:population"), ("metric", "p50:rate")])
+    ca, tx = result
+    # The row without a rate doesn't count towards the weights either
+    assert ca["wmean_rate_by_population"] == pytest.approx((0.1 * 100 + 0.3 * 300) / 400)
+    assert tx["wmean_rate_by_population"] == pytest.approx(0.3)
+    assert ca["p50_rate"] == pytest.approx(0.2)
+
+
+def test_group_keys_are_strings(df):
+    df = df.assign(state=[6, 6, 6, 48, 48])
+    result = records(df, [("by", "state")])
+    assert [row["state"] for row in result] == ["6", "48"]
+
+
+@pytest.mark.parametrize("query", [
+    [("by", "population")],                          # not a group column
+    [("by", "state,state")],                         # repeated
+    [("metric", "median:rate")],                     # unknown function
+    [("metric", "sum:state")],                       # not a value column
+    [("metric", "wmean:rate")],                      # wmean without weight
+    [("metric", "wmean:rate:rate")],                 # weight not allowed
+    [("metric", "sum:rate:population")],             # weight on a plain metric
+])
+def test_rejected_requests(df, query):
+    with pytest.raises(AggregateError):
+        records(df, query)
@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datakit import dataset
+from datakit.dataset import Dataset, map_columns
+
+STATES = ["CA", "GA", "NY", "TX"]
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(7)
+    n = 1000
+    df = pd.DataFrame({
+        # Sorted by state so most row groups hold a single state
+        "state": np.sort(rng.choice(STATES, n)),
+        "county": rng.choice(["Adams", "Baker", "Clay"], n),
+        "year": rng.choice([2020, 2021, 2022], n),
+        "rate": rng.random(n).round(3),
+    })
+    df.loc[::17, "county"] = None
+    df.loc[::23, "rate"] = np.nan
+    return df
+
+
+@pytest.fixture
+def csv(tmp_path, frame, monkeypatch):
+    monkeypatch.setattr(dataset, "ROW_GROUP_ROWS", 64)
+    path = tmp_path / "data.csv"
+    frame.to_csv(path, index=False)
+    return path
+
+
+def expected(frame, **equals):
+    mask = np.ones(len(frame), dtype=bool)
+    for column, value in equals.items():
+        mask &= (frame[column] == value).to_numpy()
+    return np.flatnonzero(mask)
+
+
+def test_rows_with_several_filters(csv, frame):
+    ds = Dataset(csv, index_columns=("state", "county"))
+    for equals in ({"state": "GA"}, {"state": "GA", "county": "Clay"},
+                   {"state": "TX", "county": "Adams", "year": 2021}):
+        np.testing.assert_array_equal(ds.rows(**equals), expected(frame, **equals))
+    assert len(ds._meta["row_groups"]) > 1
+
+
+def test_rows_skips_row_groups_without_the_value(csv):
+    ds = Dataset(csv, index_columns=("state",))
+    code = str(ds.load()["state"].cat.categories.get_loc("CA"))
+    groups = ds._meta["indexes"]["state"][code]
+    assert 0 < len(groups) < len(ds._meta["row_groups"])
+
+
+def test_rows_with_missing_values(csv, frame):
+    ds = Dataset(csv, index_columns=("state", "county"))
+    # Rows without a county still match a state filter, and never a county
+    np.testing.assert_array_equal(ds.rows(state="NY"), expected(frame, state="NY"))
+    counties = ds.rows(county="Baker")
+    assert frame.loc[counties, "county"].eq("Baker").all()
+    assert not frame.loc[counties, "county"].isna().any()
+    # None and "" mean "no filter"
+    np.testing.assert_array_equal(ds.rows(state="NY", county=None), expected(frame, state="NY"))
+    np.testing.assert_array_equal(ds.rows(county=""), np.arange(len(frame)))
+    # NaN never equals a number
+    np.testing.assert_array_equal(ds.rows(rate=frame["rate"].dropna().iloc[0]),
+                                  expected(frame, rate=frame["rate"].dropna().iloc[0]))
+
+
+def test_rows_with_unknown_values(csv):
+    ds = Dataset(csv, index_columns=("state", "county"))
+    assert len(ds.rows(state="ZZ")) == 0
+    assert len(ds.rows(state="CA", county="Nowhere")) == 0
+    assert len(ds.rows(year="not a number")) == 0
+    assert len(ds.rows(year=1999)) == 0
+    assert len(ds.rows(no_such_column="CA")) == 0
+
+
+def test_rows_without_a_writable_cache(csv, frame, tmp_path):
+    # A cache_dir that can't be created leaves the parsed frame in memory
+    blocker = tmp_path / "not-a-dir"
+    blocker.write_text("")
+    ds = Dataset(csv, cache_dir=blocker / "cache", index_columns=("state",))
+    np.testing.assert_array_equal(ds.rows(state="GA", county="Clay"), expected(frame, state="GA", county="Clay"))
+    assert ds._meta is None
+    assert len(ds.rows(state="ZZ")) == 0
+
+
+def _mapped(array):
+    while array is not None and not isinstance(array, np.memmap):
+        array = array.base
+    return array is not None
+
+
+def test_load_maps_columns_without_copying(csv, frame):
+    df = Dataset(csv).load()
+    for name in frame.columns:
+        column = df[name]
+        values = column.array.codes if isinstance(column.dtype, pd.CategoricalDtype) else column.to_numpy()
+        assert _mapped(values), name
+        np.testing.assert_array_equal(np.asarray(column.astype(object).where(column.notna(), None)),
+                                      np.asarray(frame[name].astype(object).where(frame[name].notna(), None)))
+
+
+def test_map_columns_warns_when_pandas_copies(csv, monkeypatch):
+    ds = Dataset(csv)
+    ds.load()
+    directory = ds._version_dir(ds.version)
+    original = pd.DataFrame
+    monkeypatch.setattr(dataset.pd, "DataFrame", lambda data, copy=False: original(data, copy=True))
+    with pytest.warns(RuntimeWarning, match="copied"):
+        map_columns(directory)
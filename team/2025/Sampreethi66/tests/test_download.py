@@ -0,0 +1,100 @@
+import gzip
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from datakit.dataset import Dataset
+
+
+@pytest.fixture
+def frame():
+    rng = np.random.default_rng(3)
+    n = 25000
+    fips = np.sort(rng.choice(["06001", "06037", "13121", "48201", "48113"], n))
+    return pd.DataFrame({
+        "county_fips": fips,
+        "county_name": pd.Series(fips).map({"06001": "Alameda County", "06037": "Los Angeles County",
+                                             "13121": "Fulton County", "48201": "Harris County",
+                                             "48113": "Dallas County"}),
+        "population": rng.integers(1000, 100000, n),
+        "employment_5415": rng.integers(0, 5000, n),
+        "density_per_1k": rng.random(n).round(4),
+    })
+
+
+@pytest.fixture
+def client(tmp_path, frame, monkeypatch):
+    from app import create_app, routes
+
+    csv = tmp_path / "county_density.csv"
+    frame.to_csv(csv, index=False)
+    monkeypatch.setattr(routes, "CSV_FILE", csv)
+    monkeypatch.setattr(routes, "county_density", Dataset(
+        csv, dtype={"county_fips": str}, derive=routes.add_state_fips, index_columns=("state_fips",)))
+    return create_app().test_client()
+
+
+def read_csv(body):
+    return pd.read_csv(io.BytesIO(body), dtype={"county_fips": str})
+
+
+def test_full_download(client, tmp_path):
+    response = client.get("/download/county_density.csv")
+    assert response.status_code == 200
+    assert response.headers.get("Content-Encoding") is None
+    assert response.get_data() == (tmp_path / "county_density.csv").read_bytes()
+    etag = response.headers["ETag"]
+
+    assert client.get("/download/county_density.csv", headers={"If-None-Match": etag}).status_code == 304
+    partial = client.get("/download/county_density.csv", headers={"Range": "bytes=0-99"})
+    assert partial.status_code == 206
+    assert partial.get_data() == (tmp_path / "county_density.csv").read_bytes()[:100]
+
+
+def test_gzip_download(client, tmp_path):
+    response = client.get("/download/county_density.csv", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert gzip.decompress(response.get_data()) == (tmp_path / "county_density.csv").read_bytes()
+    # Its own validator, distinct from the identity file's
+    plain = client.get("/download/county_density.csv")
+    assert response.headers["ETag"] != plain.headers["ETag"]
+    again = client.get("/download/county_density.csv",
+                       headers={"Accept-Encoding": "gzip", "If-None-Match": response.headers["ETag"]})
+    assert again.status_code == 304
+
+
+def test_filtered_download(client, frame):
+    response = client.get("/download/county_density.csv?state_fips=48")
+    body = response.get_data()
+    expected = frame[frame["county_fips"].str.startswith("48")]
+    assert response.status_code == 200
+    assert response.headers["X-Total-Count"] == str(len(expected))
+    result = read_csv(body)
+    assert list(result.columns) == list(frame.columns)
+    pd.testing.assert_frame_equal(result, expected.reset_index(drop=True))
+
+    etag = response.headers["ETag"]
+    assert client.get("/download/county_density.csv?state_fips=48",
+                      headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_filtered_download_by_county_name(client, frame):
+    response = client.get("/download/county_density.csv?state=48&county=dallas")
+    result = read_csv(response.get_data())
+    assert set(result["county_name"]) == {"Dallas County"}
+    assert len(result) == (frame["county_fips"] == "48113").sum()
+
+
+def test_filtered_download_without_matches(client):
+    response = client.get("/download/county_density.csv?state_fips=99")
+    assert response.headers["X-Total-Count"] == "0"
+    assert read_csv(response.get_data()).empty
+
+
+def test_missing_csv(client, tmp_path):
+    (tmp_path / "county_density.csv").unlink()
+    assert client.get("/download/county_density.csv").status_code == 404
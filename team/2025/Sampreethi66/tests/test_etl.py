@@ -0,0 +1,117 @@
+import json
+
+import pandas as pd
+import pytest
+
+from app import etl
+from app.etl import Pipeline
+from datakit.dataset import Dataset
+
+CENSUS = """NAME,B01003_001E,state,county
+"Dallas County, Texas",2600000,48,113
+"Autauga County, Alabama",59000,01,001
+"Loving County, Texas",0,48,301
+"""
+
+CBP = """fipstate,fipscty,naics,emp
+48,113,5415//,12000
+48,113,5415//,500
+48,113,54----,99999
+01,001,5415//,40
+"""
+
+
+@pytest.fixture
+def inputs(tmp_path):
+    population = tmp_path / "population.csv"
+    employment = tmp_path / "employment.csv"
+    population.write_text(CENSUS)
+    employment.write_text(CBP)
+    return population, employment
+
+
+def test_census_and_cbp_layouts(inputs):
+    population = etl.ingest_population(inputs[0])
+    assert population.to_dict("records")[0] == {"county_fips": "48113", "county_name": "Dallas County",
+                                                "population": 2600000}
+    employment = etl.ingest_employment(inputs[1])
+    assert dict(zip(employment["county_fips"], employment["employment_5415"])) == {"48113": 12500, "01001": 40}
+
+
+def test_qcew_and_plain_layouts(tmp_path):
+    qcew = tmp_path / "qcew.csv"
+    qcew.write_text("area_fips,own_code,industry_code,annual_avg_emplvl\n"
+                    "48113,5,5415,700\n48113,1,5415,300\n48113,5,5416,9\n")
+    assert etl.ingest_employment(qcew).to_dict("records") == [{"county_fips": "48113", "employment_5415": 700}]
+
+    plain = tmp_path / "plain.csv"
+    plain.write_text("County_FIPS,Population\n1001,59000\n1001,60000\n")
+    assert etl.ingest_population(plain).to_dict("records") == [
+        {"county_fips": "01001", "county_name": "", "population": 60000}]
+
+
+def test_unrecognized_layout(tmp_path):
+    path = tmp_path / "other.csv"
+    path.write_text("a,b\n1,2\n")
+    with pytest.raises(ValueError, match="unrecognized population layout"):
+        etl.ingest_population(path)
+    with pytest.raises(ValueError, match="unrecognized employment layout"):
+        etl.ingest_employment(path)
+
+
+def test_join(inputs):
+    df = etl.join(etl.ingest_population(inputs[0]), etl.ingest_employment(inputs[1]))
+    assert list(df.columns) == etl.COLUMNS
+    assert df["county_fips"].tolist() == ["01001", "48113", "48301"]
+    # No establishments: no employment; no population: no density
+    assert df["employment_5415"].tolist() == [40, 12500, 0]
+    assert df["density_per_1k"].iloc[1] == pytest.approx(12500 / 2600000 * 1000)
+    assert pd.isna(df["density_per_1k"].iloc[2])
+
+
+def test_rebuilds_only_what_changed(inputs, tmp_path):
+    population, employment = inputs
+    output = tmp_path / "out" / "county_density.csv"
+    output.parent.mkdir()
+    pipeline = Pipeline(output)
+
+    built = pipeline.run(population, employment)
+    assert (built["status"], built["rows"], built["parsed"]) == ("built", 3, ["population", "employment"])
+    written = output.read_bytes()
+    assert pipeline.run(population, employment)["status"] == "unchanged"
+
+    employment.write_text(CBP.replace("12000", "13000"))
+    rebuilt = pipeline.run(population, employment)
+    assert (rebuilt["status"], rebuilt["parsed"]) == ("built", ["employment"])
+    assert output.read_bytes() != written
+    # One cached stage per input
+    assert sorted(p.name.split("-")[0] for p in pipeline.state_dir.iterdir() if p.is_dir()) == [
+        "employment", "population"]
+
+    # Forced, or with the output edited by hand: built from the cached stages
+    assert pipeline.run(population, employment, force=True)["parsed"] == []
+    output.write_text("edited\n")
+    assert pipeline.run(population, employment)["status"] == "built"
+    assert json.loads(pipeline.manifest_path.read_text())["output"]["rows"] == 3
+
+
+def test_output_is_published_to_the_dataset(inputs, tmp_path, monkeypatch):
+    output = tmp_path / "county_density.csv"
+    dataset = Dataset(output, dtype={"county_fips": str})
+    summary = Pipeline(output, dataset=dataset).run(*inputs)
+    assert summary["published"] is True
+
+    # Mapped from the published columns, not parsed from the CSV
+    monkeypatch.setattr(Dataset, "_ingest", lambda self, target: pytest.fail("CSV parsed again"))
+    df = dataset.load()
+    assert df["county_fips"].astype(str).tolist() == ["01001", "48113", "48301"]
+    assert df["population"].tolist() == [59000, 2600000, 0]
+
+
+def test_main(inputs, tmp_path, capsys):
+    output = tmp_path / "county_density.csv"
+    args = ["--population", str(inputs[0]), "--employment", str(inputs[1]), "--output", str(output)]
+    assert etl.main(args) == 0
+    assert json.loads(capsys.readouterr().err.split("[INFO] ", 1)[1])["status"] == "built"
+    assert etl.main(["--population", str(inputs[1]), "--employment", str(inputs[1]), "--output", str(output)]) == 1
+    assert "[ERROR] ETL failed" in capsys.readouterr().err
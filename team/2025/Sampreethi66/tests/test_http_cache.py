@@ -0,0 +1,97 @@
+import pytest
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from datakit import http_cache
+from datakit.http_cache import ResponseCache, cached
+
+
+def test_lru_is_bounded_by_size():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", b"aaaa", "text/plain", [])
+    cache.put("b", b"bbbb", "text/plain", [])
+    assert cache.get("a")[0] == b"aaaa"
+    # "b" is now the least recently used
+    cache.put("c", b"cccc", "text/plain", [])
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
+    assert cache.stats() == {"entries": 2, "bytes": 8, "hits": 2, "misses": 1}
+
+
+def test_replacing_an_entry_and_oversize_bodies():
+    cache = ResponseCache(max_bytes=10)
+    cache.put("a", b"aaaa", "text/plain", [])
+    cache.put("a", b"aa", "text/plain", [])
+    assert cache.stats()["bytes"] == 2
+    cache.put("big", b"x" * 11, "text/plain", [])
+    assert cache.get("big") is None
+
+
+@pytest.fixture
+def app():
+    state = {"version": "v1", "calls": 0}
+    cache = ResponseCache()
+    app = Flask(__name__)
+    app.config["state"], app.config["cache"] = state, cache
+
+    @app.get("/items")
+    @cached(lambda: state["version"], cache)
+    def items():
+        state["calls"] += 1
+        if request.args.get("fail"):
+            return jsonify({"error": "bad"}), 400
+        response = jsonify([state["version"], request.args.get("q")])
+        response.headers["X-Total-Count"] = "1"
+        return response
+
+    @app.get("/stream")
+    @cached(lambda: state["version"], cache)
+    def stream():
+        state["calls"] += 1
+        size = int(request.args.get("size", 3))
+        return Response(stream_with_context(iter(["x" * size, "y"])), mimetype="text/csv")
+
+    return app
+
+
+def test_hits_misses_and_etags(app):
+    client, state = app.test_client(), app.config["state"]
+    first = client.get("/items?q=1&b=2")
+    assert first.headers["X-Cache"] == "MISS"
+    assert first.headers["Cache-Control"] == f"public, max-age={http_cache.CACHE_MAX_AGE}"
+
+    # Argument order does not matter; view headers are kept
+    second = client.get("/items?b=2&q=1")
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.get_json() == ["v1", "1"] and second.headers["X-Total-Count"] == "1"
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert state["calls"] == 1
+
+    unchanged = client.get("/items?q=1&b=2", headers={"If-None-Match": first.headers["ETag"]})
+    assert unchanged.status_code == 304 and unchanged.data == b""
+
+    # A new dataset version is a new key and a new ETag
+    state["version"] = "v2"
+    changed = client.get("/items?q=1&b=2", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200 and changed.get_json() == ["v2", "1"]
+    assert changed.headers["ETag"] != first.headers["ETag"]
+    assert state["calls"] == 2
+
+
+def test_errors_are_not_cached(app):
+    client = app.test_client()
+    assert client.get("/items?fail=1").status_code == 400
+    assert client.get("/items?fail=1").status_code == 400
+    assert app.config["state"]["calls"] == 2
+
+
+def test_streamed_bodies(app, monkeypatch):
+    client = app.test_client()
+    assert client.get("/stream").data == b"xxxy"
+    hit = client.get("/stream")
+    assert hit.headers["X-Cache"] == "HIT" and hit.data == b"xxxy" and hit.mimetype == "text/csv"
+
+    # Too large to keep: served in full, computed again next time
+    monkeypatch.setattr(http_cache, "CACHE_MAX_ENTRY_BYTES", 8)
+    assert client.get("/stream?size=10").data == b"x" * 10 + b"y"
+    assert client.get("/stream?size=10").headers["X-Cache"] == "MISS"
+    assert app.config["state"]["calls"] == 3
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from datakit.search import TextIndex, normalize
+
+NAMES = ["Dallas County", "Harris County", "Fort Bend  County", "Dallas County", None,
+         "Bend Parish", "Lawrence County", "harris county"]
+
+
+@pytest.fixture
+def index():
+    return TextIndex(pd.Series(NAMES))
+
+
+def scan(query):
+    query = normalize(query)
+    return [i for i, name in enumerate(NAMES) if name is not None and query in normalize(name)]
+
+
+def test_normalize():
+    assert normalize("  Fort\tBend   County ") == "fort bend county"
+
+
+@pytest.mark.parametrize("query", ["dal", "COUNTY", "bend co", "r", "nd", "harris", "ris cou", "zz", "", "  "])
+def test_rows_match_a_scan(index, query):
+    expected = scan(query) if query.strip() else [i for i, name in enumerate(NAMES) if name is not None]
+    assert index.rows(query).tolist() == expected
+
+
+def test_distinct_values_are_indexed_once(index):
+    assert index.values.count("Dallas County") == 1
+    ids = index.match_ids("dallas")
+    assert [index.values[i] for i in ids] == ["Dallas County"]
+
+
+def test_ranked_prefix_then_word_prefix_then_substring(index):
+    ranked = [index.values[i] for i in index.ranked("ben")]
+    assert ranked == ["Bend Parish", "Fort Bend  County"]
+    ranked = [index.values[i] for i in index.ranked("ar")]
+    # "harris county" and "Harris County" tie on everything but the text
+    assert ranked[-1] == "Bend Parish"
+    assert set(ranked[:2]) == {"Harris County", "harris county"}
+
+
+def test_empty_column():
+    index = TextIndex(pd.Series([], dtype=object))
+    assert index.rows("x").tolist() == []
+    assert index.ranked("x") == []
+    assert np.array_equal(index.rows(""), [])